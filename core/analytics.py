@@ -0,0 +1,355 @@
+# vectorized yield analytics of the offers and loans
+import time
+from collections import defaultdict
+
+import numpy as np
+from django.db.models import FloatField, Func
+
+from . import models
+from .registry import accepted_assets
+from .rollups import BORROW_AMOUNT_BUCKETS, DURATION_BUCKETS, bucket_label
+from .service import SECONDS_PER_YEAR, CoreService
+
+# the lower edges of the APR buckets, in percent
+APR_BUCKETS = [0, 5, 10, 20, 50, 100]
+PERCENTILES = [10, 25, 50, 75, 90]
+# the metrics of the analytics, with the lower edges of their buckets
+METRICS = {
+    "apr": APR_BUCKETS,
+    "principal": BORROW_AMOUNT_BUCKETS,
+    "time_to_expiry": DURATION_BUCKETS,
+}
+
+
+class Epoch(Func):
+    """
+    The seconds since the epoch of a timestamp
+    """
+
+    template = "EXTRACT(EPOCH FROM %(expressions)s)::double precision"
+    output_field = FloatField()
+
+
+def _columns(queryset, *fields) -> list[np.ndarray]:
+    """
+    Fetch the fields of a queryset as columns, in a single query.
+    The addresses are kept as object arrays, the other fields are read
+    as floats, with the missing values as nan.
+    """
+    rows = list(queryset.values_list(*fields))
+    columns = list(zip(*rows)) or [()] * len(fields)
+    return [
+        np.array(column, dtype=object if field.endswith("address") else np.float64)
+        for field, column in zip(fields, columns)
+    ]
+
+
+def _token_decimals(tokens: np.ndarray) -> np.ndarray:
+    """
+    The decimals of every distinct token, nan for the tokens that are not
+    accepted, whose decimals are not known
+    """
+    decimals = []
+    for contract_address in tokens:
+        token = accepted_assets.get_token(contract_address)
+        decimals.append(np.nan if token is None else token.token_decimal)
+    return np.array(decimals, dtype=np.float64)
+
+
+def _yield_metrics(
+    principal: np.ndarray,
+    repayment_amount: np.ndarray,
+    duration: np.ndarray,
+    decimals: np.ndarray,
+    expires_at: np.ndarray,
+    now: float,
+) -> dict[str, np.ndarray]:
+    """
+    The metrics of every row, nan where they are not defined:
+    the APR in percent, the principal in whole tokens
+    and the time to expiry in days.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        apr = (
+            (repayment_amount - principal) / principal * SECONDS_PER_YEAR / duration
+        ) * 100
+    # like `CoreService.effective_apr`, no rate without a principal or duration
+    apr[(principal == 0) | (duration == 0)] = np.nan
+    return {
+        "apr": apr,
+        "principal": principal / 10.0**decimals,
+        "time_to_expiry": (expires_at - now) / 86400,
+    }
+
+
+def _percentiles(values: np.ndarray, groups: np.ndarray, group_count: int):
+    """
+    The percentiles of the values of every group, interpolated linearly
+    between the closest ranks, and the number of values of every group.
+    The values of all the groups are sorted at once, and every percentile
+    is read at its position in the run of its group.
+    """
+    valid = ~np.isnan(values)
+    values, groups = values[valid], groups[valid]
+    order = np.lexsort((values, groups))
+    values, groups = values[order], groups[order]
+
+    counts = np.bincount(groups, minlength=group_count)
+    result = np.full((group_count, len(PERCENTILES)), np.nan)
+    if not len(values):
+        return result, counts
+    starts = np.cumsum(counts) - counts
+    positions = starts[:, None] + (counts[:, None] - 1) * (np.array(PERCENTILES) / 100)
+    lower = np.clip(np.floor(positions).astype(np.int64), 0, len(values) - 1)
+    upper = np.clip(np.ceil(positions).astype(np.int64), 0, len(values) - 1)
+    fraction = positions - np.floor(positions)
+    interpolated = values[lower] + (values[upper] - values[lower]) * fraction
+    result[counts > 0] = interpolated[counts > 0]
+    return result, counts
+
+
+def _histograms(
+    values: np.ndarray, groups: np.ndarray, group_count: int, edges: list[int]
+) -> np.ndarray:
+    """
+    The number of values of every group in every bucket, in a single count.
+    The values below the first edge are counted in the first bucket.
+    """
+    valid = ~np.isnan(values)
+    buckets = np.searchsorted(np.array(edges, dtype=np.float64), values[valid], "right")
+    buckets = np.maximum(buckets - 1, 0)
+    counts = np.bincount(
+        groups[valid] * len(edges) + buckets, minlength=group_count * len(edges)
+    )
+    return counts.reshape(group_count, len(edges))
+
+
+def _metric_summary(percentiles, histogram: list[int], edges: list[int]) -> dict:
+    return {
+        "percentiles": (
+            None
+            if percentiles is None
+            else {
+                f"p{percentile}": float(value)
+                for percentile, value in zip(PERCENTILES, percentiles)
+            }
+        ),
+        "histogram": [
+            {"bucket": bucket_label(edge, edges), "count": int(count)}
+            for edge, count in zip(edges, histogram)
+        ],
+    }
+
+
+def _summarize_groups(keys: np.ndarray, metrics: dict[str, np.ndarray]) -> list:
+    """
+    The number of rows and the summary of every metric of every distinct key,
+    ordered by number of rows
+    """
+    values, groups = np.unique(keys, return_inverse=True)
+    rows = np.bincount(groups, minlength=len(values))
+    summaries = [
+        {"value": value, "count": int(count)} for value, count in zip(values, rows)
+    ]
+    for name, edges in METRICS.items():
+        percentiles, counts = _percentiles(metrics[name], groups, len(values))
+        histograms = _histograms(metrics[name], groups, len(values), edges)
+        for index, summary in enumerate(summaries):
+            summary[name] = _metric_summary(
+                percentiles[index] if counts[index] else None,
+                histograms[index],
+                edges,
+            )
+    return sorted(summaries, key=lambda summary: (-summary["count"], summary["value"]))
+
+
+def _summarize(
+    collections: np.ndarray,
+    tokens: np.ndarray,
+    principal: np.ndarray,
+    repayment_amount: np.ndarray,
+    duration: np.ndarray,
+    expires_at: np.ndarray,
+    now: float,
+) -> dict:
+    distinct_tokens, token_groups = np.unique(tokens, return_inverse=True)
+    decimals = _token_decimals(distinct_tokens)[token_groups]
+    metrics = _yield_metrics(
+        principal, repayment_amount, duration, decimals, expires_at, now
+    )
+    return {
+        "count": len(collections),
+        "collections": _summarize_groups(collections, metrics),
+        "tokens": _summarize_groups(tokens, metrics),
+    }
+
+
+def offer_yield_analytics(now: float | None = None) -> dict:
+    """
+    The yield analytics of the offers on the open listings that have not
+    expired, by collection and by token, computed from a single query.
+    """
+    now = time.time() if now is None else now
+    offers = models.Offer.objects.filter(
+        listing__status=models.ListingStatus.OPEN, signature_expiry__gt=now
+    ).order_by()
+    return _summarize(
+        *_columns(
+            offers,
+            "listing__nft_contract_address",
+            "token_contract_address",
+            "borrow_amount",
+            "repayment_amount",
+            "duration",
+            "signature_expiry",
+        ),
+        now=now,
+    )
+
+
+def loan_yield_analytics(now: float | None = None) -> dict:
+    """
+    The yield analytics of the pending loans, by collection and by token,
+    computed from a single query. The time to expiry of a loan is the time
+    until its repayment is due.
+    """
+    now = time.time() if now is None else now
+    loans = (
+        models.Loan.objects.filter(status=models.LoanStatus.PENDING)
+        .annotate(started_at=Epoch("start_time"))
+        .order_by()
+    )
+    (
+        collections,
+        tokens,
+        principal,
+        repayment_amount,
+        duration,
+        started_at,
+    ) = _columns(
+        loans,
+        "nft_contract_address",
+        "token_contract_address",
+        "borrow_amount",
+        "repayment_amount",
+        "duration",
+        "started_at",
+    )
+    return _summarize(
+        collections,
+        tokens,
+        principal,
+        repayment_amount,
+        duration,
+        started_at + duration,
+        now=now,
+    )
+
+
+def yield_analytics(now: float | None = None) -> dict:
+    """
+    The yield analytics of the offers and of the loans
+    """
+    now = time.time() if now is None else now
+    return {
+        "offers": offer_yield_analytics(now),
+        "loans": loan_yield_analytics(now),
+    }
+
+
+# the loop over the model instances, the reference of the benchmark
+
+
+def _reference_percentile(values: list[float], percentile: int) -> float:
+    position = (len(values) - 1) * percentile / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def _reference_summarize(rows: list[tuple]) -> dict:
+    groups = {"collections": defaultdict(list), "tokens": defaultdict(list)}
+    for collection, token, metrics in rows:
+        groups["collections"][collection].append(metrics)
+        groups["tokens"][token].append(metrics)
+
+    result = {"count": len(rows)}
+    for name, grouped in groups.items():
+        summaries = []
+        for value, group in grouped.items():
+            summary = {"value": value, "count": len(group)}
+            for metric, edges in METRICS.items():
+                values = sorted(row[metric] for row in group if row[metric] is not None)
+                histogram = {bucket_label(edge, edges): 0 for edge in edges}
+                for metric_value in values:
+                    histogram[bucket_label(max(metric_value, 0), edges)] += 1
+                summary[metric] = {
+                    "percentiles": (
+                        {
+                            f"p{percentile}": _reference_percentile(values, percentile)
+                            for percentile in PERCENTILES
+                        }
+                        if values
+                        else None
+                    ),
+                    "histogram": [
+                        {"bucket": label, "count": count}
+                        for label, count in histogram.items()
+                    ],
+                }
+            summaries.append(summary)
+        result[name] = sorted(
+            summaries, key=lambda summary: (-summary["count"], summary["value"])
+        )
+    return result
+
+
+def _reference_metrics(row, expires_at: float, now: float) -> dict:
+    token = accepted_assets.get_token(row.token_contract_address)
+    apr = CoreService.effective_apr(
+        row.borrow_amount, row.repayment_amount, row.duration
+    )
+    return {
+        "apr": None if apr is None else apr * 100,
+        "principal": (
+            None
+            if token is None or row.borrow_amount is None
+            else row.borrow_amount / 10**token.token_decimal
+        ),
+        "time_to_expiry": (expires_at - now) / 86400,
+    }
+
+
+def reference_yield_analytics(now: float | None = None) -> dict:
+    """
+    The yield analytics computed in a loop over the offer and loan instances
+    """
+    now = time.time() if now is None else now
+    offers = models.Offer.objects.filter(
+        listing__status=models.ListingStatus.OPEN, signature_expiry__gt=now
+    ).select_related("listing")
+    loans = models.Loan.objects.filter(status=models.LoanStatus.PENDING)
+    return {
+        "offers": _reference_summarize(
+            [
+                (
+                    offer.listing.nft_contract_address,
+                    offer.token_contract_address,
+                    _reference_metrics(offer, offer.signature_expiry, now),
+                )
+                for offer in offers
+            ]
+        ),
+        "loans": _reference_summarize(
+            [
+                (
+                    loan.nft_contract_address,
+                    loan.token_contract_address,
+                    _reference_metrics(
+                        loan, loan.start_time.timestamp() + loan.duration, now
+                    ),
+                )
+                for loan in loans
+            ]
+        ),
+    }
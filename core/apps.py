@@ -4,3 +4,25 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        from django.conf import settings
+
+        from . import signals  # noqa: F401
+        from .archive import get_loan_archiver
+        from .indexer import get_loan_indexer
+        from .scheduler import get_loan_scheduler
+        from .sweeper import get_offer_sweeper
+        from .verification import get_signature_verifier
+
+        # build the signature verification tables at startup
+        get_signature_verifier()
+
+        if settings.OFFER_SWEEP_IN_PROCESS:
+            get_offer_sweeper().start()
+        if settings.LOAN_SCHEDULER_IN_PROCESS:
+            get_loan_scheduler().start()
+        if settings.INDEXER_IN_PROCESS:
+            get_loan_indexer().start()
+        if settings.LOAN_ARCHIVE_IN_PROCESS:
+            get_loan_archiver().start()
@@ -0,0 +1,214 @@
+# archival of the repaid and foreclosed loans
+import functools
+import logging
+import time
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import models
+from .loan_rollups import CLOSED_STATUSES
+from .periodic import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+# the columns of the loans, copied as they are to the archived loans
+LOAN_COLUMNS = ", ".join(field.column for field in models.Loan._meta.concrete_fields)
+
+# the closed loans to archive, found through the partial index of the
+# closed loans
+CLOSED_LOANS_FILTER = f"""
+status IN ({", ".join(str(status) for status in CLOSED_STATUSES)})
+AND closed_at <= %s
+"""
+HAS_RENEGOTIATION_OFFERS = """
+EXISTS (
+    SELECT 1 FROM core_renegotiationoffer AS offer WHERE offer.loan_id = core_loan.id
+)
+"""
+
+# locks a batch of closed loans. The loans with renegotiation offers are kept,
+# since the offers reference them and the archived loans cannot be referenced,
+# and the loans locked by another archiver are skipped.
+SELECT_ARCHIVABLE_LOANS_SQL = f"""
+SELECT id, start_time FROM core_loan
+WHERE {CLOSED_LOANS_FILTER} AND NOT {HAS_RENEGOTIATION_OFFERS}
+ORDER BY closed_at
+LIMIT %s
+FOR UPDATE SKIP LOCKED
+"""
+
+# counts the closed loans that are kept for their renegotiation offers
+COUNT_KEPT_LOANS_SQL = f"""
+SELECT COUNT(*) FROM core_loan
+WHERE {CLOSED_LOANS_FILTER} AND {HAS_RENEGOTIATION_OFFERS}
+"""
+
+# moves the locked loans to the partitions of their start time
+MOVE_LOANS_SQL = f"""
+WITH moved AS (
+    DELETE FROM core_loan WHERE id = ANY(%s::uuid[])
+    RETURNING {LOAN_COLUMNS}
+)
+INSERT INTO core_loanhistory ({LOAN_COLUMNS}, archived_at)
+SELECT {LOAN_COLUMNS}, NOW() FROM moved
+"""
+
+CREATE_PARTITION_SQL = """
+CREATE TABLE IF NOT EXISTS {name} PARTITION OF core_loanhistory
+FOR VALUES FROM (%s) TO (%s)
+"""
+
+
+def _month(value: datetime) -> datetime:
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _next_month(month: datetime) -> datetime:
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def find_loan(loan_id: int) -> models.Loan | models.ArchivedLoan | None:
+    """
+    The loan with a loan id, whether it is archived or not
+    """
+    return (
+        models.Loan.objects.filter(loan_id=loan_id).first()
+        or models.ArchivedLoan.objects.filter(loan_id=loan_id).first()
+    )
+
+
+class LoanArchiver(PeriodicTask):
+    """
+    ### Description
+    Moves the loans that were repaid or foreclosed more than `archive_after`
+    ago to the archived loans, in batches of `batch_size` loans. Every
+    batch is a transaction of its own, and a run stops after `max_batches`
+    batches. The monthly partitions of the archived loans are created
+    when their first loan is archived.
+
+    The closed loans with renegotiation offers are not archived, the offers
+    would lose their loan. They stay in the loans and every run counts them.
+
+    The archiver keeps the counters of its runs, and `start` runs it every
+    `interval` seconds in a daemon thread of the current process.
+    """
+
+    name = "loan-archiver"
+
+    def __init__(
+        self,
+        archive_after: timedelta,
+        batch_size: int,
+        max_batches: int,
+        interval: float,
+    ):
+        super().__init__(interval)
+        self.archive_after = archive_after
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.runs = 0
+        self.archived = 0
+        self.last_run = None
+        # the partitions known to exist, by first day of their month
+        self._partitions = set()
+
+    def archive(self, now: datetime | None = None) -> dict:
+        """
+        Archive the loans closed before `now` minus `archive_after`,
+        `now` being the current time by default.
+        Returns:
+            dict: the number of archived loans, of batches, of loans kept
+            for their renegotiation offers and the duration
+        """
+        now = timezone.now() if now is None else now
+        closed_before = now - self.archive_after
+        started_at = time.monotonic()
+        archived = batches = 0
+        while batches < self.max_batches:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    SELECT_ARCHIVABLE_LOANS_SQL, [closed_before, self.batch_size]
+                )
+                loans = cursor.fetchall()
+                if loans:
+                    self._create_partitions(
+                        cursor, {_month(start_time) for _, start_time in loans}
+                    )
+                    cursor.execute(MOVE_LOANS_SQL, [[str(id) for id, _ in loans]])
+            batches += 1
+            archived += len(loans)
+            if len(loans) < self.batch_size:
+                break
+        with connection.cursor() as cursor:
+            cursor.execute(COUNT_KEPT_LOANS_SQL, [closed_before])
+            (kept,) = cursor.fetchone()
+
+        run = {
+            "archived": archived,
+            "batches": batches,
+            "kept": kept,
+            "seconds": time.monotonic() - started_at,
+            "finished_at": time.time(),
+        }
+        with self._lock:
+            self.runs += 1
+            self.archived += archived
+            self.last_run = run
+        logger.info(
+            "Archived %s closed loans in %s batches in %.3fs, "
+            "kept %s with renegotiation offers",
+            archived,
+            batches,
+            run["seconds"],
+            kept,
+        )
+        return run
+
+    def _create_partitions(self, cursor, months: set[datetime]):
+        months = months - self._partitions
+        if not months:
+            return
+        # serialize the creations, so two archivers do not create a partition
+        # at the same time
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext('core_loanhistory'))")
+        for month in sorted(months):
+            cursor.execute(
+                CREATE_PARTITION_SQL.format(
+                    name=f"core_loanhistory_{month:%Y_%m}",
+                ),
+                [month, _next_month(month)],
+            )
+        # remembered once the partitions are committed
+        transaction.on_commit(functools.partial(self._partitions.update, months))
+
+    def stats(self) -> dict:
+        """
+        The counters of the runs of the archiver
+        """
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "archived": self.archived,
+                "last_run": self.last_run,
+            }
+
+    def run(self):
+        self.archive()
+
+
+@functools.cache
+def get_loan_archiver() -> LoanArchiver:
+    """
+    The loan archiver configured in the settings
+    """
+    return LoanArchiver(
+        timedelta(days=settings.LOAN_ARCHIVE_AFTER_DAYS),
+        settings.LOAN_ARCHIVE_BATCH_SIZE,
+        settings.LOAN_ARCHIVE_MAX_BATCHES,
+        settings.LOAN_ARCHIVE_INTERVAL,
+    )
@@ -11,3 +11,10 @@ class InvalidSignature(APIException):
     status_code = 400
     default_code = "invalid_signature"
     default_detail = "The signature is invalid"
+
+
+class SignatureVerificationUnavailable(APIException):
+    status_code = 503
+    default_code = "signature_verification_unavailable"
+    default_detail = "Too many signatures are being verified, try again later"
+    wait = 1
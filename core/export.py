@@ -0,0 +1,78 @@
+# NDJSON export of the open listings
+import json
+from collections.abc import AsyncIterator, Iterator
+from datetime import datetime
+from itertools import islice
+from uuid import UUID
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Prefetch
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Listing, ListingStatus, Offer
+from .serializers import ListingExportSerializer
+
+
+def export_open_listings(
+    after_created_at: datetime | None = None,
+    after_id: UUID | None = None,
+    chunk_size: int | None = None,
+) -> Iterator[str]:
+    """
+    Yield the open listings and their offers as NDJSON lines, oldest first.
+    The listings are read through a server-side cursor `chunk_size` rows
+    at a time, with one offers query per chunk, so the memory does not
+    grow with the table.
+    Args:
+        after_created_at(datetime): resume after the listings created before
+            this time, or at this time if after_id is given
+        after_id(UUID): resume after the listing created at after_created_at
+            with this id
+        chunk_size(int): the number of listings fetched at a time
+    Returns:
+        Iterator[str]: a JSON document per listing, ending with a new line
+    """
+    queryset = (
+        Listing.objects.filter(status=ListingStatus.OPEN)
+        .order_by("created_at", "id")
+        .prefetch_related(
+            Prefetch("offer_set", queryset=Offer.objects.order_by("created_at", "id"))
+        )
+    )
+    if after_created_at is not None and after_id is not None:
+        queryset = queryset.filter(created_at__gte=after_created_at).exclude(
+            created_at=after_created_at, id__lte=after_id
+        )
+    elif after_created_at is not None:
+        queryset = queryset.filter(created_at__gt=after_created_at)
+
+    for listing in queryset.iterator(
+        chunk_size=chunk_size or settings.EXPORT_CHUNK_SIZE
+    ):
+        data = ListingExportSerializer(listing).data
+        yield json.dumps(data, cls=JSONEncoder) + "\n"
+
+
+async def aexport_open_listings(
+    after_created_at: datetime | None = None,
+    after_id: UUID | None = None,
+    chunk_size: int | None = None,
+) -> AsyncIterator[str]:
+    """
+    The `export_open_listings` lines for the ASGI application. Every chunk
+    is read in the thread of the database connection of the request and
+    yielded as one string, so the event loop is not blocked and the export
+    is not read whole in memory.
+    Returns:
+        AsyncIterator[str]: the JSON documents of a chunk of listings
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    lines = export_open_listings(after_created_at, after_id, chunk_size)
+    next_chunk = sync_to_async(lambda: "".join(islice(lines, chunk_size)))
+    try:
+        while chunk := await next_chunk():
+            yield chunk
+    finally:
+        # closes the server-side cursor
+        await sync_to_async(lines.close)()
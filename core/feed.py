@@ -0,0 +1,452 @@
+# real-time feed of the listings and the offers
+import asyncio
+import functools
+import json
+import logging
+import select
+import threading
+from collections import defaultdict
+from collections.abc import Iterable
+from functools import partial
+from urllib.parse import parse_qs
+
+import psycopg2
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+from psycopg2 import sql
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# the channel of the subscribers to every collection
+ALL_COLLECTIONS = "*"
+
+LISTING_FIELDS = (
+    "id",
+    "created_at",
+    "updated_at",
+    "user_id",
+    "nft_contract_address",
+    "nft_token_id",
+    "token_contract_address",
+    "borrow_amount",
+    "repayment_amount",
+    "duration",
+    "status",
+)
+OFFER_FIELDS = (
+    "id",
+    "created_at",
+    "user_id",
+    "listing_id",
+    "token_contract_address",
+    "borrow_amount",
+    "repayment_amount",
+    "duration",
+    "effective_apr",
+    "signature_expiry",
+)
+
+
+def _event(name: str, collection: str, data: dict) -> dict:
+    # the values are made JSON types, so the events are encoded the same way
+    # by every backend
+    return {
+        "event": name,
+        "collection": models.normalize_address(collection),
+        "data": json.loads(json.dumps(data, cls=DjangoJSONEncoder)),
+    }
+
+
+def listing_event(listing: models.Listing, action: str) -> dict:
+    """
+    The feed event of a created, updated or deleted listing
+    """
+    data = {field: getattr(listing, field) for field in LISTING_FIELDS}
+    return _event(f"listing.{action}", listing.nft_contract_address, data)
+
+
+def offer_event(
+    offer: models.Offer, action: str, collection: str | None = None
+) -> dict:
+    """
+    The feed event of a created, updated or deleted offer. The collection
+    is the NFT contract address of the listing of the offer, read from the
+    listing when it is not given, the listing should then be loaded with it.
+    """
+    data = {field: getattr(offer, field) for field in OFFER_FIELDS}
+    if collection is None:
+        collection = offer.listing.nft_contract_address
+    return _event(f"offer.{action}", collection, data)
+
+
+def listing_row_event(row: tuple, action: str) -> dict:
+    """
+    The feed event of a listing written in SQL, from a row of its
+    LISTING_FIELDS columns
+    """
+    return listing_event(models.Listing(**dict(zip(LISTING_FIELDS, row))), action)
+
+
+def offer_row_event(row: tuple, action: str) -> dict:
+    """
+    The feed event of an offer written in SQL, from a row of its
+    OFFER_FIELDS columns followed by the NFT contract address of its listing
+    """
+    data = dict(zip(OFFER_FIELDS, row))
+    return _event(f"offer.{action}", row[len(OFFER_FIELDS)], data)
+
+
+def publish_on_commit(*events: dict):
+    """
+    Publish the events once the current transaction is committed,
+    so the subscribers never see rolled back changes
+    """
+    if events:
+        transaction.on_commit(partial(_publish, list(events)))
+
+
+def _publish(events: list[dict]):
+    try:
+        get_feed_broker().publish_many(events)
+    except Exception:
+        # the feed is best effort, a failed publication fails no request
+        logger.exception("%s feed events were not published", len(events))
+
+
+class Subscription:
+    """
+    ### Description
+    The events of the channels of a feed consumer, queued in a bounded
+    queue of the event loop of the consumer. The events are delivered
+    from any thread.
+
+    A consumer that falls `queue_size` events behind is dropped: its
+    queue is emptied and it receives `None`, so it can tell the client
+    to reconnect, instead of holding the events of the other consumers.
+    """
+
+    def __init__(
+        self,
+        broker: "FeedBroker",
+        collections: frozenset[str],
+        queue_size: int,
+        loop: asyncio.AbstractEventLoop,
+    ):
+        self.broker = broker
+        self.collections = collections
+        self.queue = asyncio.Queue(queue_size)
+        self.loop = loop
+        self.closed = False
+
+    def deliver(self, name: str, payload: str):
+        try:
+            self.loop.call_soon_threadsafe(self._put, (name, payload))
+        except RuntimeError:
+            # the event loop of the consumer is closed
+            self.close()
+
+    def _put(self, message: tuple[str, str]):
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.broker.unsubscribe(self, dropped=True)
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self) -> tuple[str, str] | None:
+        """
+        The next (event name, JSON payload) of the channels, or None when
+        the consumer was dropped
+        """
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class FeedBroker:
+    """
+    ### Description
+    Fans the feed events out to the subscriptions of their collection and
+    to the subscriptions of every collection. The events are published
+    through the backend, which delivers them to the brokers of the
+    processes it connects.
+    """
+
+    def __init__(self, backend_class: type, queue_size: int):
+        self.backend = backend_class(self)
+        self.queue_size = queue_size
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, collections: Iterable[str] = ()) -> Subscription:
+        """
+        Subscribe the current event loop to the events of collections,
+        or of every collection when none is given
+        """
+        collections = frozenset(
+            models.normalize_address(collection) for collection in collections
+        ) or frozenset([ALL_COLLECTIONS])
+        subscription = Subscription(
+            self, collections, self.queue_size, asyncio.get_running_loop()
+        )
+        # the backend is started with the ASGI application, this does not
+        # block the event loop when it is not
+        self.backend.start(timeout=0)
+        with self._lock:
+            for collection in collections:
+                self._subscriptions[collection].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription, dropped: bool = False):
+        with self._lock:
+            if subscription.closed:
+                return
+            subscription.closed = True
+            self.dropped += dropped
+            for collection in subscription.collections:
+                self._subscriptions[collection].discard(subscription)
+                if not self._subscriptions[collection]:
+                    del self._subscriptions[collection]
+
+    def publish(self, event: dict):
+        self.publish_many([event])
+
+    def publish_many(self, events: list[dict]):
+        if not events:
+            return
+        self.backend.publish(events)
+        with self._lock:
+            self.published += len(events)
+
+    def dispatch(self, event: dict):
+        """
+        Deliver an event to the subscriptions of this process
+        """
+        payload = json.dumps(event)
+        with self._lock:
+            subscriptions = self._subscriptions.get(
+                event["collection"], set()
+            ) | self._subscriptions.get(ALL_COLLECTIONS, set())
+            self.delivered += len(subscriptions)
+        for subscription in subscriptions:
+            subscription.deliver(event["event"], payload)
+
+    def stats(self) -> dict:
+        """
+        The counters of the feed of this process
+        """
+        with self._lock:
+            return {
+                "subscriptions": len(set().union(*self._subscriptions.values())),
+                "published": self.published,
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+            }
+
+
+class LocalFeedBackend:
+    """
+    ### Description
+    Delivers the events to the subscriptions of the current process only,
+    for a single process deployment.
+    """
+
+    def __init__(self, broker: FeedBroker):
+        self.broker = broker
+
+    def start(self, timeout: float = 5):
+        pass
+
+    def publish(self, events: list[dict]):
+        for event in events:
+            self.broker.dispatch(event)
+
+
+class PostgresFeedBackend:
+    """
+    ### Description
+    Delivers the events to the subscriptions of every process, through the
+    NOTIFY messages of the FEED_CHANNEL Postgres channel. Every process
+    with subscriptions listens to the channel on a connection of its own,
+    in a daemon thread, and reconnects when the connection is lost. The
+    ASGI application starts listening when the process starts, before it
+    serves the subscribers.
+    """
+
+    def __init__(self, broker: FeedBroker):
+        self.broker = broker
+        self.channel = settings.FEED_CHANNEL
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._listening = threading.Event()
+        self._thread = None
+
+    def start(self, timeout: float = 5):
+        """
+        Start listening in the background, if it is not started yet,
+        and wait up to `timeout` seconds for the channel to be listened to
+        """
+        with self._lock:
+            if self._thread is None:
+                self._stopped.clear()
+                self._thread = threading.Thread(
+                    target=self._listen, name="feed-listener", daemon=True
+                )
+                self._thread.start()
+        # the events published after a subscription are not missed
+        self._listening.wait(timeout)
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stopped.set()
+        if thread is not None:
+            thread.join()
+        self._listening.clear()
+
+    def publish(self, events: list[dict]):
+        # a single statement for the events of a bulk write
+        with connections["default"].cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload",
+                [
+                    self.channel,
+                    [json.dumps(event, cls=DjangoJSONEncoder) for event in events],
+                ],
+            )
+
+    def _listen(self):
+        while not self._stopped.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(
+                    **connections["default"].get_connection_params()
+                )
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        sql.SQL("LISTEN {}").format(sql.Identifier(self.channel))
+                    )
+                self._listening.set()
+                while not self._stopped.is_set():
+                    if select.select([connection], [], [], 1) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notify = connection.notifies.pop(0)
+                        self.broker.dispatch(json.loads(notify.payload))
+            except Exception:
+                logger.exception("The feed listener failed")
+                self._stopped.wait(1)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+@functools.cache
+def get_feed_broker() -> FeedBroker:
+    """
+    The feed broker of the process, with the backend of the settings
+    """
+    return FeedBroker(import_string(settings.FEED_BACKEND), settings.FEED_QUEUE_SIZE)
+
+
+def parse_collections(value: str | None) -> list[str]:
+    """
+    The collections of a comma separated query parameter
+    """
+    return [collection for collection in (value or "").split(",") if collection]
+
+
+async def sse_stream(subscription: Subscription, heartbeat: float):
+    """
+    The server-sent events of a subscription, with a comment every
+    `heartbeat` seconds without events to keep the connection open
+    """
+    try:
+        # the client reconnects a second after the stream ends
+        yield "retry: 1000\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if message is None:
+                yield "event: overflow\ndata: {}\n\n"
+                return
+            name, payload = message
+            yield f"event: {name}\ndata: {payload}\n\n"
+    finally:
+        subscription.close()
+
+
+async def websocket_feed(scope, receive, send):
+    """
+    The ASGI application of the WebSocket feed. The collections are read
+    from the `collections` query parameter, and the events are sent as
+    JSON text messages. A dropped consumer is closed with the 1013
+    (try again later) code.
+    """
+    if (await receive())["type"] != "websocket.connect":
+        return
+    query = parse_qs(scope.get("query_string", b"").decode())
+    subscription = get_feed_broker().subscribe(
+        parse_collections(",".join(query.get("collections", [])))
+    )
+    await send({"type": "websocket.accept"})
+
+    async def wait_for_disconnect():
+        # the messages of the client are ignored
+        while (await receive())["type"] != "websocket.disconnect":
+            pass
+
+    disconnected = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        while True:
+            message = asyncio.ensure_future(subscription.get())
+            await asyncio.wait(
+                {message, disconnected}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected.done():
+                message.cancel()
+                return
+            if message.result() is None:
+                await send({"type": "websocket.close", "code": 1013})
+                return
+            await send({"type": "websocket.send", "text": message.result()[1]})
+    finally:
+        disconnected.cancel()
+        subscription.close()
+
+
+class FeedRouter:
+    """
+    ### Description
+    The ASGI application of the project: the WebSocket connections to
+    `FEED_WEBSOCKET_PATH` go to the WebSocket feed, and the other
+    requests go to the Django application.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "websocket":
+            return await self.application(scope, receive, send)
+        if scope["path"] == settings.FEED_WEBSOCKET_PATH:
+            return await websocket_feed(scope, receive, send)
+        # Django does not serve WebSockets
+        await receive()
+        await send({"type": "websocket.close"})
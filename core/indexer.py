@@ -0,0 +1,510 @@
+# indexing of the loan events of the Starknet contract
+import functools
+import json
+import logging
+import time
+import urllib.request
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from starknet_py.hash.selector import get_selector_from_name
+
+from . import models
+from .feed import LISTING_FIELDS, listing_event, publish_on_commit
+from .listing_cache import bump_generations
+from .loan_rollups import apply_loan_rollup_deltas, loan_rollup_rows
+from .periodic import PeriodicTask
+from .portfolio import invalidate_portfolios
+from .rollups import apply_rollup_deltas, listing_rollup_keys
+
+logger = logging.getLogger(__name__)
+
+# the keys of the loan events are [selector, loan id], the u256 values of
+# their data are split into (low, high) felts:
+# - LoanStarted: borrower, lender, nft contract, nft token id (u256),
+#   token contract, borrow amount (u256), repayment amount (u256),
+#   duration, start time
+# - LoanRepaid, LoanForeclosed: the time the loan was closed
+LOAN_STARTED = get_selector_from_name("LoanStarted")
+LOAN_REPAID = get_selector_from_name("LoanRepaid")
+LOAN_FORECLOSED = get_selector_from_name("LoanForeclosed")
+CLOSE_STATUSES = {
+    LOAN_REPAID: models.LoanStatus.REPAID,
+    LOAN_FORECLOSED: models.LoanStatus.FORECLOSED,
+}
+
+# the largest values of the bigint and integer columns of the loans
+MAX_BIGINT = 2**63 - 1
+MAX_INTEGER = 2**31 - 1
+# the columns of a started loan and their largest value
+LOAN_LIMITS = {
+    "loan_id": MAX_BIGINT,
+    "nft_token_id": MAX_BIGINT,
+    "borrow_amount": MAX_BIGINT,
+    "repayment_amount": MAX_BIGINT,
+    "duration": MAX_INTEGER,
+}
+
+# serializes the writes of the indexers of a checkpoint, until the commit
+LOCK_CHECKPOINT_SQL = "SELECT pg_advisory_xact_lock(hashtext(%s))"
+
+# inserts the started loans, the loans that are already indexed or archived
+# are left as they are so a range can be indexed again
+INSERT_LOANS_SQL = f"""
+INSERT INTO core_loan
+    (id, created_at, updated_at, borrower, lender, loan_id,
+    nft_contract_address, nft_token_id, token_contract_address,
+    borrow_amount, repayment_amount, duration, start_time, status, due_at)
+SELECT gen_random_uuid(), NOW(), NOW(), loan.*, {models.LoanStatus.PENDING},
+    loan.start_time + make_interval(secs => loan.duration)
+FROM unnest(
+    %s::text[], %s::text[], %s::bigint[], %s::text[], %s::bigint[],
+    %s::text[], %s::bigint[], %s::bigint[], %s::integer[], %s::timestamptz[]
+) AS loan (borrower, lender, loan_id, nft_contract_address, nft_token_id,
+    token_contract_address, borrow_amount, repayment_amount, duration,
+    start_time)
+WHERE NOT EXISTS (
+    SELECT 1 FROM core_loanhistory AS archived WHERE archived.loan_id = loan.loan_id
+)
+ON CONFLICT (loan_id) DO NOTHING
+RETURNING loan_id, borrower, lender, nft_contract_address, nft_token_id,
+    token_contract_address, borrow_amount, start_time
+"""
+
+# closes the repaid and foreclosed loans that are not closed yet
+CLOSE_LOANS_SQL = """
+UPDATE core_loan SET
+    status = closed.status, closed_at = closed.closed_at, updated_at = NOW()
+FROM unnest(%s::bigint[], %s::integer[], %s::timestamptz[])
+    AS closed (loan_id, status, closed_at)
+WHERE core_loan.loan_id = closed.loan_id AND core_loan.closed_at IS NULL
+RETURNING core_loan.borrower, core_loan.lender, core_loan.nft_contract_address,
+    core_loan.token_contract_address, core_loan.borrow_amount,
+    core_loan.start_time, core_loan.closed_at
+"""
+
+# closes the open listings of the NFTs of the started loans
+CLOSE_LISTINGS_SQL = f"""
+UPDATE core_listing SET status = {models.ListingStatus.CLOSED}, updated_at = NOW()
+FROM unnest(%s::text[], %s::bigint[]) AS nft (nft_contract_address, nft_token_id)
+WHERE core_listing.nft_contract_address = nft.nft_contract_address
+AND core_listing.nft_token_id = nft.nft_token_id
+AND core_listing.status = {models.ListingStatus.OPEN}
+RETURNING {", ".join(f"core_listing.{field}" for field in LISTING_FIELDS)}
+"""
+
+
+class StarknetRPCError(Exception):
+    """
+    A failed Starknet JSON-RPC request
+    """
+
+
+class StarknetRPCClient:
+    """
+    ### Description
+    A minimal client of the Starknet JSON-RPC API. It holds no connection,
+    so it can be used from several threads at a time.
+    """
+
+    def __init__(self, url: str, timeout: float = 30):
+        self.url = url
+        self.timeout = timeout
+
+    def call(self, method: str, params: dict | list):
+        """
+        Call a JSON-RPC method.
+        Returns:
+            the result of the call
+        Raises:
+            StarknetRPCError: when the request fails or the call returns an error
+        """
+        body = json.dumps(
+            {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
+        ).encode()
+        request = urllib.request.Request(
+            self.url, body, {"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                payload = json.load(response)
+        except (OSError, ValueError) as e:
+            raise StarknetRPCError(f"{method} failed: {e}") from e
+        if "error" in payload:
+            raise StarknetRPCError(f"{method} failed: {payload['error']}")
+        return payload["result"]
+
+    def block_number(self) -> int:
+        return self.call("starknet_blockNumber", [])
+
+    def get_events(
+        self,
+        address: str,
+        keys: list[list[str]],
+        from_block: int,
+        to_block: int,
+        chunk_size: int,
+    ) -> list[dict]:
+        """
+        The events of a contract between two blocks (both included),
+        read page by page
+        """
+        events = []
+        event_filter = {
+            "from_block": {"block_number": from_block},
+            "to_block": {"block_number": to_block},
+            "address": address,
+            "keys": keys,
+            "chunk_size": chunk_size,
+        }
+        while True:
+            page = self.call("starknet_getEvents", {"filter": event_filter})
+            events += page["events"]
+            if not page.get("continuation_token"):
+                return events
+            event_filter["continuation_token"] = page["continuation_token"]
+
+
+def _felt(value: str) -> int:
+    return int(value, 16)
+
+
+def _u256(low: str, high: str) -> int:
+    return _felt(low) + (_felt(high) << 128)
+
+
+def _timestamp(value: str) -> datetime:
+    return datetime.fromtimestamp(_felt(value), dt_timezone.utc)
+
+
+def parse_loan_events(events: list[dict]) -> tuple[dict, dict]:
+    """
+    The started and the closed loans of the events, by loan id.
+    A later event of a loan replaces an earlier one. The loans with
+    values that do not fit in their columns are skipped and logged,
+    they would fail the writes of their range every time.
+    """
+    started, closed = {}, {}
+    for event in events:
+        selector, loan_id = _felt(event["keys"][0]), _felt(event["keys"][1])
+        data = event["data"]
+        if loan_id > MAX_BIGINT:
+            logger.warning(
+                "Skipped the events of loan %s, its id is too large", loan_id
+            )
+            continue
+        if selector == LOAN_STARTED:
+            loan = {
+                "borrower": hex(_felt(data[0])),
+                "lender": hex(_felt(data[1])),
+                "loan_id": loan_id,
+                "nft_contract_address": hex(_felt(data[2])),
+                "nft_token_id": _u256(data[3], data[4]),
+                "token_contract_address": hex(_felt(data[5])),
+                "borrow_amount": _u256(data[6], data[7]),
+                "repayment_amount": _u256(data[8], data[9]),
+                "duration": _felt(data[10]),
+                "start_time": _timestamp(data[11]),
+            }
+            overflows = [
+                column for column, limit in LOAN_LIMITS.items() if loan[column] > limit
+            ]
+            if overflows:
+                logger.warning(
+                    "Skipped the started loan %s, too large: %s",
+                    loan_id,
+                    ", ".join(overflows),
+                )
+                continue
+            started[loan_id] = loan
+        elif selector in CLOSE_STATUSES:
+            closed[loan_id] = (CLOSE_STATUSES[selector], _timestamp(data[0]))
+    return started, closed
+
+
+class LoanEventIndexer(PeriodicTask):
+    """
+    ### Description
+    Indexes the loan events of the loan contract into the loans: the
+    started loans are inserted and close the open listings of their NFT,
+    and the repaid and foreclosed loans are closed.
+
+    The blocks after the checkpoint are read in ranges of `batch_size`
+    blocks, with `max_in_flight` ranges read at a time, and the ranges are
+    written in order. Every range is written in a transaction of its own,
+    with the listing counts, the loan rollups and the checkpoint, so an
+    interrupted run resumes after the last written range.
+
+    The indexer keeps the counters of its runs, and `start` runs it every
+    `interval` seconds in a daemon thread of the current process.
+    """
+
+    name = "loan-indexer"
+
+    def __init__(
+        self,
+        client: StarknetRPCClient,
+        contract_address: str,
+        start_block: int,
+        batch_size: int,
+        max_in_flight: int,
+        chunk_size: int,
+        confirmations: int,
+        interval: float,
+    ):
+        super().__init__(interval)
+        self.client = client
+        self.contract_address = models.normalize_address(contract_address)
+        self.start_block = start_block
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.chunk_size = chunk_size
+        self.confirmations = confirmations
+        self.runs = 0
+        self.events = 0
+        self.blocks = 0
+        self.last_run = None
+
+    def checkpoint(self) -> int | None:
+        """
+        The last indexed block
+        """
+        return (
+            models.IndexerCheckpoint.objects.filter(name=self.name)
+            .values_list("block_number", flat=True)
+            .first()
+        )
+
+    def index(self, to_block: int | None = None, report=None) -> dict:
+        """
+        Index the blocks after the checkpoint, up to `to_block` or the
+        confirmed head of the chain.
+        Args:
+            to_block(int): the last block to index
+            report(Callable): called with the progress after every range
+        Returns:
+            dict: the numbers of indexed blocks, events, inserted and closed
+            loans and closed listings, the checkpoint and the events per second
+        """
+        started_at = time.monotonic()
+        checkpoint = self.checkpoint()
+        from_block = self.start_block if checkpoint is None else checkpoint + 1
+        if to_block is None:
+            to_block = self.client.block_number() - self.confirmations
+        progress = {
+            "blocks": 0,
+            "events": 0,
+            "inserted": 0,
+            "closed": 0,
+            "listings_closed": 0,
+            "checkpoint": checkpoint,
+            "seconds": 0.0,
+            "events_per_second": 0.0,
+        }
+        ranges = (
+            (start, min(start + self.batch_size - 1, to_block))
+            for start in range(from_block, to_block + 1, self.batch_size)
+        )
+        keys = [[hex(LOAN_STARTED), hex(LOAN_REPAID), hex(LOAN_FORECLOSED)]]
+        executor = ThreadPoolExecutor(self.max_in_flight, f"{self.name}-rpc")
+        pending = deque()
+        try:
+            while True:
+                # keep max_in_flight ranges read ahead of the written one
+                for start, end in islice(ranges, self.max_in_flight - len(pending)):
+                    future = executor.submit(
+                        self.client.get_events,
+                        self.contract_address,
+                        keys,
+                        start,
+                        end,
+                        self.chunk_size,
+                    )
+                    pending.append((start, end, future))
+                if not pending:
+                    break
+                start, end, future = pending.popleft()
+                events = future.result()
+                written = self.write_range(end, events)
+                progress["blocks"] += end - start + 1
+                progress["events"] += len(events)
+                for key, count in written.items():
+                    progress[key] += count
+                progress["checkpoint"] = end
+                elapsed = time.monotonic() - started_at
+                progress["seconds"] = elapsed
+                progress["events_per_second"] = progress["events"] / max(elapsed, 1e-9)
+                if report is not None:
+                    report(progress)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        run = {**progress, "finished_at": time.time()}
+        with self._lock:
+            self.runs += 1
+            self.events += progress["events"]
+            self.blocks += progress["blocks"]
+            self.last_run = run
+        logger.info(
+            "Indexed %s loan events of %s blocks in %.3fs",
+            progress["events"],
+            progress["blocks"],
+            progress["seconds"],
+        )
+        return run
+
+    def write_range(self, to_block: int, events: list[dict]) -> dict:
+        """
+        Write the events of a range and move the checkpoint to its last
+        block, in a single transaction. The indexers of the same checkpoint
+        write one at a time, a range that another indexer already wrote
+        is skipped.
+        Returns:
+            dict: the numbers of inserted and closed loans and closed listings
+        """
+        started, closed = parse_loan_events(events)
+        loan_deltas, listing_deltas = Counter(), Counter()
+        addresses, collections, feed_events = set(), set(), []
+        inserted, closed_loans, closed_listings = [], [], []
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(LOCK_CHECKPOINT_SQL, [self.name])
+            checkpoint = self.checkpoint()
+            if checkpoint is not None and checkpoint >= to_block:
+                logger.info("Skipped the blocks up to %s, already indexed", to_block)
+                return {"inserted": 0, "closed": 0, "listings_closed": 0}
+            if started:
+                cursor.execute(
+                    INSERT_LOANS_SQL,
+                    [
+                        [loan[column] for loan in started.values()]
+                        for column in (
+                            "borrower",
+                            "lender",
+                            "loan_id",
+                            "nft_contract_address",
+                            "nft_token_id",
+                            "token_contract_address",
+                            "borrow_amount",
+                            "repayment_amount",
+                            "duration",
+                            "start_time",
+                        )
+                    ],
+                )
+                inserted = cursor.fetchall()
+            if inserted:
+                cursor.execute(
+                    CLOSE_LISTINGS_SQL,
+                    [[row[3] for row in inserted], [row[4] for row in inserted]],
+                )
+                closed_listings = cursor.fetchall()
+            if closed:
+                cursor.execute(
+                    CLOSE_LOANS_SQL,
+                    [
+                        list(closed),
+                        [status for status, _ in closed.values()],
+                        [closed_at for _, closed_at in closed.values()],
+                    ],
+                )
+                closed_loans = cursor.fetchall()
+
+            for _, borrower, lender, nft, _, token, amount, start_time in inserted:
+                addresses.update((borrower, lender))
+                loan_deltas.update(
+                    loan_rollup_rows(
+                        models.Loan(
+                            nft_contract_address=nft,
+                            token_contract_address=token,
+                            borrow_amount=amount,
+                            start_time=start_time,
+                        )
+                    )
+                )
+            for (
+                borrower,
+                lender,
+                nft,
+                token,
+                amount,
+                start_time,
+                closed_at,
+            ) in closed_loans:
+                addresses.update((borrower, lender))
+                loan = models.Loan(
+                    nft_contract_address=nft,
+                    token_contract_address=token,
+                    borrow_amount=amount,
+                    start_time=start_time,
+                )
+                loan_deltas.subtract(loan_rollup_rows(loan))
+                loan.closed_at = closed_at
+                loan_deltas.update(loan_rollup_rows(loan))
+            for row in closed_listings:
+                listing = models.Listing(**dict(zip(LISTING_FIELDS, row)))
+                collections.add(listing.nft_contract_address)
+                listing.status = models.ListingStatus.OPEN
+                listing_deltas.subtract(listing_rollup_keys(listing))
+                listing.status = models.ListingStatus.CLOSED
+                listing_deltas.update(listing_rollup_keys(listing))
+                feed_events.append(listing_event(listing, "updated"))
+
+            apply_loan_rollup_deltas(loan_deltas)
+            apply_rollup_deltas(listing_deltas)
+            models.IndexerCheckpoint.objects.update_or_create(
+                name=self.name, defaults={"block_number": to_block}
+            )
+            transaction.on_commit(
+                partial(self._invalidate, sorted(addresses), sorted(collections))
+            )
+            # the listings closed in SQL send no signals
+            publish_on_commit(*feed_events)
+        return {
+            "inserted": len(inserted),
+            "closed": len(closed_loans),
+            "listings_closed": len(closed_listings),
+        }
+
+    @staticmethod
+    def _invalidate(addresses: list[str], collections: list[str]):
+        invalidate_portfolios(*addresses)
+        for nft_contract_address in collections:
+            bump_generations(nft_contract_address)
+
+    def stats(self) -> dict:
+        """
+        The counters of the runs of the indexer
+        """
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "events": self.events,
+                "blocks": self.blocks,
+                "last_run": self.last_run,
+            }
+
+    def run(self):
+        self.index()
+
+
+@functools.cache
+def get_loan_indexer() -> LoanEventIndexer:
+    """
+    The loan event indexer configured in the settings
+    """
+    return LoanEventIndexer(
+        StarknetRPCClient(settings.STARKNET_RPC_URL, settings.STARKNET_RPC_TIMEOUT),
+        settings.LOAN_CONTRACT_ADDRESS,
+        settings.INDEXER_START_BLOCK,
+        settings.INDEXER_BLOCK_BATCH_SIZE,
+        settings.INDEXER_MAX_IN_FLIGHT,
+        settings.INDEXER_CHUNK_SIZE,
+        settings.INDEXER_CONFIRMATIONS,
+        settings.INDEXER_INTERVAL,
+    )
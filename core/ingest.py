@@ -0,0 +1,422 @@
+# bulk ingestion of listings and loans
+import csv
+import io
+import json
+import time
+from collections.abc import Callable, Iterable, Iterator
+
+from django.db import connection, transaction
+from rest_framework import serializers
+
+from . import models
+from .feed import LISTING_FIELDS, listing_row_event, publish_on_commit
+from .listing_cache import bump_generations
+from .loan_rollups import rebuild_loan_rollups
+from .portfolio import invalidate_all_portfolios
+from .rollups import rebuild_rollups
+
+
+class ListingIngestSerializer(serializers.Serializer):
+    """
+    Serializer class for an ingested listing.
+    The borrower is the public key of the user, who is created if needed.
+    """
+
+    borrower = serializers.CharField(max_length=70)
+    nft_contract_address = serializers.CharField(max_length=70)
+    nft_token_id = serializers.IntegerField(min_value=0)
+    token_contract_address = serializers.CharField(
+        max_length=70, required=False, allow_null=True
+    )
+    borrow_amount = serializers.IntegerField(
+        min_value=0, required=False, allow_null=True
+    )
+    repayment_amount = serializers.IntegerField(
+        min_value=0, required=False, allow_null=True
+    )
+    duration = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    status = serializers.ChoiceField(
+        choices=models.ListingStatus.choices,
+        required=False,
+        default=models.ListingStatus.OPEN,
+    )
+
+    def validate_borrower(self, value: str) -> str:
+        return models.normalize_address(value)
+
+    def validate_nft_contract_address(self, value: str) -> str:
+        return models.normalize_address(value)
+
+    def validate_token_contract_address(self, value: str | None) -> str | None:
+        return models.normalize_address(value)
+
+
+class LoanIngestSerializer(serializers.Serializer):
+    """
+    Serializer class for an ingested loan
+    """
+
+    borrower = serializers.CharField(max_length=70)
+    lender = serializers.CharField(max_length=70)
+    loan_id = serializers.IntegerField(min_value=0)
+    nft_contract_address = serializers.CharField(max_length=70)
+    nft_token_id = serializers.IntegerField(min_value=0)
+    token_contract_address = serializers.CharField(max_length=70)
+    borrow_amount = serializers.IntegerField(min_value=0)
+    repayment_amount = serializers.IntegerField(min_value=0)
+    duration = serializers.IntegerField(min_value=0)
+    start_time = serializers.DateTimeField()
+    status = serializers.ChoiceField(
+        choices=models.LoanStatus.choices,
+        required=False,
+        default=models.LoanStatus.PENDING,
+    )
+
+    def validate_borrower(self, value: str) -> str:
+        return models.normalize_address(value)
+
+    def validate_lender(self, value: str) -> str:
+        return models.normalize_address(value)
+
+    def validate_nft_contract_address(self, value: str) -> str:
+        return models.normalize_address(value)
+
+    def validate_token_contract_address(self, value: str) -> str:
+        return models.normalize_address(value)
+
+
+class Ingester:
+    """
+    ### Description
+    Loads rows in bulk: every batch is validated, copied into a temporary
+    staging table with `COPY` and merged into the model table in its own
+    transaction. The merge is idempotent, so an interrupted ingestion
+    can be run again from the start.
+    Subclasses define the staging table, the serializer and the merge.
+    """
+
+    serializer_class = None
+    staging_table = None
+    # the staging columns and their types, in the order of the copied rows
+    staging_columns = ()
+
+    def __init__(self, batch_size: int = 10000):
+        self.batch_size = batch_size
+
+    def ingest(
+        self, rows: Iterable[dict], report: Callable[[dict], None] | None = None
+    ) -> dict:
+        """
+        Validate and merge the rows.
+        Args:
+            rows(Iterable[dict]): the rows to ingest
+            report(Callable): called with the progress after every batch
+        Returns:
+            dict: the number of read, invalid, inserted and updated rows,
+            the errors of the invalid rows by line and the rows per second
+        """
+        progress = {
+            "read": 0,
+            "invalid": 0,
+            "inserted": 0,
+            "updated": 0,
+            "errors": {},
+            "rows_per_second": 0.0,
+        }
+        started_at = time.monotonic()
+        try:
+            for batch in self._batches(rows, progress):
+                with transaction.atomic():
+                    self._copy(batch)
+                    inserted, updated = self.merge()
+                    self._drop()
+                progress["inserted"] += inserted
+                progress["updated"] += updated
+                elapsed = time.monotonic() - started_at
+                progress["rows_per_second"] = progress["read"] / max(elapsed, 1e-9)
+                if report is not None:
+                    report(progress)
+        finally:
+            if progress["inserted"] or progress["updated"]:
+                self.finish()
+        return progress
+
+    def merge(self) -> tuple[int, int]:
+        """
+        Merge the staging table into the model table
+        Returns:
+            tuple[int, int]: the number of inserted and updated rows
+        """
+        raise NotImplementedError
+
+    def finish(self):
+        """
+        Refresh what the signals of the model would have, after the merges
+        """
+
+    def _batches(self, rows: Iterable[dict], progress: dict) -> Iterator[list]:
+        serializer = self.serializer_class()
+        batch = []
+        for line, row in enumerate(rows, start=1):
+            progress["read"] += 1
+            # the missing csv values are empty strings
+            row = {key: value for key, value in row.items() if value not in ("", None)}
+            try:
+                batch.append((line, serializer.run_validation(row)))
+            except serializers.ValidationError as e:
+                progress["invalid"] += 1
+                progress["errors"][line] = e.detail
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _copy(self, batch: list[tuple[int, dict]]):
+        names = [name for name, _ in self.staging_columns]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for line, data in batch:
+            # None is written as an unquoted empty value, which is NULL
+            writer.writerow([line] + [data.get(name) for name in names])
+        buffer.seek(0)
+
+        columns = ", ".join(
+            ["line bigint"] + [f"{name} {type}" for name, type in self.staging_columns]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TEMPORARY TABLE {self.staging_table} ({columns})")
+            cursor.copy_expert(
+                f"COPY {self.staging_table} (line, {', '.join(names)}) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+
+    def _drop(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {self.staging_table}")
+
+
+class ListingIngester(Ingester):
+    """
+    ### Description
+    Loads listings. A listing is identified by its NFT: the most recent
+    listing of the NFT is updated, or a listing is created if the NFT
+    has none. The borrowers are created if they do not exist.
+    The listings table is locked against writes during each merge.
+
+    The merges skip the signals of the listings, so the search documents
+    are rebuilt with the merge, the feed events are published when the
+    merge is committed, and the listing counts and the cached listing
+    pages are refreshed once the ingestion ends.
+    """
+
+    serializer_class = ListingIngestSerializer
+    staging_table = "ingest_listing"
+    staging_columns = (
+        ("borrower", "text"),
+        ("nft_contract_address", "text"),
+        ("nft_token_id", "bigint"),
+        ("token_contract_address", "text"),
+        ("borrow_amount", "bigint"),
+        ("repayment_amount", "bigint"),
+        ("duration", "integer"),
+        ("status", "integer"),
+    )
+
+    CREATE_BORROWERS_SQL = """
+    INSERT INTO core_user
+        (id, password, is_superuser, is_staff, is_active, date_joined,
+        created_at, updated_at, public_key)
+    SELECT gen_random_uuid(), '!', FALSE, FALSE, TRUE, NOW(), NOW(), NOW(), borrower
+    FROM (SELECT DISTINCT borrower FROM ingest_listing) AS staged
+    ON CONFLICT (public_key) DO NOTHING
+    """
+
+    MERGE_SQL = f"""
+    WITH staged AS (
+        -- the last row of each NFT wins
+        SELECT DISTINCT ON (nft_contract_address, nft_token_id)
+            staged.*, borrower.id AS user_id
+        FROM ingest_listing AS staged
+        JOIN core_user AS borrower ON borrower.public_key = staged.borrower
+        ORDER BY nft_contract_address, nft_token_id, line DESC
+    ), latest AS (
+        SELECT DISTINCT ON (listing.nft_contract_address, listing.nft_token_id)
+            listing.id, listing.nft_contract_address, listing.nft_token_id
+        FROM core_listing AS listing
+        JOIN staged USING (nft_contract_address, nft_token_id)
+        ORDER BY listing.nft_contract_address, listing.nft_token_id,
+            listing.created_at DESC, listing.id DESC
+    ), updated AS (
+        UPDATE core_listing AS listing SET
+            updated_at = NOW(),
+            user_id = staged.user_id,
+            token_contract_address = staged.token_contract_address,
+            borrow_amount = staged.borrow_amount,
+            repayment_amount = staged.repayment_amount,
+            duration = staged.duration,
+            status = staged.status
+        FROM staged JOIN latest USING (nft_contract_address, nft_token_id)
+        WHERE listing.id = latest.id
+        RETURNING {", ".join(f"listing.{field}" for field in LISTING_FIELDS)}
+    ), inserted AS (
+        INSERT INTO core_listing
+            (id, created_at, updated_at, user_id, nft_contract_address,
+            nft_token_id, token_contract_address, borrow_amount,
+            repayment_amount, duration, status, search_document)
+        SELECT gen_random_uuid(), NOW(), NOW(), user_id, nft_contract_address,
+            nft_token_id, token_contract_address, borrow_amount,
+            repayment_amount, duration, status, ''
+        FROM staged
+        WHERE NOT EXISTS (
+            SELECT 1 FROM latest
+            WHERE latest.nft_contract_address = staged.nft_contract_address
+            AND latest.nft_token_id = staged.nft_token_id
+        )
+        RETURNING {", ".join(LISTING_FIELDS)}
+    )
+    SELECT 'created', inserted.* FROM inserted
+    UNION ALL
+    SELECT 'updated', updated.* FROM updated
+    """
+
+    # same document as core.search.build_search_document
+    SEARCH_DOCUMENT_SQL = """
+    UPDATE core_listing AS listing
+    SET search_document = LOWER(CONCAT_WS(
+        ' ',
+        listing.nft_contract_address,
+        borrower.public_key,
+        (
+            SELECT collection.name FROM core_acceptednft AS collection
+            WHERE collection.contract_address = listing.nft_contract_address
+        )
+    ))
+    FROM core_user AS borrower, ingest_listing AS staged
+    WHERE borrower.id = listing.user_id
+    AND staged.nft_contract_address = listing.nft_contract_address
+    AND staged.nft_token_id = listing.nft_token_id
+    """
+
+    def __init__(self, batch_size: int = 10000):
+        super().__init__(batch_size)
+        self.collections = set()
+
+    def merge(self) -> tuple[int, int]:
+        with connection.cursor() as cursor:
+            # serialize the merges, so two ingestions do not both insert an NFT
+            cursor.execute("LOCK TABLE core_listing IN SHARE ROW EXCLUSIVE MODE")
+            cursor.execute(self.CREATE_BORROWERS_SQL)
+            cursor.execute(self.MERGE_SQL)
+            merged = cursor.fetchall()
+            cursor.execute(self.SEARCH_DOCUMENT_SQL)
+            cursor.execute(
+                f"SELECT DISTINCT nft_contract_address FROM {self.staging_table}"
+            )
+            self.collections.update(row[0] for row in cursor.fetchall())
+        publish_on_commit(*(listing_row_event(row[1:], row[0]) for row in merged))
+        inserted = sum(row[0] == "created" for row in merged)
+        return inserted, len(merged) - inserted
+
+    def finish(self):
+        rebuild_rollups()
+        for nft_contract_address in self.collections:
+            bump_generations(nft_contract_address)
+
+
+class LoanIngester(Ingester):
+    """
+    ### Description
+    Loads loans, which are identified by their loan id.
+    The rows of the archived loans are skipped.
+    """
+
+    serializer_class = LoanIngestSerializer
+    staging_table = "ingest_loan"
+    staging_columns = (
+        ("borrower", "text"),
+        ("lender", "text"),
+        ("loan_id", "bigint"),
+        ("nft_contract_address", "text"),
+        ("nft_token_id", "bigint"),
+        ("token_contract_address", "text"),
+        ("borrow_amount", "bigint"),
+        ("repayment_amount", "bigint"),
+        ("duration", "integer"),
+        ("start_time", "timestamptz"),
+        ("status", "integer"),
+    )
+
+    MERGE_SQL = f"""
+    WITH merged AS (
+        INSERT INTO core_loan
+            (id, created_at, updated_at, borrower, lender, loan_id,
+            nft_contract_address, nft_token_id, token_contract_address,
+            borrow_amount, repayment_amount, duration, start_time, status,
+            due_at, closed_at)
+        SELECT DISTINCT ON (loan_id)
+            gen_random_uuid(), NOW(), NOW(), borrower, lender, loan_id,
+            nft_contract_address, nft_token_id, token_contract_address,
+            borrow_amount, repayment_amount, duration, start_time, status,
+            start_time + make_interval(secs => duration),
+            -- a loan loaded closed is counted as closed when it was due at most
+            CASE WHEN status IN ({models.LoanStatus.FORECLOSED}, {models.LoanStatus.REPAID}) THEN LEAST(
+                start_time + make_interval(secs => duration), NOW()
+            ) END
+        FROM ingest_loan
+        -- the archived loans are not loaded again
+        WHERE NOT EXISTS (
+            SELECT 1 FROM core_loanhistory AS archived
+            WHERE archived.loan_id = ingest_loan.loan_id
+        )
+        -- the last row of each loan wins
+        ORDER BY loan_id, line DESC
+        ON CONFLICT (loan_id) DO UPDATE SET
+            updated_at = EXCLUDED.updated_at,
+            borrower = EXCLUDED.borrower,
+            lender = EXCLUDED.lender,
+            nft_contract_address = EXCLUDED.nft_contract_address,
+            nft_token_id = EXCLUDED.nft_token_id,
+            token_contract_address = EXCLUDED.token_contract_address,
+            borrow_amount = EXCLUDED.borrow_amount,
+            repayment_amount = EXCLUDED.repayment_amount,
+            duration = EXCLUDED.duration,
+            start_time = EXCLUDED.start_time,
+            status = EXCLUDED.status,
+            due_at = EXCLUDED.due_at,
+            closed_at = CASE WHEN EXCLUDED.status IN ({models.LoanStatus.FORECLOSED}, {models.LoanStatus.REPAID})
+                THEN COALESCE(core_loan.closed_at, NOW()) END
+        -- a row without an older version is inserted
+        RETURNING xmax = 0 AS inserted
+    )
+    SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted)
+    FROM merged
+    """
+
+    def merge(self) -> tuple[int, int]:
+        with connection.cursor() as cursor:
+            cursor.execute(self.MERGE_SQL)
+            return cursor.fetchone()
+
+    def finish(self):
+        rebuild_loan_rollups()
+        invalidate_all_portfolios()
+
+
+INGESTERS = {
+    "listings": ListingIngester,
+    "loans": LoanIngester,
+}
+
+
+def read_rows(file, file_format: str) -> Iterator[dict]:
+    """
+    Read the rows of a CSV file with a header, or of an NDJSON file
+    """
+    if file_format == "csv":
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
@@ -0,0 +1,81 @@
+# generational response cache of the listing pages
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import normalize_address
+
+LISTING_CACHE_ALIAS = "listings"
+# the generation of the pages that are not filtered by collection
+ALL_COLLECTIONS = "*"
+# the query parameters that are canonicalized in the cache keys
+ADDRESS_PARAMS = ("collateral_contract", "borrower_address")
+
+
+def get_listing_cache():
+    return caches[LISTING_CACHE_ALIAS]
+
+
+def _generation_key(collection: str) -> str:
+    return f"generation:{collection}"
+
+
+def get_generation(collection: str) -> int:
+    """
+    The current generation of the pages of a collection.
+    A missing generation starts from the current time, so the keys of
+    an evicted generation are never used again.
+    """
+    cache = get_listing_cache()
+    key = _generation_key(collection)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns())
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generations(nft_contract_address: str):
+    """
+    Invalidate the cached pages of a collection and the pages that
+    are not filtered by collection, without deleting any key.
+    """
+    cache = get_listing_cache()
+    for collection in (normalize_address(nft_contract_address), ALL_COLLECTIONS):
+        key = _generation_key(collection)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns())
+
+
+def listing_page_cache_key(request) -> str:
+    """
+    The cache key of a listing page. It holds the generation of the
+    filtered collection and a digest of the query parameters, which
+    include the filters, the search terms and the cursor or page.
+    """
+    collection = request.query_params.get("collateral_contract")
+    collection = normalize_address(collection) if collection else ALL_COLLECTIONS
+    params = sorted(
+        (name, normalize_address(value) if name in ADDRESS_PARAMS else value)
+        for name, values in request.query_params.lists()
+        for value in values
+    )
+    # the pagination links are absolute urls
+    digest = hashlib.sha256(repr((request.get_host(), params)).encode()).hexdigest()
+    return f"page:{collection}:{get_generation(collection)}:{digest}"
+
+
+def get_listing_page(request) -> tuple[str, dict | None]:
+    """
+    The cache key and the cached data of a listing page
+    """
+    key = listing_page_cache_key(request)
+    return key, get_listing_cache().get(key)
+
+
+def set_listing_page(key: str, data: dict):
+    get_listing_cache().set(key, data, settings.LISTING_CACHE_TTL)
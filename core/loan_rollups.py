@@ -0,0 +1,237 @@
+# daily loan volume and value locked rollups
+from collections import Counter
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from django.db import connection
+
+from . import models
+from .registry import accepted_assets
+
+# the loans that are no longer locked
+CLOSED_STATUSES = (models.LoanStatus.FORECLOSED, models.LoanStatus.REPAID)
+ROLLUP_COLUMNS = ("loans_count", "volume", "locked_delta")
+
+# adds the deltas of (day, collection, token) rows to the daily rollups, the
+# value locked of a new rollup starts from the last rollup before its day,
+# then the locked deltas are carried to the rollups of the later days
+APPLY_LOAN_ROLLUP_DELTAS_SQL = """
+INSERT INTO core_loandailyrollup
+    (id, created_at, updated_at, day, nft_contract_address,
+    token_contract_address, loans_count, volume, locked_delta, locked_total)
+SELECT gen_random_uuid(), NOW(), NOW(), delta.day, delta.nft_contract_address,
+    delta.token_contract_address, delta.loans_count, delta.volume,
+    delta.locked_delta, delta.locked_delta + COALESCE((
+        SELECT previous.locked_total FROM core_loandailyrollup AS previous
+        WHERE previous.nft_contract_address = delta.nft_contract_address
+        AND previous.token_contract_address = delta.token_contract_address
+        AND previous.day < delta.day
+        ORDER BY previous.day DESC LIMIT 1
+    ), 0)
+FROM (VALUES {values}) AS delta
+    (day, nft_contract_address, token_contract_address,
+    loans_count, volume, locked_delta)
+ON CONFLICT (day, nft_contract_address, token_contract_address) DO UPDATE SET
+    loans_count = core_loandailyrollup.loans_count + EXCLUDED.loans_count,
+    volume = core_loandailyrollup.volume + EXCLUDED.volume,
+    locked_delta = core_loandailyrollup.locked_delta + EXCLUDED.locked_delta,
+    locked_total = core_loandailyrollup.locked_total + EXCLUDED.locked_delta,
+    updated_at = EXCLUDED.updated_at;
+UPDATE core_loandailyrollup SET locked_total = locked_total + later.locked_delta
+FROM (
+    SELECT rollup.id, SUM(delta.locked_delta) AS locked_delta
+    FROM core_loandailyrollup AS rollup
+    JOIN (VALUES {values}) AS delta
+        (day, nft_contract_address, token_contract_address,
+        loans_count, volume, locked_delta)
+        ON rollup.nft_contract_address = delta.nft_contract_address
+        AND rollup.token_contract_address = delta.token_contract_address
+        AND rollup.day > delta.day
+    WHERE delta.locked_delta <> 0
+    GROUP BY rollup.id
+) AS later
+WHERE core_loandailyrollup.id = later.id;
+"""
+
+# recomputes every daily rollup in a single scan of the loans and the archived
+# loans, every loan is counted on its start day and, once closed, on its
+# close day
+REBUILD_LOAN_ROLLUPS_SQL = """
+DELETE FROM core_loandailyrollup;
+INSERT INTO core_loandailyrollup
+    (id, created_at, updated_at, day, nft_contract_address,
+    token_contract_address, loans_count, volume, locked_delta, locked_total)
+SELECT gen_random_uuid(), NOW(), NOW(), event.day, loan.nft_contract_address,
+    loan.token_contract_address, SUM(event.loans_count), SUM(event.volume),
+    SUM(event.locked_delta), SUM(SUM(event.locked_delta)) OVER (
+        PARTITION BY loan.nft_contract_address, loan.token_contract_address
+        ORDER BY event.day
+    )
+FROM (
+    SELECT nft_contract_address, token_contract_address, borrow_amount,
+        start_time, closed_at
+    FROM core_loan
+    UNION ALL
+    SELECT nft_contract_address, token_contract_address, borrow_amount,
+        start_time, closed_at
+    FROM core_loanhistory
+) AS loan
+CROSS JOIN LATERAL (VALUES
+    ((loan.start_time AT TIME ZONE 'UTC')::date,
+        1, loan.borrow_amount::numeric, loan.borrow_amount::numeric),
+    ((loan.closed_at AT TIME ZONE 'UTC')::date,
+        0, 0::numeric, -loan.borrow_amount::numeric)
+) AS event (day, loans_count, volume, locked_delta)
+WHERE event.day IS NOT NULL
+GROUP BY event.day, loan.nft_contract_address, loan.token_contract_address;
+"""
+
+# the loans count and the volume of every collection and token between two
+# days, and the value locked of their last rollup up to the end day. The
+# collections and tokens are walked in the key index, one lookup each, so
+# the history of the rollups is not scanned.
+LOAN_STATS_SQL = """
+WITH RECURSIVE rollup_key AS (
+    (
+        SELECT nft_contract_address, token_contract_address
+        FROM core_loandailyrollup
+        ORDER BY nft_contract_address, token_contract_address LIMIT 1
+    )
+    UNION ALL
+    SELECT next.nft_contract_address, next.token_contract_address
+    FROM rollup_key CROSS JOIN LATERAL (
+        SELECT nft_contract_address, token_contract_address
+        FROM core_loandailyrollup AS rollup
+        WHERE (rollup.nft_contract_address, rollup.token_contract_address)
+            > (rollup_key.nft_contract_address, rollup_key.token_contract_address)
+        ORDER BY nft_contract_address, token_contract_address LIMIT 1
+    ) AS next
+)
+SELECT {fields}, COALESCE(SUM(started.loans_count), 0),
+    COALESCE(SUM(started.volume), 0), SUM(locked.locked_total)
+FROM rollup_key
+CROSS JOIN LATERAL (
+    SELECT locked_total FROM core_loandailyrollup AS rollup
+    WHERE rollup.nft_contract_address = rollup_key.nft_contract_address
+    AND rollup.token_contract_address = rollup_key.token_contract_address
+    AND rollup.day <= COALESCE(%(end)s::date, 'infinity')
+    ORDER BY rollup.day DESC LIMIT 1
+) AS locked
+CROSS JOIN LATERAL (
+    SELECT SUM(loans_count) AS loans_count, SUM(volume) AS volume
+    FROM core_loandailyrollup AS rollup
+    WHERE rollup.nft_contract_address = rollup_key.nft_contract_address
+    AND rollup.token_contract_address = rollup_key.token_contract_address
+    AND rollup.day >= COALESCE(%(start)s::date, '-infinity')
+    AND rollup.day <= COALESCE(%(end)s::date, 'infinity')
+) AS started
+GROUP BY {fields}
+ORDER BY {fields}
+"""
+
+
+def _utc_day(value: datetime) -> date:
+    return value.astimezone(timezone.utc).date()
+
+
+def loan_rollup_rows(loan: models.Loan) -> Counter:
+    """
+    The contribution of a loan to the daily rollups,
+    keyed by (day, collection, token, column)
+    """
+    key = (loan.nft_contract_address, loan.token_contract_address)
+    rows = Counter()
+    started = (_utc_day(loan.start_time), *key)
+    rows[(*started, "loans_count")] += 1
+    rows[(*started, "volume")] += loan.borrow_amount
+    rows[(*started, "locked_delta")] += loan.borrow_amount
+    if loan.closed_at is not None:
+        rows[(_utc_day(loan.closed_at), *key, "locked_delta")] -= loan.borrow_amount
+    return rows
+
+
+def apply_loan_rollup_deltas(deltas: Counter):
+    """
+    Add the deltas to the daily rollups, in a single statement
+    of the current transaction
+    """
+    rows = {}
+    for (day, nft, token, column), delta in deltas.items():
+        row = rows.setdefault((day, nft, token), dict.fromkeys(ROLLUP_COLUMNS, 0))
+        row[column] += delta
+    rows = {key: row for key, row in rows.items() if any(row.values())}
+    if not rows:
+        return
+    values = ", ".join(
+        ["(%s::date, %s, %s, %s::bigint, %s::numeric, %s::numeric)"] * len(rows)
+    )
+    params = [
+        param
+        for (day, nft, token), row in rows.items()
+        for param in (
+            day,
+            models.normalize_address(nft),
+            models.normalize_address(token),
+            *(row[column] for column in ROLLUP_COLUMNS),
+        )
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            APPLY_LOAN_ROLLUP_DELTAS_SQL.format(values=values), params + params
+        )
+
+
+def rebuild_loan_rollups():
+    """
+    Recompute the daily rollups from the loans, after loans were written
+    in bulk
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(REBUILD_LOAN_ROLLUPS_SQL)
+
+
+def _normalize(amount: Decimal, decimals: int | None) -> float | None:
+    return None if decimals is None else float(amount.scaleb(-decimals))
+
+
+def get_loan_stats(
+    group: str, start: date | None = None, end: date | None = None
+) -> list[dict]:
+    """
+    The loans count and the volume of the loans started between `start`
+    and `end` (both included), and the value locked at the end of `end`,
+    by token or by collection and token. They are read from the daily
+    rollups in a single query, the amounts are also normalized with the
+    decimals of the accepted tokens.
+    """
+    fields = ["token_contract_address"]
+    if group == "collection":
+        fields.insert(0, "nft_contract_address")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            LOAN_STATS_SQL.format(
+                fields=", ".join(f"rollup_key.{field}" for field in fields)
+            ),
+            {"start": start, "end": end},
+        )
+        rows = [
+            dict(zip([*fields, "loans_count", "volume", "tvl"], row))
+            for row in cursor.fetchall()
+        ]
+
+    stats = []
+    for row in rows:
+        token = accepted_assets.get_token(row["token_contract_address"])
+        decimals = token.token_decimal if token else None
+        stats.append(
+            {
+                **{field: row[field] for field in fields},
+                "token_decimal": decimals,
+                "loans_count": int(row["loans_count"]),
+                "volume": int(row["volume"]),
+                "volume_normalized": _normalize(row["volume"], decimals),
+                "tvl": int(row["tvl"]),
+                "tvl_normalized": _normalize(row["tvl"], decimals),
+            }
+        )
+    return stats
@@ -0,0 +1,54 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.archive import LoanArchiver, get_loan_archiver
+
+
+class Command(BaseCommand):
+    help = "Move the repaid and foreclosed loans to the archived loans, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--after-days",
+            type=int,
+            help="The days after which a closed loan is archived",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, help="The number of loans archived at a time"
+        )
+        parser.add_argument(
+            "--max-batches", type=int, help="The maximum number of batches of a run"
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running, every --interval seconds",
+        )
+        parser.add_argument(
+            "--interval", type=float, help="The seconds between two runs"
+        )
+
+    def handle(self, *args, **options):
+        configured = get_loan_archiver()
+        archiver = LoanArchiver(
+            (
+                configured.archive_after
+                if options["after_days"] is None
+                else timedelta(days=options["after_days"])
+            ),
+            options["batch_size"] or configured.batch_size,
+            options["max_batches"] or configured.max_batches,
+            options["interval"] or configured.interval,
+        )
+        while True:
+            run = archiver.archive()
+            self.stdout.write(
+                f"Archived {run['archived']} closed loans in {run['batches']} "
+                f"batches in {run['seconds']:.3f}s, kept {run['kept']} "
+                "with renegotiation offers"
+            )
+            if not options["loop"]:
+                break
+            time.sleep(archiver.interval)
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.analytics import reference_yield_analytics, yield_analytics
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the vectorized yield analytics against the loop over "
+        "the offer and loan instances"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat", type=int, default=3, help="The number of runs of each version"
+        )
+
+    def handle(self, *args, **options):
+        now = time.time()
+        timings = {}
+        for name, analytics in (
+            ("vectorized", yield_analytics),
+            ("loop", reference_yield_analytics),
+        ):
+            runs = []
+            for _ in range(options["repeat"]):
+                started_at = time.perf_counter()
+                result = analytics(now)
+                runs.append(time.perf_counter() - started_at)
+            timings[name] = min(runs)
+            self.stdout.write(
+                f"{name}: {timings[name] * 1000:.1f}ms for "
+                f"{result['offers']['count']} offers and "
+                f"{result['loans']['count']} loans"
+            )
+        self.stdout.write(f"speedup: {timings['loop'] / timings['vectorized']:.1f}x")
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.scheduler import LoanScheduler, get_loan_scheduler
+
+
+class Command(BaseCommand):
+    help = "Expire the pending loans that are due, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, help="The number of loans expired at a time"
+        )
+        parser.add_argument(
+            "--max-batches", type=int, help="The maximum number of batches of a run"
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running, every --interval seconds",
+        )
+        parser.add_argument(
+            "--interval", type=float, help="The seconds between two runs"
+        )
+
+    def handle(self, *args, **options):
+        configured = get_loan_scheduler()
+        scheduler = LoanScheduler(
+            options["batch_size"] or configured.batch_size,
+            options["max_batches"] or configured.max_batches,
+            options["interval"] or configured.interval,
+        )
+        while True:
+            run = scheduler.expire_due_loans()
+            self.stdout.write(
+                f"Expired {run['expired']} due loans in {run['batches']} "
+                f"batches in {run['seconds']:.3f}s"
+            )
+            if not options["loop"]:
+                break
+            time.sleep(scheduler.interval)
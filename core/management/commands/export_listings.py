@@ -0,0 +1,58 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.export import export_open_listings
+from core.serializers import ListingExportWatermarkSerializer
+
+
+class Command(BaseCommand):
+    help = "Export the open listings and their offers as NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output", help="The file to write to, the standard output by default"
+        )
+        parser.add_argument(
+            "--after-created-at",
+            help="Resume after the listing created at this time (ISO 8601)",
+        )
+        parser.add_argument("--after-id", help="Resume after the listing with this id")
+        parser.add_argument(
+            "--chunk-size", type=int, help="The number of listings fetched at a time"
+        )
+
+    def handle(self, *args, **options):
+        watermark = {
+            key: options[key]
+            for key in ("after_created_at", "after_id")
+            if options[key]
+        }
+        serializer = ListingExportWatermarkSerializer(data=watermark)
+        if not serializer.is_valid():
+            raise CommandError(serializer.errors)
+
+        output = open(options["output"], "a") if options["output"] else sys.stdout
+        started_at = time.monotonic()
+        count = 0
+        last_line = None
+        try:
+            for line in export_open_listings(
+                chunk_size=options["chunk_size"], **serializer.validated_data
+            ):
+                output.write(line)
+                count += 1
+                last_line = line
+        finally:
+            if output is not sys.stdout:
+                output.close()
+            elapsed = time.monotonic() - started_at
+            self.stderr.write(f"Exported {count} listings in {elapsed:.1f}s")
+            if last_line is not None:
+                listing = json.loads(last_line)
+                self.stderr.write(
+                    "Resume with --after-created-at "
+                    f"{listing['created_at']} --after-id {listing['id']}"
+                )
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.indexer import LoanEventIndexer, get_loan_indexer
+
+
+class Command(BaseCommand):
+    help = "Index the loan events of the loan contract from the Starknet RPC"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--to-block", type=int, help="The last block to index")
+        parser.add_argument(
+            "--batch-size", type=int, help="The number of blocks of a range"
+        )
+        parser.add_argument(
+            "--max-in-flight", type=int, help="The number of ranges read at a time"
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep following the chain, every --interval seconds",
+        )
+        parser.add_argument(
+            "--interval", type=float, help="The seconds between two runs"
+        )
+
+    def handle(self, *args, **options):
+        configured = get_loan_indexer()
+        indexer = LoanEventIndexer(
+            configured.client,
+            configured.contract_address,
+            configured.start_block,
+            options["batch_size"] or configured.batch_size,
+            options["max_in_flight"] or configured.max_in_flight,
+            configured.chunk_size,
+            configured.confirmations,
+            options["interval"] or configured.interval,
+        )
+
+        def report(progress: dict):
+            self.stdout.write(
+                f"block {progress['checkpoint']}: {progress['events']} events, "
+                f"{progress['events_per_second']:.0f} events/s"
+            )
+
+        while True:
+            run = indexer.index(options["to_block"], report)
+            self.stdout.write(
+                f"Indexed {run['events']} events of {run['blocks']} blocks: "
+                f"{run['inserted']} loans started, {run['closed']} loans closed, "
+                f"{run['listings_closed']} listings closed, "
+                f"in {run['seconds']:.3f}s"
+            )
+            if not options["loop"]:
+                break
+            time.sleep(indexer.interval)
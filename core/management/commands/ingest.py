@@ -0,0 +1,53 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ingest import INGESTERS, read_rows
+
+
+class Command(BaseCommand):
+    help = "Load listings or loans in bulk from a CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(INGESTERS))
+        parser.add_argument("path", help="The CSV (with a header) or NDJSON file")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "ndjson"],
+            help="The format of the file, guessed from its extension by default",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="The number of rows validated and merged at a time",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        file_format = options["format"] or (
+            "csv" if path.suffix.lower() == ".csv" else "ndjson"
+        )
+        if not path.is_file():
+            raise CommandError(f"{path} does not exist")
+
+        ingester = INGESTERS[options["kind"]](batch_size=options["batch_size"])
+        with path.open(newline="") as file:
+            progress = ingester.ingest(read_rows(file, file_format), self.report)
+
+        for line, errors in progress["errors"].items():
+            self.stderr.write(f"Line {line}: {errors}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Read {progress['read']} rows: {progress['inserted']} inserted, "
+                f"{progress['updated']} updated, {progress['invalid']} invalid "
+                f"({progress['rows_per_second']:.0f} rows/s)"
+            )
+        )
+
+    def report(self, progress: dict):
+        self.stderr.write(
+            f"{progress['read']} rows read, {progress['inserted']} inserted, "
+            f"{progress['updated']} updated, {progress['invalid']} invalid, "
+            f"{progress['rows_per_second']:.0f} rows/s"
+        )
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.loan_rollups import rebuild_loan_rollups
+from core.models import LoanDailyRollup
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily loan rollups from the loans"
+
+    def handle(self, *args, **options):
+        started_at = time.monotonic()
+        with transaction.atomic():
+            rebuild_loan_rollups()
+        elapsed = time.monotonic() - started_at
+        self.stdout.write(
+            f"Rebuilt {LoanDailyRollup.objects.count()} daily loan rollups "
+            f"in {elapsed:.1f}s"
+        )
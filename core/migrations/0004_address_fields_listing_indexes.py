@@ -0,0 +1,181 @@
+# Generated by Django 4.2 on 2026-10-17 19:49
+
+import core.models
+from django.db import migrations, models
+
+# the address columns that are canonicalized by core.models.normalize_address
+ADDRESS_COLUMNS = [
+    ("core_user", "public_key"),
+    ("core_acceptednft", "contract_address"),
+    ("core_acceptedtoken", "contract_address"),
+    ("core_listing", "nft_contract_address"),
+    ("core_listing", "token_contract_address"),
+    ("core_offer", "token_contract_address"),
+    ("core_loan", "borrower"),
+    ("core_loan", "lender"),
+    ("core_loan", "nft_contract_address"),
+    ("core_loan", "token_contract_address"),
+]
+
+
+# the unique address columns, which cannot hold two spellings of an address
+UNIQUE_ADDRESS_COLUMNS = [
+    ("core_user", "public_key"),
+    ("core_acceptednft", "contract_address"),
+    ("core_acceptedtoken", "contract_address"),
+]
+
+
+def canonical_address_sql(column: str) -> str:
+    value = f"TRIM({column})"
+    return (
+        f"CASE WHEN {value} ~* '^0x[0-9a-f]+$' "
+        f"THEN '0x' || COALESCE(NULLIF(LTRIM(LOWER(SUBSTRING({value} FROM 3)), '0'), ''), '0') "
+        f"ELSE LOWER({value}) END"
+    )
+
+
+def canonicalize_address_sql(table: str, column: str) -> str:
+    canonical = canonical_address_sql(column)
+    return (
+        f"UPDATE {table} SET {column} = {canonical} "
+        f"WHERE {column} IS DISTINCT FROM {canonical}"
+    )
+
+
+def check_duplicate_addresses(apps, schema_editor):
+    """
+    Stop before the canonicalization when rows of a unique address column
+    only differ by the case or the padding of their address, since they
+    would violate the unique constraint. They reference other rows, so
+    they are listed to be merged by hand instead of being merged here.
+    """
+    conflicts = []
+    with schema_editor.connection.cursor() as cursor:
+        for table, column in UNIQUE_ADDRESS_COLUMNS:
+            canonical = canonical_address_sql(column)
+            cursor.execute(
+                f"SELECT {canonical}, ARRAY_AGG(id::text ORDER BY id), "
+                f"ARRAY_AGG({column} ORDER BY id) FROM {table} "
+                f"GROUP BY {canonical} HAVING COUNT(*) > 1"
+            )
+            conflicts += [
+                f"{table}.{column} {address}: "
+                + ", ".join(f"id {id} ({value})" for id, value in zip(ids, values))
+                for address, ids, values in cursor.fetchall()
+            ]
+    if conflicts:
+        raise RuntimeError(
+            "The addresses of these rows are the same once canonicalized, "
+            "merge or delete the duplicates before migrating:\n" + "\n".join(conflicts)
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0003_listing_status"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="acceptednft",
+            name="contract_address",
+            field=core.models.AddressField(
+                max_length=70, unique=True, verbose_name="Collection Contract Address"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="acceptedtoken",
+            name="contract_address",
+            field=core.models.AddressField(
+                max_length=70, unique=True, verbose_name="Token Contract Address"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="listing",
+            name="nft_contract_address",
+            field=core.models.AddressField(
+                max_length=70, verbose_name="NFT Contract Address"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="listing",
+            name="token_contract_address",
+            field=core.models.AddressField(
+                blank=True,
+                max_length=70,
+                null=True,
+                verbose_name="Token Contract Address",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="loan",
+            name="borrower",
+            field=core.models.AddressField(max_length=70, verbose_name="Borrower"),
+        ),
+        migrations.AlterField(
+            model_name="loan",
+            name="lender",
+            field=core.models.AddressField(max_length=70, verbose_name="Lender"),
+        ),
+        migrations.AlterField(
+            model_name="loan",
+            name="nft_contract_address",
+            field=core.models.AddressField(
+                max_length=70, verbose_name="NFT Contract Address"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="loan",
+            name="token_contract_address",
+            field=core.models.AddressField(
+                max_length=70, verbose_name="Token Contract Address"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="offer",
+            name="token_contract_address",
+            field=core.models.AddressField(
+                max_length=70, verbose_name="Token Contract Address"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="public_key",
+            field=core.models.AddressField(
+                max_length=70, unique=True, verbose_name="Public Key"
+            ),
+        ),
+        migrations.RunPython(check_duplicate_addresses, migrations.RunPython.noop),
+        migrations.RunSQL(
+            [
+                canonicalize_address_sql(table, column)
+                for table, column in ADDRESS_COLUMNS
+            ],
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("status", 1)),
+                fields=["-created_at", "-id"],
+                name="listing_open_feed_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("status", 1)),
+                fields=["nft_contract_address", "-created_at", "-id"],
+                name="listing_open_collection_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("status", 1)),
+                fields=["user", "-created_at", "-id"],
+                name="listing_open_borrower_idx",
+            ),
+        ),
+    ]
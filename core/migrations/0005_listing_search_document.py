@@ -0,0 +1,48 @@
+# Generated by Django 4.2 on 2026-10-17 19:53
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+# same document as core.search.build_search_document
+BACKFILL_SEARCH_DOCUMENT_SQL = """
+UPDATE core_listing AS listing
+SET search_document = LOWER(CONCAT_WS(
+    ' ',
+    listing.nft_contract_address,
+    borrower.public_key,
+    (
+        SELECT collection.name FROM core_acceptednft AS collection
+        WHERE collection.contract_address = listing.nft_contract_address
+    )
+))
+FROM core_user AS borrower
+WHERE borrower.id = listing.user_id
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0004_address_fields_listing_indexes"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="listing",
+            name="search_document",
+            field=models.TextField(
+                blank=True, default="", editable=False, verbose_name="Search Document"
+            ),
+        ),
+        migrations.RunSQL(BACKFILL_SEARCH_DOCUMENT_SQL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name="listing",
+            index=django.contrib.postgres.indexes.GinIndex(
+                condition=models.Q(("status", 1)),
+                fields=["search_document"],
+                name="listing_open_search_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+    ]
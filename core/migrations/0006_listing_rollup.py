@@ -0,0 +1,68 @@
+# Generated by Django 4.2 on 2026-10-17 19:57
+
+from django.db import migrations, models
+import uuid
+
+
+# same counts as core.rollups.rebuild_rollups
+BACKFILL_ROLLUPS_SQL = """
+INSERT INTO core_listingrollup
+    (id, created_at, updated_at, facet, value, listings_count)
+SELECT gen_random_uuid(), NOW(), NOW(), facet, value, COUNT(*)
+FROM (
+    SELECT 'collection' AS facet, nft_contract_address AS value FROM core_listing
+    UNION ALL
+    SELECT 'token', token_contract_address FROM core_listing
+    WHERE token_contract_address IS NOT NULL
+) AS listing_facet
+GROUP BY facet, value
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0005_listing_search_document"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ListingRollup",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "facet",
+                    models.CharField(
+                        choices=[("collection", "Collection"), ("token", "Token")],
+                        max_length=20,
+                        verbose_name="Facet",
+                    ),
+                ),
+                ("value", models.CharField(max_length=70, verbose_name="Value")),
+                (
+                    "listings_count",
+                    models.BigIntegerField(default=0, verbose_name="Listings Count"),
+                ),
+            ],
+            options={
+                "ordering": ("created_at",),
+                "abstract": False,
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="listingrollup",
+            constraint=models.UniqueConstraint(
+                fields=("facet", "value"), name="listing_rollup_facet_value_unique"
+            ),
+        ),
+        migrations.RunSQL(BACKFILL_ROLLUPS_SQL, migrations.RunSQL.noop),
+    ]
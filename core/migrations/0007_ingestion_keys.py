@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-17 20:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0006_listing_rollup"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                fields=["nft_contract_address", "nft_token_id"], name="listing_nft_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="loan",
+            constraint=models.UniqueConstraint(
+                fields=("loan_id",), name="loan_loan_id_unique"
+            ),
+        ),
+    ]
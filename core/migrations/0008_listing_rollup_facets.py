@@ -0,0 +1,60 @@
+# Generated by Django 4.2 on 2026-10-17 20:04
+
+from django.db import migrations, models
+
+# same counts as core.rollups.rebuild_rollups
+REBUILD_ROLLUPS_SQL = """
+DELETE FROM core_listingrollup;
+INSERT INTO core_listingrollup
+    (id, created_at, updated_at, facet, value, listings_count, open_listings_count)
+SELECT gen_random_uuid(), NOW(), NOW(), facet, value,
+    COUNT(*), COUNT(*) FILTER (WHERE status = 1)
+FROM (
+    SELECT 'collection' AS facet, nft_contract_address AS value, status
+    FROM core_listing
+    UNION ALL
+    SELECT 'token', token_contract_address, status FROM core_listing
+    WHERE token_contract_address IS NOT NULL
+    UNION ALL
+    SELECT 'duration', CASE WHEN duration < 1 * 86400 THEN '0-1' WHEN duration < 7 * 86400 THEN '1-7' WHEN duration < 30 * 86400 THEN '7-30' WHEN duration < 90 * 86400 THEN '30-90' WHEN duration < 180 * 86400 THEN '90-180' ELSE '180+' END,
+        status
+    FROM core_listing
+    WHERE duration IS NOT NULL
+    UNION ALL
+    SELECT 'borrow_amount', CASE WHEN listing.borrow_amount < 1 * POWER(10::numeric, token.token_decimal) THEN '0-1' WHEN listing.borrow_amount < 10 * POWER(10::numeric, token.token_decimal) THEN '1-10' WHEN listing.borrow_amount < 100 * POWER(10::numeric, token.token_decimal) THEN '10-100' WHEN listing.borrow_amount < 1000 * POWER(10::numeric, token.token_decimal) THEN '100-1000' WHEN listing.borrow_amount < 10000 * POWER(10::numeric, token.token_decimal) THEN '1000-10000' ELSE '10000+' END, listing.status
+    FROM core_listing AS listing
+    JOIN core_acceptedtoken AS token
+        ON token.contract_address = listing.token_contract_address
+    WHERE listing.borrow_amount IS NOT NULL
+) AS listing_facet
+GROUP BY facet, value;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0007_ingestion_keys"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listingrollup",
+            name="open_listings_count",
+            field=models.BigIntegerField(default=0, verbose_name="Open Listings Count"),
+        ),
+        migrations.AlterField(
+            model_name="listingrollup",
+            name="facet",
+            field=models.CharField(
+                choices=[
+                    ("collection", "Collection"),
+                    ("token", "Token"),
+                    ("duration", "Duration"),
+                    ("borrow_amount", "Borrow Amount"),
+                ],
+                max_length=20,
+                verbose_name="Facet",
+            ),
+        ),
+        migrations.RunSQL(REBUILD_ROLLUPS_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2 on 2026-10-17 20:05
+
+from django.db import migrations, models
+
+
+# same rate as core.service.CoreService.effective_apr
+BACKFILL_EFFECTIVE_APR_SQL = """
+UPDATE core_offer
+SET effective_apr = (repayment_amount - borrow_amount)::float8 / borrow_amount
+    * 31536000 / duration
+WHERE borrow_amount > 0 AND repayment_amount IS NOT NULL AND duration > 0
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0008_listing_rollup_facets"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="offer",
+            name="effective_apr",
+            field=models.FloatField(
+                blank=True, null=True, verbose_name="Effective APR"
+            ),
+        ),
+        migrations.RunSQL(BACKFILL_EFFECTIVE_APR_SQL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name="offer",
+            index=models.Index(
+                fields=["listing", "effective_apr", "id"], name="offer_listing_apr_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="offer",
+            index=models.Index(
+                fields=["listing", "borrow_amount", "id"],
+                name="offer_listing_principal_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="offer",
+            index=models.Index(
+                fields=["listing", "signature_expiry", "id"],
+                name="offer_listing_expiry_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-17 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0009_offer_effective_apr"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="offer",
+            index=models.Index(
+                fields=["user", "created_at", "id"], name="offer_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="offer",
+            index=models.Index(
+                fields=["listing", "created_at", "id"], name="offer_listing_created_idx"
+            ),
+        ),
+    ]
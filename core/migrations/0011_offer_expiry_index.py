@@ -0,0 +1,16 @@
+# Generated by Django 4.2 on 2026-10-17 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0010_offer_created_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="offer",
+            index=models.Index(fields=["signature_expiry"], name="offer_expiry_idx"),
+        ),
+    ]
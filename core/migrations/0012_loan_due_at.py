@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-17 20:40
+
+from django.db import migrations, models
+
+
+BACKFILL_DUE_AT_SQL = """
+UPDATE core_loan SET due_at = start_time + make_interval(secs => duration)
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0011_offer_expiry_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="loan",
+            name="due_at",
+            field=models.DateTimeField(
+                editable=False, null=True, verbose_name="Loan Due Time"
+            ),
+        ),
+        migrations.RunSQL(BACKFILL_DUE_AT_SQL, migrations.RunSQL.noop),
+        migrations.AlterField(
+            model_name="loan",
+            name="due_at",
+            field=models.DateTimeField(editable=False, verbose_name="Loan Due Time"),
+        ),
+        migrations.AddIndex(
+            model_name="loan",
+            index=models.Index(
+                condition=models.Q(("status", 1)),
+                fields=["due_at"],
+                name="loan_pending_due_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-17 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0012_loan_due_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="loan",
+            index=models.Index(
+                fields=["borrower", "token_contract_address", "status"],
+                include=("borrow_amount", "repayment_amount"),
+                name="loan_borrower_portfolio_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="loan",
+            index=models.Index(
+                fields=["lender", "token_contract_address", "status"],
+                include=("borrow_amount", "repayment_amount"),
+                name="loan_lender_portfolio_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 4.2 on 2026-10-17 20:21
+
+import core.models
+from django.db import migrations, models
+import uuid
+
+
+# the closed loans are counted as closed when they were due at most
+BACKFILL_CLOSED_AT_SQL = """
+UPDATE core_loan SET closed_at = LEAST(due_at, updated_at) WHERE status IN (3, 4)
+"""
+
+# same rollups as core.loan_rollups.REBUILD_LOAN_ROLLUPS_SQL
+REBUILD_LOAN_ROLLUPS_SQL = """
+INSERT INTO core_loandailyrollup
+    (id, created_at, updated_at, day, nft_contract_address,
+    token_contract_address, loans_count, volume, locked_delta)
+SELECT gen_random_uuid(), NOW(), NOW(), event.day, loan.nft_contract_address,
+    loan.token_contract_address, SUM(event.loans_count), SUM(event.volume),
+    SUM(event.locked_delta)
+FROM core_loan AS loan
+CROSS JOIN LATERAL (VALUES
+    ((loan.start_time AT TIME ZONE 'UTC')::date,
+        1, loan.borrow_amount::numeric, loan.borrow_amount::numeric),
+    ((loan.closed_at AT TIME ZONE 'UTC')::date,
+        0, 0::numeric, -loan.borrow_amount::numeric)
+) AS event (day, loans_count, volume, locked_delta)
+WHERE event.day IS NOT NULL
+GROUP BY event.day, loan.nft_contract_address, loan.token_contract_address
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0013_loan_portfolio_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LoanDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("day", models.DateField(verbose_name="Day")),
+                (
+                    "nft_contract_address",
+                    core.models.AddressField(
+                        max_length=70, verbose_name="NFT Contract Address"
+                    ),
+                ),
+                (
+                    "token_contract_address",
+                    core.models.AddressField(
+                        max_length=70, verbose_name="Token Contract Address"
+                    ),
+                ),
+                (
+                    "loans_count",
+                    models.BigIntegerField(default=0, verbose_name="Loans Count"),
+                ),
+                (
+                    "volume",
+                    models.DecimalField(
+                        decimal_places=0,
+                        default=0,
+                        max_digits=78,
+                        verbose_name="Volume",
+                    ),
+                ),
+                (
+                    "locked_delta",
+                    models.DecimalField(
+                        decimal_places=0,
+                        default=0,
+                        max_digits=78,
+                        verbose_name="Locked Delta",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("created_at",),
+                "abstract": False,
+            },
+        ),
+        migrations.AddField(
+            model_name="loan",
+            name="closed_at",
+            field=models.DateTimeField(
+                blank=True, editable=False, null=True, verbose_name="Loan Close Time"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="loandailyrollup",
+            constraint=models.UniqueConstraint(
+                fields=("day", "nft_contract_address", "token_contract_address"),
+                name="loan_daily_rollup_unique",
+            ),
+        ),
+        migrations.RunSQL(BACKFILL_CLOSED_AT_SQL, migrations.RunSQL.noop),
+        migrations.RunSQL(REBUILD_LOAN_ROLLUPS_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-17 20:23
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0014_loan_daily_rollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IndexerCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "name",
+                    models.CharField(max_length=50, unique=True, verbose_name="Name"),
+                ),
+                ("block_number", models.BigIntegerField(verbose_name="Block Number")),
+            ],
+            options={
+                "ordering": ("created_at",),
+                "abstract": False,
+            },
+        ),
+    ]
@@ -0,0 +1,137 @@
+# Generated by Django 4.2 on 2026-10-17 20:28
+
+import core.models
+from django.db import migrations, models
+import uuid
+
+# the archived loans, partitioned by month of the start time. The partitions
+# are created by core.archive.LoanArchiver when it archives their first loan.
+CREATE_LOAN_HISTORY_SQL = """
+CREATE TABLE core_loanhistory (
+    id uuid NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    updated_at timestamp with time zone NOT NULL,
+    borrower varchar(70) NOT NULL,
+    lender varchar(70) NOT NULL,
+    loan_id bigint NOT NULL CHECK (loan_id >= 0),
+    nft_contract_address varchar(70) NOT NULL,
+    nft_token_id bigint NOT NULL CHECK (nft_token_id >= 0),
+    token_contract_address varchar(70) NOT NULL,
+    borrow_amount bigint NOT NULL CHECK (borrow_amount >= 0),
+    repayment_amount bigint NOT NULL CHECK (repayment_amount >= 0),
+    duration integer NOT NULL CHECK (duration >= 0),
+    start_time timestamp with time zone NOT NULL,
+    status integer NOT NULL,
+    due_at timestamp with time zone NOT NULL,
+    closed_at timestamp with time zone NULL,
+    archived_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (id, start_time)
+) PARTITION BY RANGE (start_time);
+CREATE INDEX loan_history_loan_id_idx ON core_loanhistory (loan_id);
+CREATE INDEX loan_history_borrower_idx ON core_loanhistory
+    (borrower, token_contract_address, status);
+CREATE INDEX loan_history_lender_idx ON core_loanhistory
+    (lender, token_contract_address, status);
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0015_indexer_checkpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedLoan",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "borrower",
+                    core.models.AddressField(max_length=70, verbose_name="Borrower"),
+                ),
+                (
+                    "lender",
+                    core.models.AddressField(max_length=70, verbose_name="Lender"),
+                ),
+                ("loan_id", models.PositiveBigIntegerField(verbose_name="Loan Id")),
+                (
+                    "nft_contract_address",
+                    core.models.AddressField(
+                        max_length=70, verbose_name="NFT Contract Address"
+                    ),
+                ),
+                (
+                    "nft_token_id",
+                    models.PositiveBigIntegerField(verbose_name="NFT Token ID"),
+                ),
+                (
+                    "token_contract_address",
+                    core.models.AddressField(
+                        max_length=70, verbose_name="Token Contract Address"
+                    ),
+                ),
+                (
+                    "borrow_amount",
+                    models.PositiveBigIntegerField(verbose_name="Borrow Amount"),
+                ),
+                (
+                    "repayment_amount",
+                    models.PositiveBigIntegerField(verbose_name="Repayment Amount"),
+                ),
+                ("duration", models.PositiveIntegerField(verbose_name="Loan Duration")),
+                ("start_time", models.DateTimeField(verbose_name="Loan Start Time")),
+                (
+                    "status",
+                    models.IntegerField(
+                        choices=[
+                            (1, "Pending"),
+                            (2, "Expired"),
+                            (3, "Foreclosed"),
+                            (4, "Repaid"),
+                        ],
+                        default=1,
+                        verbose_name="Loan Status",
+                    ),
+                ),
+                (
+                    "due_at",
+                    models.DateTimeField(editable=False, verbose_name="Loan Due Time"),
+                ),
+                (
+                    "closed_at",
+                    models.DateTimeField(
+                        blank=True,
+                        editable=False,
+                        null=True,
+                        verbose_name="Loan Close Time",
+                    ),
+                ),
+                ("archived_at", models.DateTimeField(verbose_name="Loan Archive Time")),
+            ],
+            options={
+                "db_table": "core_loanhistory",
+                "ordering": ("created_at",),
+                "abstract": False,
+                "managed": False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name="loan",
+            index=models.Index(
+                condition=models.Q(("status__in", [3, 4])),
+                fields=["closed_at"],
+                name="loan_closed_idx",
+            ),
+        ),
+        migrations.RunSQL(CREATE_LOAN_HISTORY_SQL, "DROP TABLE core_loanhistory"),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-17 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0016_loan_archive"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="renegotiationoffer",
+            index=models.Index(
+                fields=["loan", "status", "created_at"],
+                name="renegotiation_loan_status_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2 on 2026-10-17 21:08
+
+from django.db import migrations, models
+
+# the running sum of the deltas of every collection and token
+BACKFILL_LOCKED_TOTAL_SQL = """
+UPDATE core_loandailyrollup SET locked_total = running.locked_total
+FROM (
+    SELECT id, SUM(locked_delta) OVER (
+        PARTITION BY nft_contract_address, token_contract_address ORDER BY day
+    ) AS locked_total
+    FROM core_loandailyrollup
+) AS running
+WHERE core_loandailyrollup.id = running.id
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0017_renegotiation_inbox_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="loandailyrollup",
+            name="locked_total",
+            field=models.DecimalField(
+                decimal_places=0, default=0, max_digits=78, verbose_name="Locked Total"
+            ),
+        ),
+        migrations.RunSQL(BACKFILL_LOCKED_TOTAL_SQL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name="loandailyrollup",
+            index=models.Index(
+                fields=["nft_contract_address", "token_contract_address", "day"],
+                name="loan_rollup_key_day_idx",
+            ),
+        ),
+    ]
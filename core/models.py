@@ -1,6 +1,8 @@
+import re
 import uuid
 
 from django.contrib.auth.models import AbstractUser, UserManager
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
@@ -25,6 +27,50 @@ class ListingStatus(models.IntegerChoices):
     CLOSED = 2, "CLOSED"
 
 
+class ListingRollupFacet(models.TextChoices):
+    COLLECTION = "collection", "Collection"
+    TOKEN = "token", "Token"
+    DURATION = "duration", "Duration"
+    BORROW_AMOUNT = "borrow_amount", "Borrow Amount"
+
+
+# FIELDS
+
+HEX_ADDRESS_REGEX = re.compile(r"^0x[0-9a-f]+$", re.IGNORECASE)
+
+
+def normalize_address(address: str | None) -> str | None:
+    """
+    Canonicalize a contract or wallet address.
+    Hex addresses are lowercased and stripped of their leading zeros,
+    so the different ways of writing an address are stored the same way.
+    """
+    if address is None:
+        return None
+    address = address.strip()
+    if HEX_ADDRESS_REGEX.match(address):
+        return hex(int(address, 16))
+    return address.lower()
+
+
+class AddressField(models.CharField):
+    """
+    ### Description
+    A char field for contract and wallet addresses.
+    The addresses are canonicalized when they are saved and when they
+    are used in lookups, so exact lookups can use the indexes instead
+    of case insensitive comparisons.
+    """
+
+    def pre_save(self, model_instance, add):
+        value = normalize_address(getattr(model_instance, self.attname))
+        setattr(model_instance, self.attname, value)
+        return value
+
+    def get_prep_value(self, value):
+        return normalize_address(super().get_prep_value(value))
+
+
 # MANAGERS
 
 
@@ -116,7 +162,7 @@ class User(AbstractUser, BaseModel):
             "unique": _("A user with that email already exists."),
         },
     )
-    public_key = models.CharField(
+    public_key = AddressField(
         _("Public Key"),
         max_length=70,
         unique=True,
@@ -148,7 +194,7 @@ class AcceptedNFT(BaseModel):
         max_length=70,
         unique=True,
     )
-    contract_address = models.CharField(
+    contract_address = AddressField(
         _("Collection Contract Address"),
         max_length=70,
         unique=True,
@@ -177,7 +223,7 @@ class AcceptedToken(BaseModel):
         max_length=70,
         unique=True,
     )
-    contract_address = models.CharField(
+    contract_address = AddressField(
         _("Token Contract Address"),
         max_length=70,
         unique=True,
@@ -208,12 +254,14 @@ class Listing(BaseModel):
     - repayment_amount(int) - the amount of token to be
     repaid (in the token decimal) (optional)
     - duration (int) - the duration in seconds of when the loan must be repaid
+    - search_document(str) - the lowercased collateral contract address, borrower
+    public key and collection name, kept in sync when the listing is saved
     """
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    nft_contract_address = models.CharField(_("NFT Contract Address"), max_length=70)
+    nft_contract_address = AddressField(_("NFT Contract Address"), max_length=70)
     nft_token_id = models.PositiveBigIntegerField(_("NFT Token ID"))
-    token_contract_address = models.CharField(
+    token_contract_address = AddressField(
         _("Token Contract Address"), max_length=70, null=True, blank=True
     )
     borrow_amount = models.PositiveBigIntegerField(
@@ -226,11 +274,82 @@ class Listing(BaseModel):
     status = models.IntegerField(
         choices=ListingStatus.choices, default=ListingStatus.OPEN
     )
+    search_document = models.TextField(
+        _("Search Document"), default="", blank=True, editable=False
+    )
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            # the open listings feed, overall, per collection and per borrower
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(status=ListingStatus.OPEN),
+                name="listing_open_feed_idx",
+            ),
+            models.Index(
+                fields=["nft_contract_address", "-created_at", "-id"],
+                condition=models.Q(status=ListingStatus.OPEN),
+                name="listing_open_collection_idx",
+            ),
+            models.Index(
+                fields=["user", "-created_at", "-id"],
+                condition=models.Q(status=ListingStatus.OPEN),
+                name="listing_open_borrower_idx",
+            ),
+            # the listings of an NFT, used to merge ingested listings
+            models.Index(
+                fields=["nft_contract_address", "nft_token_id"],
+                name="listing_nft_idx",
+            ),
+            # substring search of the open listings
+            GinIndex(
+                fields=["search_document"],
+                opclasses=["gin_trgm_ops"],
+                condition=models.Q(status=ListingStatus.OPEN),
+                name="listing_open_search_trgm_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"Token: {self.token_contract_address}, NFT: {self.nft_contract_address}"
 
 
+class ListingRollup(BaseModel):
+    """
+    ### Description
+    This model represent a precomputed listing count of a facet value,
+    like the number of listings of a collection or of a requested token.
+    The counts are updated in the transaction that creates, changes
+    or deletes a listing, so the catalogs do not count the listings.
+
+    The durations are counted in buckets of days and the borrow amounts
+    in buckets of whole tokens.
+
+    ### Fields:
+    - facet(str) - the listing facet that is counted.
+    - value(str) - the value of the facet, like a contract address or a bucket.
+    - listings_count(int) - the number of listings with this value.
+    - open_listings_count(int) - the number of open listings with this value.
+    """
+
+    facet = models.CharField(
+        _("Facet"), max_length=20, choices=ListingRollupFacet.choices
+    )
+    value = models.CharField(_("Value"), max_length=70)
+    listings_count = models.BigIntegerField(_("Listings Count"), default=0)
+    open_listings_count = models.BigIntegerField(_("Open Listings Count"), default=0)
+
+    class Meta(BaseModel.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                fields=["facet", "value"], name="listing_rollup_facet_value_unique"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.facet}: {self.value} ({self.listings_count})"
+
+
 class Offer(BaseModel):
     """
     ### Description
@@ -250,11 +369,13 @@ class Offer(BaseModel):
     - signature_expiry (int) - the timestamp of when the signature expires
     - signature_chain_id (int) - the chain id of the signature
     - signature_unique_id (int) -  the unique id used for the signature
+    - effective_apr (float) - the yearly interest rate of the offer, the interest
+    over the principal scaled from the duration to a year
     """
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE)
-    token_contract_address = models.CharField(
+    token_contract_address = AddressField(
         _("Token Contract Address"),
         max_length=70,
     )
@@ -269,15 +390,44 @@ class Offer(BaseModel):
     signature_expiry = models.PositiveIntegerField(_("Signature Expiry"))
     signature_chain_id = models.IntegerField(_("Signature Chain Id"))
     signature_unique_id = models.PositiveBigIntegerField(_("Signature Unique Id"))
+    effective_apr = models.FloatField(_("Effective APR"), null=True, blank=True)
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            # the offer book of a listing, ranked by rate, principal or expiry
+            models.Index(
+                fields=["listing", "effective_apr", "id"],
+                name="offer_listing_apr_idx",
+            ),
+            models.Index(
+                fields=["listing", "borrow_amount", "id"],
+                name="offer_listing_principal_idx",
+            ),
+            models.Index(
+                fields=["listing", "signature_expiry", "id"],
+                name="offer_listing_expiry_idx",
+            ),
+            # the newest offers of a lender and on a listing, by keyset
+            models.Index(
+                fields=["user", "created_at", "id"], name="offer_user_created_idx"
+            ),
+            models.Index(
+                fields=["listing", "created_at", "id"],
+                name="offer_listing_created_idx",
+            ),
+            # the expired offers, for the sweeper
+            models.Index(fields=["signature_expiry"], name="offer_expiry_idx"),
+        ]
 
     def __str__(self) -> str:
-        return f"Listing #{self.listing.id_as_str}, Lend amount: {self.borrow_amount}"
+        # the listing id is read from the foreign key, without loading the listing
+        return f"Listing #{self.listing_id}, Lend amount: {self.borrow_amount}"
 
 
-class Loan(BaseModel):
+class AbstractLoan(BaseModel):
     """
     ### Description
-    This model represent a loan.
+    The fields of a loan, shared by the loans and the archived loans.
 
     ### Fields:
     - borrower(str) - the contract address of the borrower.
@@ -291,14 +441,18 @@ class Loan(BaseModel):
     repaid (in the token decimal)
     - duration (int) - the duration in seconds of when the loan must be repaid
     - start_time(datetime) - the date the loan started
+    - due_at(datetime) - the date the loan must be repaid, the start time
+    plus the duration, kept in sync when the loan is saved
+    - closed_at(datetime) - the date the loan was repaid or foreclosed
+    (optional), set when the loan is saved with one of these statuses
     """
 
-    borrower = models.CharField(_("Borrower"), max_length=70)
-    lender = models.CharField(_("Lender"), max_length=70)
+    borrower = AddressField(_("Borrower"), max_length=70)
+    lender = AddressField(_("Lender"), max_length=70)
     loan_id = models.PositiveBigIntegerField(_("Loan Id"))
-    nft_contract_address = models.CharField(_("NFT Contract Address"), max_length=70)
+    nft_contract_address = AddressField(_("NFT Contract Address"), max_length=70)
     nft_token_id = models.PositiveBigIntegerField(_("NFT Token ID"))
-    token_contract_address = models.CharField(
+    token_contract_address = AddressField(
         _("Token Contract Address"),
         max_length=70,
     )
@@ -309,11 +463,153 @@ class Loan(BaseModel):
     status = models.IntegerField(
         _("Loan Status"), choices=LoanStatus.choices, default=LoanStatus.PENDING
     )
+    due_at = models.DateTimeField(_("Loan Due Time"), editable=False)
+    closed_at = models.DateTimeField(
+        _("Loan Close Time"), null=True, blank=True, editable=False
+    )
+
+    class Meta(BaseModel.Meta):
+        abstract = True
 
     def __str__(self) -> str:
         return str(self.loan_id)
 
 
+class Loan(AbstractLoan):
+    """
+    ### Description
+    This model represent a loan. The repaid and foreclosed loans are moved
+    to the archived loans by the loan archiver, see `ArchivedLoan`.
+    """
+
+    class Meta(AbstractLoan.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=["loan_id"], name="loan_loan_id_unique")
+        ]
+        indexes = [
+            # the pending loans by due time, for the loan scheduler
+            models.Index(
+                fields=["due_at"],
+                condition=models.Q(status=LoanStatus.PENDING),
+                name="loan_pending_due_idx",
+            ),
+            # the portfolios of the borrowers and lenders, read from the indexes
+            models.Index(
+                fields=["borrower", "token_contract_address", "status"],
+                include=["borrow_amount", "repayment_amount"],
+                name="loan_borrower_portfolio_idx",
+            ),
+            models.Index(
+                fields=["lender", "token_contract_address", "status"],
+                include=["borrow_amount", "repayment_amount"],
+                name="loan_lender_portfolio_idx",
+            ),
+            # the repaid and foreclosed loans by close time, for the archiver
+            models.Index(
+                fields=["closed_at"],
+                condition=models.Q(
+                    status__in=[LoanStatus.FORECLOSED, LoanStatus.REPAID]
+                ),
+                name="loan_closed_idx",
+            ),
+        ]
+
+
+class ArchivedLoan(AbstractLoan):
+    """
+    ### Description
+    This model represent a repaid or foreclosed loan that was moved out of
+    the loans. The table is partitioned by month of the start time, the
+    partitions are created by the loan archiver, so the table is not
+    managed by the migrations of the model. Its primary key is
+    (id, start_time) and the loan ids are indexed but not unique,
+    since the unique constraints of a partitioned table must include
+    the start time.
+
+    ### Fields:
+    - archived_at(datetime) - the date the loan was archived.
+    """
+
+    archived_at = models.DateTimeField(_("Loan Archive Time"))
+
+    class Meta(AbstractLoan.Meta):
+        managed = False
+        db_table = "core_loanhistory"
+
+
+class LoanDailyRollup(BaseModel):
+    """
+    ### Description
+    This model represent the loans of a collection in a token on a day
+    (in UTC). The rollups are updated in the transaction that creates,
+    changes or deletes a loan, so the protocol stats do not read the loans.
+
+    The amounts are in the token decimal, they are normalized with the
+    decimals of the accepted token when they are read.
+
+    ### Fields:
+    - day(date) - the day of the rollup.
+    - nft_contract_address(str) - the contract address of the collateral NFT.
+    - token_contract_address(str) - the contract address of the token.
+    - loans_count(int) - the number of loans started on the day.
+    - volume(int) - the principal of the loans started on the day.
+    - locked_delta(int) - the principal of the loans started on the day minus
+    the principal of the loans repaid or foreclosed on the day.
+    - locked_total(int) - the value locked at the end of the day, the sum of
+    the deltas of the collection and token up to this day.
+    """
+
+    day = models.DateField(_("Day"))
+    nft_contract_address = AddressField(_("NFT Contract Address"), max_length=70)
+    token_contract_address = AddressField(_("Token Contract Address"), max_length=70)
+    loans_count = models.BigIntegerField(_("Loans Count"), default=0)
+    volume = models.DecimalField(
+        _("Volume"), max_digits=78, decimal_places=0, default=0
+    )
+    locked_delta = models.DecimalField(
+        _("Locked Delta"), max_digits=78, decimal_places=0, default=0
+    )
+    locked_total = models.DecimalField(
+        _("Locked Total"), max_digits=78, decimal_places=0, default=0
+    )
+
+    class Meta(BaseModel.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "nft_contract_address", "token_contract_address"],
+                name="loan_daily_rollup_unique",
+            )
+        ]
+        indexes = [
+            # the last rollup of a collection and token up to a day
+            models.Index(
+                fields=["nft_contract_address", "token_contract_address", "day"],
+                name="loan_rollup_key_day_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.day}: {self.nft_contract_address}, {self.token_contract_address}"
+
+
+class IndexerCheckpoint(BaseModel):
+    """
+    ### Description
+    This model represent the progress of a chain event indexer. It is
+    saved in the transaction that stores the events of the indexed blocks.
+
+    ### Fields:
+    - name(str) - the name of the indexer.
+    - block_number(int) - the last indexed block.
+    """
+
+    name = models.CharField(_("Name"), max_length=50, unique=True)
+    block_number = models.BigIntegerField(_("Block Number"))
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.block_number}"
+
+
 class RenegotiationOffer(BaseModel):
     """
     ### Description
@@ -358,5 +654,15 @@ class RenegotiationOffer(BaseModel):
         default=LoanRenegotiationStatus.PENDING,
     )
 
-    def __str__(self):
-        return f"Loan #{self.loan.loan_id}, status: {self.status.get_status_display()}"
+    class Meta(BaseModel.Meta):
+        indexes = [
+            # the offers of a loan by status, newest last, for the inbox
+            models.Index(
+                fields=["loan", "status", "created_at"],
+                name="renegotiation_loan_status_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        # the loan id is read from the foreign key, without loading the loan
+        return f"Loan #{self.loan_id}, status: {self.get_status_display()}"
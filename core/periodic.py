@@ -0,0 +1,56 @@
+# in-process periodic background tasks
+import logging
+import threading
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """
+    ### Description
+    A task that `start` runs every `interval` seconds in a daemon thread of
+    the current process, until `stop` is called. Subclasses define `run`.
+    """
+
+    name = None
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def run(self):
+        raise NotImplementedError
+
+    def start(self):
+        """
+        Run the task periodically in a daemon thread
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run_periodically, name=self.name, daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stopped.set()
+        if thread is not None:
+            thread.join()
+
+    def _run_periodically(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.run()
+            except Exception:
+                logger.exception("The %s task failed", self.name)
+            finally:
+                # the connection of the thread is not reused by the next run
+                connections.close_all()
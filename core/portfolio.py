@@ -0,0 +1,115 @@
+# loan portfolios of the borrowers and lenders
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from . import models
+from .registry import accepted_assets
+
+# the loans that are neither repaid nor foreclosed
+OUTSTANDING_STATUSES = (models.LoanStatus.PENDING, models.LoanStatus.EXPIRED)
+# the generation of the cached portfolios, bumped after bulk loan writes
+PORTFOLIO_GENERATION_KEY = "portfolio:generation"
+
+# the loans of an address as borrower and as lender, grouped by token and
+# status, with the archived loans. Each side is read from an index of its
+# address column.
+PORTFOLIO_SQL = """
+SELECT role, token_contract_address, status, COUNT(*),
+    SUM(borrow_amount), SUM(repayment_amount)
+FROM (
+    SELECT 'borrower' AS role, token_contract_address, status,
+        borrow_amount, repayment_amount
+    FROM core_loan WHERE borrower = %(address)s
+    UNION ALL
+    SELECT 'lender', token_contract_address, status,
+        borrow_amount, repayment_amount
+    FROM core_loan WHERE lender = %(address)s
+    UNION ALL
+    SELECT 'borrower', token_contract_address, status,
+        borrow_amount, repayment_amount
+    FROM core_loanhistory WHERE borrower = %(address)s
+    UNION ALL
+    SELECT 'lender', token_contract_address, status,
+        borrow_amount, repayment_amount
+    FROM core_loanhistory WHERE lender = %(address)s
+) AS loan
+GROUP BY role, token_contract_address, status
+ORDER BY role, token_contract_address, status
+"""
+
+
+def _get_generation() -> int:
+    generation = cache.get(PORTFOLIO_GENERATION_KEY)
+    if generation is None:
+        # like the listing pages, an evicted generation is never reused
+        cache.add(PORTFOLIO_GENERATION_KEY, time.time_ns(), None)
+        generation = cache.get(PORTFOLIO_GENERATION_KEY)
+    return generation
+
+
+def _portfolio_cache_key(address: str) -> str:
+    return f"portfolio:{_get_generation()}:{address}"
+
+
+def compute_portfolio(address: str) -> dict:
+    """
+    The loans of an address as borrower and as lender, by token: the
+    outstanding principal, the expected repayment of the outstanding loans
+    and the number of loans by status. It is read in a single query.
+    """
+    portfolio = {"address": address, "borrower": [], "lender": []}
+    tokens = {}
+    with connection.cursor() as cursor:
+        cursor.execute(PORTFOLIO_SQL, {"address": address})
+        rows = cursor.fetchall()
+
+    for role, token_contract_address, status, count, principal, repayment in rows:
+        token = tokens.get((role, token_contract_address))
+        if token is None:
+            accepted_token = accepted_assets.get_token(token_contract_address)
+            token = tokens[(role, token_contract_address)] = {
+                "token_contract_address": token_contract_address,
+                "token_decimal": accepted_token and accepted_token.token_decimal,
+                "outstanding_principal": 0,
+                "expected_repayment": 0,
+                "counts": {status.label.lower(): 0 for status in models.LoanStatus},
+            }
+            portfolio[role].append(token)
+        token["counts"][models.LoanStatus(status).label.lower()] = count
+        if status in OUTSTANDING_STATUSES:
+            token["outstanding_principal"] += int(principal)
+            token["expected_repayment"] += int(repayment)
+    return portfolio
+
+
+def get_portfolio(address: str) -> dict:
+    """
+    The portfolio of an address, cached until its loans change
+    """
+    address = models.normalize_address(address)
+    key = _portfolio_cache_key(address)
+    portfolio = cache.get(key)
+    if portfolio is None:
+        portfolio = compute_portfolio(address)
+        cache.set(key, portfolio, settings.PORTFOLIO_CACHE_TTL)
+    return portfolio
+
+
+def invalidate_portfolios(*addresses: str):
+    """
+    Drop the cached portfolios of addresses whose loans changed
+    """
+    cache.delete_many([_portfolio_cache_key(address) for address in addresses])
+
+
+def invalidate_all_portfolios():
+    """
+    Drop every cached portfolio, after loans were written in bulk
+    """
+    try:
+        cache.incr(PORTFOLIO_GENERATION_KEY)
+    except ValueError:
+        cache.set(PORTFOLIO_GENERATION_KEY, time.time_ns(), None)
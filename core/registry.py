@@ -0,0 +1,99 @@
+# in-process registry of the accepted NFTs and tokens
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import models
+
+
+class AcceptedAssetRegistry:
+    """
+    ### Description
+    The accepted NFTs and tokens, kept in memory and looked up by their
+    normalized contract address, so the catalogs and the offer validation
+    do not query these tiny tables.
+
+    The registry is loaded on its first use and reloaded when the version
+    stamp in the shared cache changes. The stamp is bumped when an accepted
+    NFT or token is saved or deleted, so every process sees the change on
+    its next lookup. A local memory cache is not shared by the processes,
+    so with it the registry is also reloaded every
+    `ACCEPTED_ASSETS_LOCAL_TTL` seconds to see the changes of the other
+    processes. The cached model instances must not be modified.
+    """
+
+    VERSION_KEY = "accepted_assets:version"
+
+    def __init__(self):
+        # (version, nfts by contract address, tokens by contract address,
+        # monotonic time of the load)
+        self._state = (None, {}, {}, 0.0)
+        self._lock = threading.Lock()
+
+    def nfts(self) -> list[models.AcceptedNFT]:
+        """
+        The accepted NFTs, ordered by name
+        """
+        return list(self._get_state()[1].values())
+
+    def tokens(self) -> list[models.AcceptedToken]:
+        """
+        The accepted tokens, ordered by name
+        """
+        return list(self._get_state()[2].values())
+
+    def get_nft(self, contract_address: str) -> models.AcceptedNFT | None:
+        return self._get_state()[1].get(models.normalize_address(contract_address))
+
+    def get_token(self, contract_address: str) -> models.AcceptedToken | None:
+        return self._get_state()[2].get(models.normalize_address(contract_address))
+
+    def invalidate(self):
+        """
+        Bump the version stamp, so every process reloads the registry
+        """
+        try:
+            cache.incr(self.VERSION_KEY)
+        except ValueError:
+            cache.set(self.VERSION_KEY, time.time_ns(), None)
+
+    def _get_version(self) -> int:
+        version = cache.get(self.VERSION_KEY)
+        if version is None:
+            # a missing stamp starts from the current time,
+            # so an evicted stamp is never reused
+            cache.add(self.VERSION_KEY, time.time_ns(), None)
+            version = cache.get(self.VERSION_KEY)
+        return version
+
+    def _is_stale(self, state: tuple, version: int) -> bool:
+        if state[0] != version:
+            return True
+        # the stamp of a local cache is only bumped by this process
+        return (
+            isinstance(caches["default"], LocMemCache)
+            and time.monotonic() - state[3] >= settings.ACCEPTED_ASSETS_LOCAL_TTL
+        )
+
+    def _get_state(self) -> tuple:
+        version = self._get_version()
+        state = self._state
+        if not self._is_stale(state, version):
+            return state
+        with self._lock:
+            if self._is_stale(self._state, version):
+                nfts = models.AcceptedNFT.objects.order_by("name")
+                tokens = models.AcceptedToken.objects.order_by("name")
+                self._state = (
+                    version,
+                    {nft.contract_address: nft for nft in nfts},
+                    {token.contract_address: token for token in tokens},
+                    time.monotonic(),
+                )
+            return self._state
+
+
+accepted_assets = AcceptedAssetRegistry()
@@ -0,0 +1,203 @@
+# precomputed listing counts
+from collections import Counter
+
+from django.db import connection
+
+from . import models
+from .models import ListingRollupFacet
+from .registry import accepted_assets
+
+# the lower edges of the duration buckets, in days
+DURATION_BUCKETS = [0, 1, 7, 30, 90, 180]
+# the lower edges of the borrow amount buckets, in whole tokens
+BORROW_AMOUNT_BUCKETS = [0, 1, 10, 100, 1000, 10000]
+
+# adds the deltas of (facet, value, count, open count) rows to the listing counts
+APPLY_ROLLUP_DELTAS_SQL = """
+INSERT INTO core_listingrollup
+    (id, created_at, updated_at, facet, value, listings_count, open_listings_count)
+SELECT gen_random_uuid(), NOW(), NOW(),
+    delta.facet, delta.value, delta.count, delta.open_count
+FROM (VALUES {values}) AS delta (facet, value, count, open_count)
+ON CONFLICT (facet, value) DO UPDATE SET
+    listings_count = core_listingrollup.listings_count + EXCLUDED.listings_count,
+    open_listings_count = (
+        core_listingrollup.open_listings_count + EXCLUDED.open_listings_count
+    ),
+    updated_at = EXCLUDED.updated_at
+"""
+
+
+def bucket_label(value: int, edges: list[int], scale: int = 1) -> str:
+    """
+    The label of the bucket of a value, like "1-7" or "180+".
+    The edges are multiplied by the scale, so the values are compared
+    exactly, without converting them to the unit of the edges.
+    """
+    for lower, upper in zip(edges, edges[1:]):
+        if value < upper * scale:
+            return f"{lower}-{upper}"
+    return f"{edges[-1]}+"
+
+
+def _bucket_label_sql(value: str, edges: list[int], scale: str) -> str:
+    """
+    The SQL of `bucket_label`
+    """
+    cases = " ".join(
+        f"WHEN {value} < {upper} * {scale} THEN '{lower}-{upper}'"
+        for lower, upper in zip(edges, edges[1:])
+    )
+    return f"CASE {cases} ELSE '{edges[-1]}+' END"
+
+
+# recounts every listing count with a single grouped aggregate
+REBUILD_ROLLUPS_SQL = f"""
+DELETE FROM core_listingrollup;
+INSERT INTO core_listingrollup
+    (id, created_at, updated_at, facet, value, listings_count, open_listings_count)
+SELECT gen_random_uuid(), NOW(), NOW(), facet, value,
+    COUNT(*), COUNT(*) FILTER (WHERE status = {models.ListingStatus.OPEN})
+FROM (
+    SELECT 'collection' AS facet, nft_contract_address AS value, status
+    FROM core_listing
+    UNION ALL
+    SELECT 'token', token_contract_address, status FROM core_listing
+    WHERE token_contract_address IS NOT NULL
+    UNION ALL
+    SELECT 'duration', {_bucket_label_sql("duration", DURATION_BUCKETS, "86400")},
+        status
+    FROM core_listing
+    WHERE duration IS NOT NULL
+    UNION ALL
+    SELECT 'borrow_amount', {_bucket_label_sql(
+        "listing.borrow_amount",
+        BORROW_AMOUNT_BUCKETS,
+        "POWER(10::numeric, token.token_decimal)",
+    )}, listing.status
+    FROM core_listing AS listing
+    JOIN core_acceptedtoken AS token
+        ON token.contract_address = listing.token_contract_address
+    WHERE listing.borrow_amount IS NOT NULL
+) AS listing_facet
+GROUP BY facet, value;
+"""
+
+
+def listing_facets(listing: models.Listing) -> list[tuple[str, str]]:
+    """
+    The facet values that a listing is counted in.
+    The borrow amount is only counted for the accepted tokens,
+    whose decimals are known.
+    """
+    facets = [
+        (
+            ListingRollupFacet.COLLECTION,
+            models.normalize_address(listing.nft_contract_address),
+        )
+    ]
+    if listing.token_contract_address:
+        facets.append(
+            (
+                ListingRollupFacet.TOKEN,
+                models.normalize_address(listing.token_contract_address),
+            )
+        )
+    if listing.duration is not None:
+        facets.append(
+            (
+                ListingRollupFacet.DURATION,
+                bucket_label(listing.duration, DURATION_BUCKETS, 86400),
+            )
+        )
+    token = (
+        accepted_assets.get_token(listing.token_contract_address)
+        if listing.token_contract_address
+        else None
+    )
+    if listing.borrow_amount is not None and token is not None:
+        facets.append(
+            (
+                ListingRollupFacet.BORROW_AMOUNT,
+                bucket_label(
+                    listing.borrow_amount,
+                    BORROW_AMOUNT_BUCKETS,
+                    10**token.token_decimal,
+                ),
+            )
+        )
+    return facets
+
+
+def listing_rollup_keys(listing: models.Listing) -> list[tuple[str, str, bool]]:
+    """
+    The facet values that a listing is counted in,
+    with whether it is counted as an open listing
+    """
+    is_open = listing.status == models.ListingStatus.OPEN
+    return [(facet, value, is_open) for facet, value in listing_facets(listing)]
+
+
+def apply_rollup_deltas(deltas: Counter):
+    """
+    Add the deltas of (facet, value, is open) keys to the listing counts,
+    in a single statement of the current transaction
+    """
+    counts = {}
+    for (facet, value, is_open), delta in deltas.items():
+        count, open_count = counts.get((facet, value), (0, 0))
+        counts[(facet, value)] = (count + delta, open_count + delta * is_open)
+    counts = {key: count for key, count in counts.items() if any(count)}
+    if not counts:
+        return
+    values = ", ".join(["(%s, %s, %s::bigint, %s::bigint)"] * len(counts))
+    params = [
+        param
+        for (facet, value), (count, open_count) in counts.items()
+        for param in (facet, value, count, open_count)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(APPLY_ROLLUP_DELTAS_SQL.format(values=values), params)
+
+
+def rebuild_rollups():
+    """
+    Recount the listing counts, after listings were written in bulk
+    or the decimals of a token changed
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(REBUILD_ROLLUPS_SQL)
+
+
+def get_listings_counts(facet: str) -> dict[str, int]:
+    """
+    The listing count of every value of a facet, in a single query
+    """
+    return dict(
+        models.ListingRollup.objects.filter(facet=facet)
+        .order_by()
+        .values_list("value", "listings_count")
+    )
+
+
+def get_open_listing_facets() -> dict[str, list[dict]]:
+    """
+    The open listing count of every value of every facet, in a single query.
+    The collections and tokens are ordered by count, the buckets by their edges.
+    """
+    facets = {facet: [] for facet in ListingRollupFacet.values}
+    rollups = (
+        models.ListingRollup.objects.filter(open_listings_count__gt=0)
+        .order_by("-open_listings_count", "value")
+        .values_list("facet", "value", "open_listings_count")
+    )
+    for facet, value, count in rollups:
+        facets[facet].append({"value": value, "count": count})
+
+    for facet, edges in (
+        (ListingRollupFacet.DURATION, DURATION_BUCKETS),
+        (ListingRollupFacet.BORROW_AMOUNT, BORROW_AMOUNT_BUCKETS),
+    ):
+        order = {bucket_label(edge, edges): index for index, edge in enumerate(edges)}
+        facets[facet].sort(key=lambda bucket: order.get(bucket["value"], len(order)))
+    return facets
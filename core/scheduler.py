@@ -0,0 +1,137 @@
+# expiry of the pending loans that are due
+import functools
+import logging
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import models
+from .periodic import PeriodicTask
+from .portfolio import invalidate_portfolios
+
+logger = logging.getLogger(__name__)
+
+# expires a batch of due loans, found through the partial index of the pending
+# loans. The loans locked by another scheduler are skipped, so the schedulers
+# of several nodes drain distinct batches. Returns the seconds between the
+# due time of each loan and its expiry, and the addresses of the loan.
+EXPIRE_DUE_LOANS_SQL = f"""
+WITH due AS (
+    SELECT id FROM core_loan
+    WHERE status = {models.LoanStatus.PENDING} AND due_at <= %s
+    ORDER BY due_at
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE core_loan
+SET status = {models.LoanStatus.EXPIRED}, updated_at = NOW()
+FROM due
+WHERE core_loan.id = due.id
+RETURNING EXTRACT(EPOCH FROM clock_timestamp() - core_loan.due_at)::float8,
+    core_loan.borrower, core_loan.lender
+"""
+
+
+class LoanScheduler(PeriodicTask):
+    """
+    ### Description
+    Moves the pending loans whose due time passed to the expired status,
+    in batches of `batch_size` loans. Every batch is a transaction of its
+    own, and a run stops after `max_batches` batches.
+
+    The scheduler keeps the counters of its runs, with the transition
+    latency (the seconds between the due time of a loan and its expiry),
+    and `start` runs it every `interval` seconds in a daemon thread of the
+    current process.
+    """
+
+    name = "loan-scheduler"
+
+    def __init__(self, batch_size: int, max_batches: int, interval: float):
+        super().__init__(interval)
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.runs = 0
+        self.expired = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_run = None
+
+    def expire_due_loans(self, now: datetime | None = None) -> dict:
+        """
+        Expire the loans that are due at `now`, the current time by default.
+        Returns:
+            dict: the number of expired loans, of batches, the duration
+            and the maximum transition latency of the run
+        """
+        now = timezone.now() if now is None else now
+        started_at = time.monotonic()
+        latencies = []
+        batches = 0
+        while batches < self.max_batches:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(EXPIRE_DUE_LOANS_SQL, [now, self.batch_size])
+                rows = cursor.fetchall()
+            batch = [latency for latency, _, _ in rows]
+            invalidate_portfolios(
+                *{address for _, *addresses in rows for address in addresses}
+            )
+            batches += 1
+            latencies += batch
+            if len(batch) < self.batch_size:
+                break
+
+        run = {
+            "expired": len(latencies),
+            "batches": batches,
+            "seconds": time.monotonic() - started_at,
+            "max_latency": max(latencies, default=None),
+            "finished_at": time.time(),
+        }
+        with self._lock:
+            self.runs += 1
+            self.expired += len(latencies)
+            self.total_latency += sum(latencies)
+            self.max_latency = max([self.max_latency, *latencies])
+            self.last_run = run
+        logger.info(
+            "Expired %s due loans in %s batches in %.3fs",
+            len(latencies),
+            batches,
+            run["seconds"],
+        )
+        return run
+
+    def stats(self) -> dict:
+        """
+        The counters of the runs of the scheduler, with the mean and the
+        maximum transition latency in seconds
+        """
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "expired": self.expired,
+                "mean_latency": (
+                    self.total_latency / self.expired if self.expired else None
+                ),
+                "max_latency": self.max_latency if self.expired else None,
+                "last_run": self.last_run,
+            }
+
+    def run(self):
+        self.expire_due_loans()
+
+
+@functools.cache
+def get_loan_scheduler() -> LoanScheduler:
+    """
+    The loan scheduler configured in the settings
+    """
+    return LoanScheduler(
+        settings.LOAN_SCHEDULER_BATCH_SIZE,
+        settings.LOAN_SCHEDULER_MAX_BATCHES,
+        settings.LOAN_SCHEDULER_INTERVAL,
+    )
@@ -0,0 +1,68 @@
+# search backend of the listings
+from django.db.models import F, Func, OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Lower
+from rest_framework import filters
+
+from . import models
+
+
+def build_search_document(listing: models.Listing) -> str:
+    """
+    Build the search document of a listing. It holds the collateral
+    contract address, the public key of the borrower and the name of
+    the collection, lowercased and separated by spaces.
+    """
+    nft_contract_address = models.normalize_address(listing.nft_contract_address)
+    collection_name = (
+        models.AcceptedNFT.objects.filter(contract_address=nft_contract_address)
+        .values_list("name", flat=True)
+        .first()
+    )
+    values = [nft_contract_address, listing.user.public_key, collection_name]
+    return " ".join(value for value in values if value).lower()
+
+
+def refresh_search_documents(nft_contract_address: str):
+    """
+    Rebuild the search documents of the listings of a collection
+    in a single update, after the collection changed.
+    """
+    public_key = models.User.objects.filter(id=OuterRef("user_id")).values(
+        "public_key"
+    )[:1]
+    collection_name = models.AcceptedNFT.objects.filter(
+        contract_address=nft_contract_address
+    ).values("name")[:1]
+    models.Listing.objects.filter(nft_contract_address=nft_contract_address).update(
+        search_document=Lower(
+            # CONCAT_WS skips the missing collection name
+            Func(
+                Value(" "),
+                F("nft_contract_address"),
+                Subquery(public_key),
+                Subquery(collection_name),
+                function="CONCAT_WS",
+                output_field=TextField(),
+            )
+        )
+    )
+
+
+class ListingSearchFilter(filters.SearchFilter):
+    """
+    Search the listings by substring or prefix of the collateral contract
+    address, the public key of the borrower or the collection name.
+    Every search term must be in the search document of the listing, the
+    document has a trigram index so the search does not scan the table.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        for term in terms:
+            # address terms are canonicalized like the stored addresses
+            term = models.normalize_address(term)
+            queryset = queryset.filter(search_document__contains=term)
+        return queryset
+
+    def get_search_fields(self, view, request):
+        return ["search_document"]
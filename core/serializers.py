@@ -1,11 +1,16 @@
 from django.conf import settings
 from rest_framework import exceptions as rest_exceptions
 from rest_framework import generics, serializers
+from starknet_py.utils.typed_data import parse_felt
 
 from . import exceptions, models
 from .models import Listing
+from .registry import accepted_assets
 from .service import CoreService
 
+# the largest chain id of the signature_chain_id columns
+MAX_CHAIN_ID = 2**31 - 1
+
 
 class AcceptedNFTSerializer(serializers.ModelSerializer):
     """
@@ -26,9 +31,8 @@ class AcceptedNFTSerializer(serializers.ModelSerializer):
         fields = ["name", "contract_address", "listings_count"]
 
     def get_listings_count(self, obj: models.AcceptedNFT) -> int:
-        return models.Listing.objects.filter(
-            nft_contract_address=obj.contract_address
-        ).count()
+        # the counts of every contract are fetched once by the view
+        return self.context["listings_counts"].get(obj.contract_address, 0)
 
 
 class AcceptedTokenSerializer(serializers.ModelSerializer):
@@ -49,10 +53,9 @@ class AcceptedTokenSerializer(serializers.ModelSerializer):
         model = models.AcceptedToken
         fields = ["name", "contract_address", "listings_count"]
 
-    def get_listings_count(self, obj: models.AcceptedNFT) -> int:
-        return models.Listing.objects.filter(
-            token_contract_address=obj.contract_address
-        ).count()
+    def get_listings_count(self, obj: models.AcceptedToken) -> int:
+        # the counts of every contract are fetched once by the view
+        return self.context["listings_counts"].get(obj.contract_address, 0)
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -81,6 +84,9 @@ class SignInSerializer(serializers.Serializer):
     signatures = serializers.ListField(child=serializers.CharField())
     public_key = serializers.CharField()
 
+    def validate_public_key(self, value: str) -> str:
+        return models.normalize_address(value)
+
     def validate(self, attrs: dict) -> dict:
         """
         Validate the request data
@@ -121,13 +127,39 @@ class SignInSerializer(serializers.Serializer):
         return {**data, **token_info}
 
 
-class OfferSerializer(serializers.Serializer):
+class OfferListingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Listing
+        fields = ["id", "nft_contract_address", "nft_token_id", "status"]
+
+
+class OfferSerializer(serializers.ModelSerializer):
+    """
+    Serializer class for the offers, with a summary of their listing and the
+    public key of their lender. The listing and the lender should be
+    loaded with the offer, with `select_related`.
+    """
+
+    listing = OfferListingSerializer(read_only=True)
+    lender = serializers.CharField(source="user.public_key", read_only=True)
+
     class Meta:
         model = models.Offer
-        fields = "__all__"
+        fields = [
+            "id",
+            "created_at",
+            "listing",
+            "lender",
+            "token_contract_address",
+            "borrow_amount",
+            "repayment_amount",
+            "duration",
+            "effective_apr",
+            "signature_expiry",
+        ]
 
 
-class SimpleOfferSerializer(serializers.Serializer):
+class SimpleOfferSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Offer
         exclude = [
@@ -153,6 +185,22 @@ class MakeOfferSerializer(serializers.Serializer):
     unique_id = serializers.IntegerField()
     signatures = serializers.ListField(child=serializers.CharField())
 
+    def validate_collateral_contract(self, value: str) -> str:
+        return models.normalize_address(value)
+
+    def validate_token_contract(self, value: str) -> str:
+        return models.normalize_address(value)
+
+    def validate_chain_id(self, value: str) -> int:
+        # the chain id is signed as a felt but stored in an integer column
+        try:
+            chain_id = parse_felt(value)
+        except ValueError:
+            raise serializers.ValidationError("Invalid chain id")
+        if not 0 <= chain_id <= MAX_CHAIN_ID:
+            raise serializers.ValidationError("Chain id is not supported")
+        return chain_id
+
     def validate(self, attrs):
         """
         Validate the request data
@@ -162,6 +210,30 @@ class MakeOfferSerializer(serializers.Serializer):
             listing = models.Listing.objects.get(id=attrs["listing"])
         except models.Listing.DoesNotExist:
             raise serializers.ValidationError({"detail": "Listing does not exist"})
+
+        token_accepted = accepted_assets.get_token(attrs["token_contract"]) is not None
+        self.validate_offer_terms(attrs, listing, token_accepted)
+
+        # verify the signature
+        user = self.context["user"]
+        check = CoreService.validate_loan_offer_request(
+            self.signature_data(attrs), attrs["signatures"], user
+        )
+        if not check:
+            raise serializers.ValidationError({"detail": "Invalid signature message"})
+
+        # set the necessary contexts
+        self.context["listing"] = listing
+
+        return attrs
+
+    @classmethod
+    def validate_offer_terms(
+        cls, attrs: dict, listing: models.Listing, token_accepted: bool
+    ):
+        """
+        Validate the offer against its listing and the accepted tokens
+        """
         if listing.status != models.ListingStatus.OPEN:
             raise serializers.ValidationError({"detail": "Listing is not active"})
         # Collateral Contract Validation
@@ -175,14 +247,16 @@ class MakeOfferSerializer(serializers.Serializer):
             )
 
         # validate offer token
-        if not models.AcceptedToken.objects.filter(
-            contract_address=attrs["token_contract"]
-        ).exists():
+        if not token_accepted:
             raise serializers.ValidationError({"detail": "Token not supported"})
 
-        # verify the signature
-        data = {
-            "principal": attrs["prinicipal"],
+    @classmethod
+    def signature_data(cls, attrs: dict) -> dict:
+        """
+        The data of the offer signature request message
+        """
+        return {
+            "principal": attrs["principal"],
             "repayment_amount": attrs["repayment_amount"],
             "collateral_contract": attrs["collateral_contract"],
             "collateral_id": attrs["collateral_id"],
@@ -192,16 +266,6 @@ class MakeOfferSerializer(serializers.Serializer):
             "chain_id": attrs["chain_id"],
             "unique_id": attrs["unique_id"],
         }
-        user = self.context["user"]
-
-        check = CoreService.validate_loan_offer_request(data, attrs["signatures"], user)
-        if not check:
-            raise serializers.ValidationError({"detail": "Invalid signature message"})
-
-        # set the necessary contexts
-        self.context["listing"] = listing
-
-        return attrs
 
     def save(self, **kwargs):
         user = self.context["user"]
@@ -209,10 +273,11 @@ class MakeOfferSerializer(serializers.Serializer):
         offer = CoreService.create_offer(
             user,
             listing,
+            self.validated_data["token_contract"],
             self.validated_data["principal"],
             self.validated_data["repayment_amount"],
-            self.validated_data["duration"],
-            self.validated_data["signature"],
+            self.validated_data["loan_duration"],
+            self.validated_data["signatures"],
             self.validated_data["expiry"],
             self.validated_data["chain_id"],
             self.validated_data["unique_id"],
@@ -222,6 +287,114 @@ class MakeOfferSerializer(serializers.Serializer):
         return data
 
 
+class BulkMakeOfferSerializer(serializers.Serializer):
+    """
+    Serializer class for creating several offers of a lender in one request.
+    Every offer is validated like in `MakeOfferSerializer`, but the listings
+    are fetched in one query and the signatures are verified together.
+    An invalid offer does not fail the request, each offer gets a result.
+
+    Data:
+        offers: A list of offers in the `MakeOfferSerializer` format
+    """
+
+    offers = serializers.ListField(
+        child=serializers.DictField(),
+        min_length=1,
+        max_length=settings.MAX_BULK_OFFERS,
+    )
+
+    def validate(self, attrs: dict) -> dict:
+        """
+        Validate every offer and keep the result of each one
+        """
+        user = self.context["user"]
+        results = [None] * len(attrs["offers"])
+        offers = {}
+
+        # field validation
+        for index, data in enumerate(attrs["offers"]):
+            try:
+                offers[index] = MakeOfferSerializer().to_internal_value(data)
+            except serializers.ValidationError as e:
+                results[index] = {"index": index, "created": False, "errors": e.detail}
+
+        # the same signed offer can only be created once
+        signed = set()
+        for index, offer in list(offers.items()):
+            key = (offer["listing"], tuple(offer["signatures"]))
+            if key in signed:
+                results[index] = {
+                    "index": index,
+                    "created": False,
+                    "errors": {"detail": "Duplicate offer"},
+                }
+                del offers[index]
+            signed.add(key)
+
+        listings = models.Listing.objects.in_bulk(
+            {offer["listing"] for offer in offers.values()}
+        )
+
+        # listing and token validation
+        for index, offer in list(offers.items()):
+            try:
+                listing = listings.get(offer["listing"])
+                if listing is None:
+                    raise serializers.ValidationError(
+                        {"detail": "Listing does not exist"}
+                    )
+                MakeOfferSerializer.validate_offer_terms(
+                    offer,
+                    listing,
+                    accepted_assets.get_token(offer["token_contract"]) is not None,
+                )
+            except serializers.ValidationError as e:
+                results[index] = {"index": index, "created": False, "errors": e.detail}
+                del offers[index]
+
+        # signature validation
+        checks = CoreService.validate_loan_offer_requests(
+            [
+                (MakeOfferSerializer.signature_data(offer), offer["signatures"])
+                for offer in offers.values()
+            ],
+            user,
+        )
+        for (index, offer), check in zip(list(offers.items()), checks):
+            if not check:
+                results[index] = {
+                    "index": index,
+                    "created": False,
+                    "errors": {"detail": "Invalid signature message"},
+                }
+                del offers[index]
+
+        self.context["results"] = results
+        self.context["offers"] = [
+            (index, listings[offer["listing"]], offer)
+            for index, offer in offers.items()
+        ]
+        return attrs
+
+    def save(self, **kwargs) -> list[dict]:
+        """
+        Create the valid offers
+
+        Returns:
+            list[dict]: the result of each offer in the order of the request
+        """
+        user = self.context["user"]
+        results = self.context["results"]
+        valid_offers = self.context["offers"]
+        created = CoreService.create_offers(
+            user, [(listing, offer) for _, listing, offer in valid_offers]
+        )
+        for (index, _, _), offer in zip(valid_offers, created):
+            results[index] = {"index": index, "created": True, "id": offer.id_as_str}
+        return results
+
+
 class CancelOfferSerializer(serializers.Serializer):
     offer = serializers.UUIDField
 
@@ -252,6 +425,143 @@ class ListingSerializer(serializers.ModelSerializer):
         ]
 
 
+class ListingExportSerializer(ListingSerializer):
+    """
+    Serializer class for the listings of the NDJSON export, with their offers.
+    The creation times keep their microseconds, so the last exported
+    listing is an exact watermark to resume from.
+    """
+
+    created_at = serializers.DateTimeField(format="iso-8601", read_only=True)
+    offers = SimpleOfferSerializer(source="offer_set", many=True, read_only=True)
+
+    class Meta(ListingSerializer.Meta):
+        fields = ListingSerializer.Meta.fields + [
+            "token_contract_address",
+            "repayment_amount",
+            "offers",
+        ]
+
+
+class OfferBookQuerySerializer(serializers.Serializer):
+    """
+    Serializer class for the query parameters of the offer book of a listing.
+
+    Data:
+        ordering: the ranking of the offers, by effective APR, principal or
+            signature expiry, ascending or descending with a "-" prefix
+        limit: the number of offers to return
+    """
+
+    ORDERINGS = ["apr", "-apr", "principal", "-principal", "expiry", "-expiry"]
+
+    ordering = serializers.ChoiceField(choices=ORDERINGS, default="apr")
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+
+class LoanSerializer(serializers.ModelSerializer):
+    """
+    Serializer class for a loan, archived or not
+    """
+
+    archived = serializers.SerializerMethodField()
+
+    class Meta:
+        model = models.Loan
+        fields = [
+            "loan_id",
+            "borrower",
+            "lender",
+            "nft_contract_address",
+            "nft_token_id",
+            "token_contract_address",
+            "borrow_amount",
+            "repayment_amount",
+            "duration",
+            "start_time",
+            "due_at",
+            "closed_at",
+            "status",
+            "archived",
+        ]
+
+    def get_archived(self, loan) -> bool:
+        return isinstance(loan, models.ArchivedLoan)
+
+
+class RenegotiationOfferSerializer(serializers.ModelSerializer):
+    """
+    Serializer class for a renegotiation offer, with the public key of the
+    user who made it. The user should be loaded with the offer.
+    """
+
+    proposer = serializers.CharField(source="user.public_key", read_only=True)
+
+    class Meta:
+        model = models.RenegotiationOffer
+        fields = [
+            "id",
+            "created_at",
+            "proposer",
+            "repayment_amount",
+            "duration",
+            "incentive",
+            "signature_expiry",
+            "status",
+        ]
+
+
+class RenegotiationInboxSerializer(serializers.Serializer):
+    """
+    Serializer class for a loan of the renegotiation inbox, serialized from
+    its latest open offer annotated with the counts of the open offers of
+    the loan. The loan and the user should be loaded with the offer.
+    """
+
+    loan = LoanSerializer(read_only=True)
+    pending_count = serializers.IntegerField(read_only=True)
+    countered_count = serializers.IntegerField(read_only=True)
+    latest_offer = RenegotiationOfferSerializer(source="*", read_only=True)
+
+
+class LoanStatsQuerySerializer(serializers.Serializer):
+    """
+    Serializer class for the query parameters of the loan stats.
+
+    Data:
+        group: the stats by token, or by collection and token
+        start: the first day of the volume (optional)
+        end: the last day of the volume and the day of the value locked
+            (optional)
+    """
+
+    group = serializers.ChoiceField(choices=["token", "collection"], default="token")
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if "start" in attrs and "end" in attrs and attrs["start"] > attrs["end"]:
+            raise serializers.ValidationError("The start must not be after the end")
+        return attrs
+
+
+class ListingExportWatermarkSerializer(serializers.Serializer):
+    """
+    Serializer class for the watermark to resume a listing export from.
+    The export continues after the listing with this creation time and id.
+    """
+
+    after_created_at = serializers.DateTimeField(required=False)
+    after_id = serializers.UUIDField(required=False)
+
+    def validate(self, attrs: dict) -> dict:
+        if "after_id" in attrs and "after_created_at" not in attrs:
+            raise serializers.ValidationError(
+                {"after_created_at": "The watermark needs the creation time"}
+            )
+        return attrs
+
+
 class UpdateEmailSerializer(serializers.Serializer):
     """
     Serializer for updating user email address.
@@ -1,16 +1,20 @@
 import json
 
 from rest_framework_simplejwt.tokens import RefreshToken
-from starknet_py.utils.typed_data import TypedData
 
 from core import models
 
-from .utils import SignatureUtils
+from .feed import offer_event, publish_on_commit
+from .typed_data import CompiledTypedData
+from .utils import LOGIN_TYPED_DATA, OFFER_TYPED_DATA, SignatureUtils
+from .verification import get_signature_verifier
+
+SECONDS_PER_YEAR = 365 * 24 * 60 * 60
 
 
 class CoreService:
     @classmethod
-    def generate_auth_token_data(user: models.User) -> dict:
+    def generate_auth_token_data(cls, user: models.User) -> dict:
         """
         Create the login token for validating protected requests.
         Args:
@@ -32,16 +36,84 @@ class CoreService:
         """
         Validate the signed data that verifies the offer create functionality.
         The data is signed by the user's wallet and it's components
-        are sent for verification
+        are sent for verification.
+        The user is the lender of the offer.
         Args:
             data(dict): the data required to complete the signature request
             signatures(list[str]): the signatures of the message
             user: The user that is signing the message,
 
         """
-        request_format = SignatureUtils.offer_typed_data_format()
-        typed_data = SignatureUtils.generate_signature_typed_data(data, request_format)
-        return SignatureUtils.verify_signatures(typed_data, signatures, user.public_key)
+        message = {**data, "lender": user.public_key}
+        message_hash = OFFER_TYPED_DATA.message_hash(message, user.public_key)
+        return SignatureUtils.verify_message_hash(
+            message_hash, signatures, user.public_key, int(data["expiry"])
+        )
+
+    @classmethod
+    def validate_loan_offer_requests(
+        cls, offers: list[tuple[dict, list[str]]], user: models.User
+    ) -> list[bool]:
+        """
+        Validate the signed data of several offers made by the same lender.
+        Args:
+            offers(list[tuple[dict, list[str]]]): the data required to complete
+                the signature request of each offer and the signatures of
+                its message
+            user: The user that is signing the messages,
+
+        Returns:
+            list[bool]: whether the signature of each offer is valid or not.
+        """
+        requests = [
+            ({**data, "lender": user.public_key}, signatures, user.public_key)
+            for data, signatures in offers
+        ]
+        expiries = [int(data["expiry"]) for data, _ in offers]
+        return cls.verify_signatures_batch(OFFER_TYPED_DATA, requests, expiries)
+
+    @classmethod
+    def verify_signatures_batch(
+        cls,
+        typed_data: CompiledTypedData,
+        requests: list[tuple[dict, list[str], str]],
+        expiries: list[int | None] | None = None,
+    ) -> list[bool]:
+        """
+        Verify the signatures of several messages of the same signature
+        request format. The domain and type hashes of the format are shared
+        by every message, so only the message fields are hashed per item.
+        A malformed item is reported as invalid instead of failing the batch.
+        The signatures are verified as one task of the signature verifier.
+        Args:
+            typed_data(CompiledTypedData): the compiled signature request format
+            requests(list[tuple[dict, list[str], str]]): the message, the
+                signatures and the public key of the signer of each item
+            expiries(list[int | None]): the expiry timestamp of the signature
+                of each item (optional)
+
+        Returns:
+            list[bool]: whether each signature is valid or not, in the order
+                of the requests.
+        """
+        results = [False] * len(requests)
+        verifications = {}
+        for index, (message, signatures, public_key) in enumerate(requests):
+            try:
+                message_hash = typed_data.message_hash(message, public_key)
+                verifications[index] = SignatureUtils.verification_request(
+                    message_hash, signatures, public_key
+                )
+            except (KeyError, IndexError, ValueError):
+                continue
+
+        expiries = expiries or [None] * len(requests)
+        checks = get_signature_verifier().verify_many(
+            list(verifications.values()), [expiries[index] for index in verifications]
+        )
+        for index, check in zip(verifications, checks):
+            results[index] = check
+        return results
 
     @classmethod
     def validate_login_request(
@@ -58,9 +130,9 @@ class CoreService:
         Returns:
             bool: a bool representing whether the signature is valid or not.
         """
-        typed_data_dict = SignatureUtils.login_typed_data_format()
-        typed_data = TypedData(**typed_data_dict)
-        return SignatureUtils.verify_signatures(typed_data, signatures, public_key)
+        message = SignatureUtils.login_message(public_key)
+        message_hash = LOGIN_TYPED_DATA.message_hash(message, public_key)
+        return SignatureUtils.verify_message_hash(message_hash, signatures, public_key)
 
     @classmethod
     def login_or_register_user(cls, public_key: str) -> tuple[models.User, bool]:
@@ -81,6 +153,7 @@ class CoreService:
         cls,
         user: models.User,
         listing: models.Listing,
+        token_contract_address: str,
         principal: int,
         repayment_amount: int,
         duration: int,
@@ -95,9 +168,77 @@ class CoreService:
         Returns:
             models.Offer: the newly created offer instance
         """
+        offer = cls.build_offer(
+            user,
+            listing,
+            token_contract_address,
+            principal,
+            repayment_amount,
+            duration,
+            signature,
+            signature_expiry,
+            signature_chain_id,
+            signature_unique_id,
+        )
+        offer.save()
+        return offer
+
+    @classmethod
+    def create_offers(
+        cls, user: models.User, offers: list[tuple[models.Listing, dict]]
+    ) -> list[models.Offer]:
+        """
+        Create several offers of the same lender in a single insert.
+        Args:
+            user(models.User): the lender
+            offers(list[tuple[models.Listing, dict]]): the listing of each offer
+                and its validated offer data
+        Returns:
+            list[models.Offer]: the newly created offer instances
+        """
+        instances = [
+            cls.build_offer(
+                user,
+                listing,
+                data["token_contract"],
+                data["principal"],
+                data["repayment_amount"],
+                data["loan_duration"],
+                data["signatures"],
+                data["expiry"],
+                data["chain_id"],
+                data["unique_id"],
+            )
+            for listing, data in offers
+        ]
+        created = models.Offer.objects.bulk_create(instances)
+        # the bulk insert sends no signals
+        publish_on_commit(*(offer_event(offer, "created") for offer in created))
+        return created
+
+    @classmethod
+    def build_offer(
+        cls,
+        user: models.User,
+        listing: models.Listing,
+        token_contract_address: str,
+        principal: int,
+        repayment_amount: int,
+        duration: int,
+        signature: list[str],
+        signature_expiry: int,
+        signature_chain_id: int,
+        signature_unique_id: int,
+    ) -> models.Offer:
+        """
+        Build an unsaved Offer with all the required data.
+        Returns:
+            models.Offer: the offer instance
+        """
         offer = models.Offer()
         offer.user = user
         offer.listing = listing
+        offer.token_contract_address = token_contract_address
         offer.borrow_amount = principal
         offer.repayment_amount = repayment_amount
         offer.duration = duration
@@ -106,9 +247,27 @@ class CoreService:
         offer.signature_expiry = signature_expiry
         offer.signature_chain_id = signature_chain_id
         offer.signature_unique_id = signature_unique_id
-        offer.save()
+        offer.effective_apr = cls.effective_apr(principal, repayment_amount, duration)
         return offer
 
+    @classmethod
+    def effective_apr(
+        cls, principal: int | None, repayment_amount: int | None, duration: int
+    ) -> float | None:
+        """
+        The yearly interest rate of a loan. The amounts are in the same token,
+        so the rate does not depend on the decimals of the token.
+        Args:
+            principal(int): the borrowed amount
+            repayment_amount(int): the amount to be repaid
+            duration(int): the duration of the loan in seconds
+        Returns:
+            float | None: the rate, None when it is not defined
+        """
+        if not principal or repayment_amount is None or not duration:
+            return None
+        return (repayment_amount - principal) / principal * SECONDS_PER_YEAR / duration
+
     @classmethod
     def cancel_offer(cls, offer_id: str):
         """
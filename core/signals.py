@@ -0,0 +1,192 @@
+# signal receivers of the core models
+from collections import Counter
+from datetime import timedelta
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import models
+from .feed import listing_event, offer_event, publish_on_commit
+from .listing_cache import bump_generations
+from .loan_rollups import CLOSED_STATUSES, apply_loan_rollup_deltas, loan_rollup_rows
+from .portfolio import invalidate_portfolios
+from .registry import accepted_assets
+from .rollups import apply_rollup_deltas, listing_rollup_keys, rebuild_rollups
+from .search import build_search_document, refresh_search_documents
+
+
+@receiver(pre_save, sender=models.Listing)
+def update_listing_search_document(sender, instance, **kwargs):
+    instance.search_document = build_search_document(instance)
+
+
+@receiver(pre_save, sender=models.Loan)
+def update_loan_due_at(sender, instance, **kwargs):
+    instance.due_at = instance.start_time + timedelta(seconds=instance.duration)
+
+
+@receiver(pre_save, sender=models.Loan)
+def remember_saved_loan(sender, instance, **kwargs):
+    instance._saved_loan = None
+    if not instance._state.adding:
+        instance._saved_loan = models.Loan.objects.filter(pk=instance.pk).first()
+
+
+@receiver(pre_save, sender=models.Loan)
+def update_loan_closed_at(sender, instance, **kwargs):
+    if instance.status not in CLOSED_STATUSES:
+        instance.closed_at = None
+    elif instance.closed_at is None:
+        # a loan created closed is counted as closed when it was due at most
+        now = timezone.now()
+        instance.closed_at = now if instance._saved_loan else min(instance.due_at, now)
+
+
+@receiver(post_save, sender=models.Loan)
+def count_saved_loan(sender, instance, **kwargs):
+    deltas = loan_rollup_rows(instance)
+    if instance._saved_loan is not None:
+        deltas.subtract(loan_rollup_rows(instance._saved_loan))
+    apply_loan_rollup_deltas(deltas)
+
+
+@receiver(post_delete, sender=models.Loan)
+def count_deleted_loan(sender, instance, **kwargs):
+    deltas = Counter()
+    deltas.subtract(loan_rollup_rows(instance))
+    apply_loan_rollup_deltas(deltas)
+
+
+@receiver(post_save, sender=models.Loan)
+@receiver(post_delete, sender=models.Loan)
+def invalidate_loan_portfolios(sender, instance, **kwargs):
+    addresses = {instance.borrower, instance.lender}
+    saved = getattr(instance, "_saved_loan", None)
+    if saved is not None:
+        addresses.update((saved.borrower, saved.lender))
+    addresses = [models.normalize_address(address) for address in addresses]
+    # like the listing pages, drop now and again after the commit
+    invalidate_portfolios(*addresses)
+    transaction.on_commit(partial(invalidate_portfolios, *addresses))
+
+
+@receiver(pre_save, sender=models.Listing)
+def remember_saved_listing(sender, instance, **kwargs):
+    instance._saved_listing = None
+    if not instance._state.adding:
+        instance._saved_listing = models.Listing.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=models.Listing)
+def count_saved_listing(sender, instance, **kwargs):
+    deltas = Counter(listing_rollup_keys(instance))
+    if instance._saved_listing is not None:
+        deltas.subtract(listing_rollup_keys(instance._saved_listing))
+    apply_rollup_deltas(deltas)
+
+
+@receiver(post_delete, sender=models.Listing)
+def count_deleted_listing(sender, instance, **kwargs):
+    deltas = Counter()
+    deltas.subtract(listing_rollup_keys(instance))
+    apply_rollup_deltas(deltas)
+
+
+@receiver(post_save, sender=models.AcceptedNFT)
+@receiver(post_delete, sender=models.AcceptedNFT)
+def refresh_collection_search_documents(sender, instance, **kwargs):
+    refresh_search_documents(instance.contract_address)
+    invalidate_listing_pages(instance.contract_address)
+
+
+@receiver(post_save, sender=models.Listing)
+@receiver(post_delete, sender=models.Listing)
+def invalidate_collection_listing_pages(sender, instance, **kwargs):
+    invalidate_listing_pages(instance.nft_contract_address)
+    saved = getattr(instance, "_saved_listing", None)
+    # a listing moved to another collection leaves the pages of the old one
+    if saved is not None and models.normalize_address(
+        saved.nft_contract_address
+    ) != models.normalize_address(instance.nft_contract_address):
+        invalidate_listing_pages(saved.nft_contract_address)
+
+
+@receiver(post_save, sender=models.Listing)
+def publish_saved_listing(sender, instance, created, **kwargs):
+    publish_on_commit(listing_event(instance, "created" if created else "updated"))
+
+
+@receiver(post_delete, sender=models.Listing)
+def publish_deleted_listing(sender, instance, **kwargs):
+    publish_on_commit(listing_event(instance, "deleted"))
+
+
+@receiver(post_save, sender=models.Offer)
+def publish_saved_offer(sender, instance, created, **kwargs):
+    publish_on_commit(offer_event(instance, "created" if created else "updated"))
+
+
+@receiver(post_delete, sender=models.Offer)
+def publish_deleted_offer(sender, instance, origin=None, **kwargs):
+    # the offers deleted with their listing do not load it one by one
+    listing = instance._state.fields_cache.get("listing")
+    if listing is None and isinstance(origin, models.Listing):
+        listing = origin if origin.pk == instance.listing_id else None
+    if listing is not None:
+        collection = listing.nft_contract_address
+    else:
+        collection = (
+            models.Listing.objects.filter(pk=instance.listing_id)
+            .values_list("nft_contract_address", flat=True)
+            .first()
+        )
+    if collection is not None:
+        publish_on_commit(offer_event(instance, "deleted", collection))
+
+
+def invalidate_listing_pages(nft_contract_address: str):
+    # bump now so the transaction reads its own writes, and again after
+    # the commit to drop the pages that other requests cached meanwhile
+    bump_generations(nft_contract_address)
+    transaction.on_commit(partial(bump_generations, nft_contract_address))
+
+
+@receiver(post_save, sender=models.AcceptedNFT)
+@receiver(post_delete, sender=models.AcceptedNFT)
+@receiver(post_save, sender=models.AcceptedToken)
+@receiver(post_delete, sender=models.AcceptedToken)
+def invalidate_accepted_assets(sender, instance, **kwargs):
+    # like the listing pages, reload now and after the commit
+    accepted_assets.invalidate()
+    transaction.on_commit(accepted_assets.invalidate)
+
+
+@receiver(pre_save, sender=models.AcceptedToken)
+def remember_saved_token(sender, instance, **kwargs):
+    instance._saved_token = None
+    if not instance._state.adding:
+        instance._saved_token = models.AcceptedToken.objects.filter(
+            pk=instance.pk
+        ).first()
+
+
+def token_rollup_key(token: models.AcceptedToken) -> tuple[str, int]:
+    # the fields of a token that the borrow amount buckets depend on
+    return models.normalize_address(token.contract_address), token.token_decimal
+
+
+@receiver(post_save, sender=models.AcceptedToken)
+def recount_listings_by_saved_token(sender, instance, **kwargs):
+    # the borrow amount buckets depend on the accepted tokens and their decimals,
+    # recount once the token is committed, and only when they changed
+    saved = instance._saved_token
+    if saved is None or token_rollup_key(saved) != token_rollup_key(instance):
+        transaction.on_commit(rebuild_rollups)
+
+
+@receiver(post_delete, sender=models.AcceptedToken)
+def recount_listings_by_deleted_token(sender, instance, **kwargs):
+    transaction.on_commit(rebuild_rollups)
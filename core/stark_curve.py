@@ -0,0 +1,278 @@
+# stark curve signature verification with precomputed multiplication tables
+import random
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from crypto_cpp_py.cpp_bindings import cpp_verify
+from starknet_py.constants import EC_ORDER, FIELD_PRIME
+
+# the stark curve y^2 = x^3 + ALPHA * x + BETA over the field of FIELD_PRIME
+ALPHA = 1
+BETA = 0x6F21413EFBE40DE150E596D72F7A8C5609AD26C15C915C1F4CDFCB99CEE9E89
+GENERATOR = (
+    0x1EF15C18599971B7BECED415A40F0C7DEACFD9B0D1819E03D723D8BC943CFCA,
+    0x5668060AA49730B7BE4801DF46EC62DE53ECD11ABE43A32873000C36E8DC1F,
+)
+# the message hash, r and w values of a signature must be smaller than this
+SIGNATURE_UPPER_BOUND = 2**251
+SCALAR_BITS = EC_ORDER.bit_length()
+
+P = FIELD_PRIME
+
+# points are affine (x, y) tuples or jacobian (X, Y, Z) tuples,
+# the point at infinity is None
+
+
+def _double(point: Optional[tuple]) -> Optional[tuple]:
+    if point is None:
+        return None
+    x, y, z = point
+    if y == 0:
+        return None
+    yy = y * y % P
+    s = 4 * x * yy % P
+    zz = z * z % P
+    m = (3 * x * x + ALPHA * zz * zz) % P
+    x3 = (m * m - 2 * s) % P
+    y3 = (m * (s - x3) - 8 * yy * yy) % P
+    z3 = 2 * y * z % P
+    return x3, y3, z3
+
+
+def _add_affine(point: Optional[tuple], affine: tuple) -> Optional[tuple]:
+    """
+    Add an affine point to a jacobian point
+    """
+    if point is None:
+        return affine[0], affine[1], 1
+    x1, y1, z1 = point
+    z1z1 = z1 * z1 % P
+    h = (affine[0] * z1z1 - x1) % P
+    r = (affine[1] * z1 * z1z1 - y1) % P
+    if h == 0:
+        return _double(point) if r == 0 else None
+    hh = h * h % P
+    hhh = h * hh % P
+    v = x1 * hh % P
+    x3 = (r * r - hhh - 2 * v) % P
+    y3 = (r * (v - x3) - y1 * hhh) % P
+    return x3, y3, z1 * h % P
+
+
+def _add(point: Optional[tuple], other: Optional[tuple]) -> Optional[tuple]:
+    """
+    Add two jacobian points
+    """
+    if point is None:
+        return other
+    if other is None:
+        return point
+    x1, y1, z1 = point
+    x2, y2, z2 = other
+    z1z1 = z1 * z1 % P
+    z2z2 = z2 * z2 % P
+    u1 = x1 * z2z2 % P
+    s1 = y1 * z2 * z2z2 % P
+    h = (x2 * z1z1 - u1) % P
+    r = (y2 * z1 * z1z1 - s1) % P
+    if h == 0:
+        return _double(point) if r == 0 else None
+    hh = h * h % P
+    hhh = h * hh % P
+    v = u1 * hh % P
+    x3 = (r * r - hhh - 2 * v) % P
+    y3 = (r * (v - x3) - s1 * hhh) % P
+    return x3, y3, z1 * z2 * h % P
+
+
+def _to_affine(points: list[tuple]) -> list[tuple]:
+    """
+    Normalize jacobian points with a single field inversion
+    """
+    prefix = [1]
+    for _, _, z in points:
+        prefix.append(prefix[-1] * z % P)
+    inverse = pow(prefix[-1], -1, P)
+    affine = [None] * len(points)
+    for index in range(len(points) - 1, -1, -1):
+        x, y, z = points[index]
+        z_inverse = inverse * prefix[index] % P
+        inverse = inverse * z % P
+        zz = z_inverse * z_inverse % P
+        affine[index] = (x * zz % P, y * zz * z_inverse % P)
+    return affine
+
+
+def _sqrt(value: int) -> Optional[int]:
+    """
+    The square root of a field element (Cipolla's algorithm),
+    None when the value is not a square.
+    """
+    value %= P
+    if value == 0:
+        return 0
+    if pow(value, (P - 1) // 2, P) != 1:
+        return None
+    while True:
+        a = random.randrange(1, P)
+        omega = (a * a - value) % P
+        if pow(omega, (P - 1) // 2, P) == P - 1:
+            break
+    # compute (a + sqrt(omega)) ** ((P + 1) / 2) in the quadratic extension
+    result = (1, 0)
+    base = (a, 1)
+    exponent = (P + 1) // 2
+    while exponent:
+        if exponent & 1:
+            result = (
+                (result[0] * base[0] + result[1] * base[1] * omega) % P,
+                (result[0] * base[1] + result[1] * base[0]) % P,
+            )
+        base = (
+            (base[0] * base[0] + base[1] * base[1] * omega) % P,
+            2 * base[0] * base[1] % P,
+        )
+        exponent >>= 1
+    return result[0]
+
+
+class FixedBaseTable:
+    """
+    ### Description
+    Multiplication table of a fixed point.
+    The scalar is split in windows of `window` bits and the table holds
+    every multiple `digit * 2 ** (window * index) * point` as an affine
+    point, so a scalar multiplication is at most one addition per window
+    and no doublings.
+    """
+
+    def __init__(self, point: tuple, window: int):
+        self.window = window
+        self.mask = (1 << window) - 1
+        windows = -(-SCALAR_BITS // window)
+        self.rows = []
+        base = (point[0], point[1], 1)
+        for _ in range(windows):
+            multiples = [base]
+            for _ in range(self.mask - 1):
+                multiples.append(_add(multiples[-1], base))
+            row = _to_affine(multiples)
+            self.rows.append(row)
+            # the base of the next window is 2 ** window times this one
+            base = _add_affine((row[-1][0], row[-1][1], 1), row[0])
+
+    def multiply(self, scalar: int) -> Optional[tuple]:
+        """
+        Multiply the point by a scalar smaller than the curve order
+        """
+        result = None
+        for row in self.rows:
+            digit = scalar & self.mask
+            if digit:
+                result = _add_affine(result, row[digit - 1])
+            scalar >>= self.window
+        return result
+
+
+class StarkSignatureVerifier:
+    """
+    ### Description
+    Verifies stark curve ECDSA signatures like starknet_py's
+    `verify_message_signature`, with precomputed multiplication tables.
+
+    The generator table is built once when the verifier is created.
+    A public key gets its own table once it has signed `key_min_uses`
+    messages, and the tables of the `key_cache_size` most recent signers
+    are kept, so frequent signers like market makers are verified with
+    table lookups only. Other signers are verified by crypto-cpp.
+    """
+
+    def __init__(
+        self,
+        window: int = 8,
+        key_window: int = 4,
+        key_cache_size: int = 128,
+        key_min_uses: int = 2,
+    ):
+        self.key_window = key_window
+        self.key_cache_size = key_cache_size
+        self.key_min_uses = key_min_uses
+        self.generator_table = FixedBaseTable(GENERATOR, window)
+        # public key -> its table, or None when the key is not on the curve
+        self._key_tables = OrderedDict()
+        # public key -> the number of signatures verified without a table
+        self._key_uses = OrderedDict()
+        self._lock = threading.Lock()
+
+    def verify(self, message_hash: int, signature: list[int], public_key: int) -> bool:
+        """
+        Verify the signature of the message hash with the public key
+        Args:
+            message_hash(int): the hash of the signed message
+            signature(list[int]): the r and s values of the signature
+            public_key(int): the x coordinate of the public key point
+        Returns:
+            bool: whether the signature is valid or not
+        """
+        r, s = signature
+        # s has no inverse, and the reference verifier raises on it
+        if s % EC_ORDER == 0:
+            return False
+        w = pow(s, -1, EC_ORDER)
+        if not (
+            0 < message_hash < SIGNATURE_UPPER_BOUND
+            and 0 < r < SIGNATURE_UPPER_BOUND
+            and 0 < w < SIGNATURE_UPPER_BOUND
+        ):
+            return False
+
+        found, key_table = self._get_key_table(public_key)
+        if not found:
+            return cpp_verify(msg_hash=message_hash, r=r, w=w, stark_key=public_key)
+        if key_table is None:
+            return False
+
+        # w * (z * G + r * Q) == (z * w) * G + (r * w) * Q
+        generator_part = self.generator_table.multiply(message_hash * w % EC_ORDER)
+        key_part = key_table.multiply(r * w % EC_ORDER)
+        if key_part is None:
+            return False
+        negated_key_part = (key_part[0], P - key_part[1], key_part[2])
+        # the public key is only an x coordinate, so try both of its points
+        for point in (
+            _add(generator_part, key_part),
+            _add(generator_part, negated_key_part),
+        ):
+            if point is not None and point[0] == r * point[2] * point[2] % P:
+                return True
+        return False
+
+    def _get_key_table(self, public_key: int) -> tuple[bool, Optional[FixedBaseTable]]:
+        """
+        The table of the public key, building it for frequent signers.
+        Returns whether the key has a table and the table itself,
+        which is None for keys that are not on the curve.
+        """
+        with self._lock:
+            if public_key in self._key_tables:
+                self._key_tables.move_to_end(public_key)
+                return True, self._key_tables[public_key]
+            if not 0 <= public_key < P:
+                return False, None
+            uses = self._key_uses.pop(public_key, 0) + 1
+            if uses < self.key_min_uses:
+                self._key_uses[public_key] = uses
+                if len(self._key_uses) > self.key_cache_size:
+                    self._key_uses.popitem(last=False)
+                return False, None
+
+        y = _sqrt(public_key**3 + ALPHA * public_key + BETA)
+        key_table = (
+            None if y is None else FixedBaseTable((public_key, y), self.key_window)
+        )
+        with self._lock:
+            self._key_tables[public_key] = key_table
+            if len(self._key_tables) > self.key_cache_size:
+                self._key_tables.popitem(last=False)
+        return True, key_table
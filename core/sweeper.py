@@ -0,0 +1,117 @@
+# removal of the expired offers
+import functools
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .feed import OFFER_FIELDS, offer_row_event, publish_on_commit
+from .periodic import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+# deletes a batch of expired offers, through the expiry index. The offers
+# locked by another transaction are skipped, so the sweepers of several
+# processes do not wait for each other. The deleted offers are returned with
+# the collection of their listing, for the feed.
+DELETE_EXPIRED_OFFERS_SQL = f"""
+WITH deleted AS (
+    DELETE FROM core_offer WHERE id IN (
+        SELECT id FROM core_offer
+        WHERE signature_expiry <= %s
+        ORDER BY signature_expiry
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING {", ".join(OFFER_FIELDS)}
+)
+SELECT deleted.*, listing.nft_contract_address
+FROM deleted JOIN core_listing AS listing ON listing.id = deleted.listing_id
+"""
+
+
+class ExpiredOfferSweeper(PeriodicTask):
+    """
+    ### Description
+    Deletes the offers whose signature expired, in batches of `batch_size`
+    offers. Every batch is a transaction of its own, so the locks are held
+    for a single batch, and a run stops after `max_batches` batches.
+
+    The sweeper keeps the counters of its runs, and `start` runs it every
+    `interval` seconds in a daemon thread of the current process.
+    """
+
+    name = "offer-sweeper"
+
+    def __init__(self, batch_size: int, max_batches: int, interval: float):
+        super().__init__(interval)
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.runs = 0
+        self.deleted = 0
+        self.last_run = None
+
+    def sweep(self, now: int | None = None) -> dict:
+        """
+        Delete the offers that expired at `now`, the current time by default.
+        Returns:
+            dict: the number of deleted offers, of batches and the duration
+        """
+        now = int(time.time()) if now is None else now
+        started_at = time.monotonic()
+        deleted = batches = 0
+        while batches < self.max_batches:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(DELETE_EXPIRED_OFFERS_SQL, [now, self.batch_size])
+                offers = cursor.fetchall()
+                publish_on_commit(*(offer_row_event(row, "deleted") for row in offers))
+            count = len(offers)
+            batches += 1
+            deleted += count
+            if count < self.batch_size:
+                break
+
+        run = {
+            "deleted": deleted,
+            "batches": batches,
+            "seconds": time.monotonic() - started_at,
+            "finished_at": time.time(),
+        }
+        with self._lock:
+            self.runs += 1
+            self.deleted += deleted
+            self.last_run = run
+        logger.info(
+            "Deleted %s expired offers in %s batches in %.3fs",
+            deleted,
+            batches,
+            run["seconds"],
+        )
+        return run
+
+    def stats(self) -> dict:
+        """
+        The counters of the runs of the sweeper
+        """
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "deleted": self.deleted,
+                "last_run": self.last_run,
+            }
+
+    def run(self):
+        self.sweep()
+
+
+@functools.cache
+def get_offer_sweeper() -> ExpiredOfferSweeper:
+    """
+    The expired offer sweeper configured in the settings
+    """
+    return ExpiredOfferSweeper(
+        settings.OFFER_SWEEP_BATCH_SIZE,
+        settings.OFFER_SWEEP_MAX_BATCHES,
+        settings.OFFER_SWEEP_INTERVAL,
+    )
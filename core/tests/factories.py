@@ -1,8 +1,10 @@
 import random
+from datetime import timezone
 
 import factory
 
 from core import models
+from core.service import CoreService
 
 
 class AcceptedNFTFactory(factory.django.DjangoModelFactory):
@@ -46,8 +48,67 @@ class ListingFactory(factory.django.DjangoModelFactory):
     nft_contract_address = factory.LazyFunction(
         lambda: "0x" + "".join(random.choices("0123456789abcdef", k=60))
     )
-    nft_token_id = factory.Sequence(lambda n: n)
+    nft_token_id = factory.Sequence(lambda n: n + 1)
     borrow_amount = factory.Faker("pyint", min_value=100, max_value=10000)
     repayment_amount = factory.Faker("pyint", min_value=110, max_value=11000)
     duration = factory.Faker("pyint", min_value=1, max_value=365)
     status = models.ListingStatus.OPEN
+
+
+class OfferFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = models.Offer
+
+    user = factory.SubFactory(UserFactory)
+    token_contract_address = factory.LazyFunction(
+        lambda: "0x" + "".join(random.choices("0123456789abcdef", k=60))
+    )
+    borrow_amount = factory.Faker("pyint", min_value=100, max_value=10000)
+    repayment_amount = factory.Faker("pyint", min_value=110, max_value=11000)
+    duration = factory.Faker("pyint", min_value=86400, max_value=86400 * 30)
+    signature = "[]"
+    signature_expiry = 2**31 - 1
+    signature_chain_id = 1
+    signature_unique_id = factory.Sequence(lambda n: n + 1)
+    effective_apr = factory.LazyAttribute(
+        lambda offer: CoreService.effective_apr(
+            offer.borrow_amount, offer.repayment_amount, offer.duration
+        )
+    )
+
+
+class LoanFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = models.Loan
+
+    borrower = factory.LazyFunction(
+        lambda: "0x" + "".join(random.choices("0123456789abcdef", k=60))
+    )
+    lender = factory.LazyFunction(
+        lambda: "0x" + "".join(random.choices("0123456789abcdef", k=60))
+    )
+    loan_id = factory.Sequence(lambda n: n + 1)
+    nft_contract_address = factory.LazyFunction(
+        lambda: "0x" + "".join(random.choices("0123456789abcdef", k=60))
+    )
+    nft_token_id = factory.Sequence(lambda n: n + 1)
+    token_contract_address = factory.LazyFunction(
+        lambda: "0x" + "".join(random.choices("0123456789abcdef", k=60))
+    )
+    borrow_amount = factory.Faker("pyint", min_value=100, max_value=10000)
+    repayment_amount = factory.Faker("pyint", min_value=110, max_value=11000)
+    duration = factory.Faker("pyint", min_value=86400, max_value=86400 * 30)
+    start_time = factory.Faker("date_time", tzinfo=timezone.utc)
+    status = models.LoanStatus.PENDING
+
+
+class RenegotiationOfferFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = models.RenegotiationOffer
+
+    user = factory.SubFactory(UserFactory)
+    loan = factory.SubFactory(LoanFactory)
+    repayment_amount = factory.Faker("pyint", min_value=110, max_value=11000)
+    duration = factory.Faker("pyint", min_value=86400, max_value=86400 * 30)
+    incentive = 0
+    status = models.LoanRenegotiationStatus.PENDING
@@ -0,0 +1,133 @@
+import json
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core.indexer import LOAN_FORECLOSED, LOAN_REPAID, LOAN_STARTED
+
+
+def _u256(value: int) -> list[int]:
+    return [value & (2**128 - 1), value >> 128]
+
+
+class FakeStarknetRPC:
+    """
+    A local Starknet JSON-RPC server, serving the events added to it.
+    The events are paged like a node pages them, with continuation tokens.
+    """
+
+    def __init__(self, contract_address: str):
+        self.contract_address = contract_address
+        self.head = 0
+        self.events = []
+        self.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}/rpc"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_event(self, block_number: int, selector: int, loan_id: int, data: list):
+        self.events.append(
+            {
+                "from_address": self.contract_address,
+                "keys": [hex(selector), hex(loan_id)],
+                "data": [hex(value) for value in data],
+                "block_number": block_number,
+                "transaction_hash": hex(len(self.events) + 1),
+            }
+        )
+        self.head = max(self.head, block_number)
+
+    def loan_started(
+        self,
+        block_number: int,
+        loan_id: int,
+        borrower: str = "0xb0",
+        lender: str = "0x1e",
+        nft_contract_address: str = "0xc011",
+        nft_token_id: int = 1,
+        token_contract_address: str = "0x70c",
+        borrow_amount: int = 100,
+        repayment_amount: int = 110,
+        duration: int = 86400,
+        start_time: datetime = datetime(2024, 1, 1, tzinfo=timezone.utc),
+    ):
+        self.add_event(
+            block_number,
+            LOAN_STARTED,
+            loan_id,
+            [
+                int(borrower, 16),
+                int(lender, 16),
+                int(nft_contract_address, 16),
+                *_u256(nft_token_id),
+                int(token_contract_address, 16),
+                *_u256(borrow_amount),
+                *_u256(repayment_amount),
+                duration,
+                int(start_time.timestamp()),
+            ],
+        )
+
+    def loan_repaid(self, block_number: int, loan_id: int, closed_at: datetime):
+        self.add_event(block_number, LOAN_REPAID, loan_id, [int(closed_at.timestamp())])
+
+    def loan_foreclosed(self, block_number: int, loan_id: int, closed_at: datetime):
+        self.add_event(
+            block_number, LOAN_FORECLOSED, loan_id, [int(closed_at.timestamp())]
+        )
+
+    def get_events(self, event_filter: dict) -> dict:
+        keys = {int(key, 16) for key in event_filter["keys"][0]}
+        events = [
+            event
+            for event in self.events
+            if int(event["from_address"], 16) == int(event_filter["address"], 16)
+            and event_filter["from_block"]["block_number"]
+            <= event["block_number"]
+            <= event_filter["to_block"]["block_number"]
+            and int(event["keys"][0], 16) in keys
+        ]
+        events.sort(key=lambda event: event["block_number"])
+        offset = int(event_filter.get("continuation_token", 0))
+        end = offset + event_filter["chunk_size"]
+        page = {"events": events[offset:end]}
+        if end < len(events):
+            page["continuation_token"] = str(end)
+        return page
+
+    def _handler(self):
+        rpc = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(
+                    self.rfile.read(int(self.headers["Content-Length"]))
+                )
+                rpc.requests.append(request)
+                if request["method"] == "starknet_blockNumber":
+                    response = {"result": rpc.head}
+                elif request["method"] == "starknet_getEvents":
+                    response = {"result": rpc.get_events(request["params"]["filter"])}
+                else:
+                    response = {
+                        "error": {"code": -32601, "message": "Method not found"}
+                    }
+                body = json.dumps({"jsonrpc": "2.0", "id": request["id"], **response})
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body.encode())
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -1,6 +1,9 @@
 from django.urls import reverse
 from rest_framework.test import APITestCase
 
+from core.models import ListingRollup
+from core.rollups import rebuild_rollups
+
 from . import factories
 
 
@@ -19,6 +22,51 @@ class TestAcceptedNFTListAPIView(APITestCase):
         data = response.json()
         self.assertEqual(len(data), 3)
 
+    def test_accepted_nft_listings_count(self):
+        """
+        Test that the listing counts follow the listings without
+        counting them per collection
+        """
+        collections = [factories.AcceptedNFTFactory() for _ in range(3)]
+        user = factories.UserFactory()
+        listings = [
+            factories.ListingFactory(
+                user=user, nft_contract_address=collection.contract_address.upper()
+            )
+            for collection in collections
+            for _ in range(2)
+        ]
+        listings[0].delete()
+        listings[2].nft_contract_address = collections[0].contract_address
+        listings[2].save()
+
+        # load the accepted assets in the registry
+        self.client.get(self.url)
+        # the request savepoint and a single select of the listing counts
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        counts = {
+            nft["contract_address"]: nft["listings_count"] for nft in response.json()
+        }
+        self.assertEqual(
+            counts,
+            {
+                collections[0].contract_address: 2,
+                collections[1].contract_address: 1,
+                collections[2].contract_address: 2,
+            },
+        )
+
+        rollups = set(
+            ListingRollup.objects.values_list("facet", "value", "listings_count")
+        )
+        rebuild_rollups()
+        self.assertEqual(
+            set(ListingRollup.objects.values_list("facet", "value", "listings_count")),
+            # the rebuild drops the values without listings
+            {rollup for rollup in rollups if rollup[2]},
+        )
+
     def _generate_data(self):
         factories.AcceptedNFTFactory()
         factories.AcceptedNFTFactory()
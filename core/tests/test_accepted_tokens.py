@@ -1,6 +1,10 @@
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase
 
+from core.models import AcceptedToken
+from core.registry import AcceptedAssetRegistry
+
 from . import factories
 
 
@@ -25,6 +29,33 @@ class TestAcceptedTokenListAPIView(APITestCase):
         data = response.json()
         self.assertEqual(len(data), 3)
 
+    def test_accepted_token_listings_count(self):
+        """
+        Test that the listing counts are returned in a constant number of queries
+        """
+        tokens = [factories.AcceptedTokenFactory() for _ in range(3)]
+        user = factories.UserFactory()
+        for count, token in enumerate(tokens):
+            for _ in range(count):
+                factories.ListingFactory(
+                    user=user, token_contract_address=token.contract_address
+                )
+        factories.ListingFactory(user=user, token_contract_address=None)
+
+        # load the accepted assets in the registry
+        self.client.get(self.url)
+        # the request savepoint and a single select of the listing counts
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        counts = {
+            token["contract_address"]: token["listings_count"]
+            for token in response.json()
+        }
+        self.assertEqual(
+            counts,
+            {token.contract_address: count for count, token in enumerate(tokens)},
+        )
+
     def _generate_data(self):
         """
         Generate mock data in the db using the factory
@@ -32,3 +63,54 @@ class TestAcceptedTokenListAPIView(APITestCase):
         factories.AcceptedTokenFactory()
         factories.AcceptedTokenFactory()
         factories.AcceptedTokenFactory()
+
+
+class TestAcceptedAssetRegistry(APITestCase):
+    def test_lookups_by_normalized_address(self):
+        """
+        Test that the registry finds the assets without querying the database
+        """
+        registry = AcceptedAssetRegistry()
+        token = factories.AcceptedTokenFactory(
+            contract_address="0x0ABC", token_decimal=6
+        )
+        nft = factories.AcceptedNFTFactory(contract_address="0xdef")
+        registry.tokens()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(registry.get_token("0x000abc").token_decimal, 6)
+            self.assertEqual(registry.get_token("0xABC").id, token.id)
+            self.assertEqual(registry.get_nft("0xDEF").id, nft.id)
+            self.assertIsNone(registry.get_token("0xdef"))
+            self.assertIsNone(registry.get_nft("0xabc"))
+
+    def test_registry_reloads_on_change(self):
+        """
+        Test that saving or deleting an asset reloads the registry
+        """
+        registry = AcceptedAssetRegistry()
+        token = factories.AcceptedTokenFactory(name="Ether")
+        self.assertEqual([token.name for token in registry.tokens()], ["Ether"])
+
+        token.name = "Stark"
+        token.save()
+        factories.AcceptedTokenFactory(name="Dai")
+        self.assertEqual([token.name for token in registry.tokens()], ["Dai", "Stark"])
+
+        token.delete()
+        self.assertEqual([token.name for token in registry.tokens()], ["Dai"])
+
+    def test_registry_expires_with_a_local_cache(self):
+        """
+        Test that the changes of another process are seen once the registry
+        expires, when the version stamp is in a local cache
+        """
+        registry = AcceptedAssetRegistry()
+        token = factories.AcceptedTokenFactory(name="Ether")
+        registry.tokens()
+        # a change of another process, which bumps its own stamp
+        AcceptedToken.objects.filter(id=token.id).update(name="Stark")
+        self.assertEqual([token.name for token in registry.tokens()], ["Ether"])
+
+        with override_settings(ACCEPTED_ASSETS_LOCAL_TTL=0):
+            self.assertEqual([token.name for token in registry.tokens()], ["Stark"])
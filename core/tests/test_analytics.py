@@ -0,0 +1,163 @@
+from datetime import datetime, timezone
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.analytics import reference_yield_analytics, yield_analytics
+from core.models import ListingStatus, LoanStatus
+from core.registry import accepted_assets
+from core.service import SECONDS_PER_YEAR
+from core.tests import factories
+
+DAY = 86400
+NOW = 1_700_000_000
+
+
+def assert_close(actual, expected):
+    """
+    Compare nested analytics, with the floats compared approximately
+    """
+    if isinstance(expected, dict):
+        assert actual.keys() == expected.keys()
+        for key in expected:
+            assert_close(actual[key], expected[key])
+    elif isinstance(expected, list):
+        assert len(actual) == len(expected)
+        for actual_item, expected_item in zip(actual, expected):
+            assert_close(actual_item, expected_item)
+    elif isinstance(expected, float):
+        assert actual == pytest.approx(expected)
+    else:
+        assert actual == expected
+
+
+@pytest.mark.django_db
+def test_offer_yield_analytics():
+    factories.AcceptedTokenFactory(contract_address="0x70c", token_decimal=6)
+    listing = factories.ListingFactory(
+        user=factories.UserFactory(), nft_contract_address="0xc011"
+    )
+
+    def offer(principal, apr, signature_expiry=NOW + 10 * DAY):
+        # a year long offer, so the APR is the interest over the principal
+        return factories.OfferFactory(
+            listing=listing,
+            token_contract_address="0x70c",
+            borrow_amount=principal * 10**6,
+            repayment_amount=principal * 10**6 * (100 + apr) // 100,
+            duration=SECONDS_PER_YEAR,
+            signature_expiry=signature_expiry,
+        )
+
+    offer(1, 4)
+    offer(10, 8)
+    offer(100, 12)
+    offer(1000, 30)
+    offer(10000, 60)
+    # the expired offers and the offers on closed listings are left out
+    offer(1, 4, signature_expiry=NOW)
+    closed = factories.ListingFactory(
+        user=factories.UserFactory(), status=ListingStatus.CLOSED
+    )
+    factories.OfferFactory(listing=closed)
+
+    offers = yield_analytics(NOW)["offers"]
+    assert offers["count"] == 5
+    [collection] = offers["collections"]
+    assert collection["value"] == "0xc011"
+    assert collection["count"] == 5
+    assert collection["apr"]["percentiles"] == pytest.approx(
+        {"p10": 5.6, "p25": 8, "p50": 12, "p75": 30, "p90": 48}
+    )
+    assert [bucket["count"] for bucket in collection["apr"]["histogram"]] == [
+        1,
+        1,
+        1,
+        1,
+        1,
+        0,
+    ]
+    assert collection["principal"]["percentiles"]["p50"] == pytest.approx(100)
+    assert collection["principal"]["histogram"][0] == {"bucket": "0-1", "count": 0}
+    assert collection["time_to_expiry"]["percentiles"]["p50"] == pytest.approx(10)
+    assert collection["time_to_expiry"]["histogram"][2] == {
+        "bucket": "7-30",
+        "count": 5,
+    }
+    assert offers["tokens"][0]["value"] == "0x70c"
+
+
+@pytest.mark.django_db
+def test_loan_yield_analytics():
+    start_time = datetime.fromtimestamp(NOW - DAY, timezone.utc)
+    factories.LoanFactory(
+        nft_contract_address="0xc011",
+        token_contract_address="0x1",
+        borrow_amount=100,
+        repayment_amount=110,
+        duration=SECONDS_PER_YEAR,
+        start_time=start_time,
+    )
+    factories.LoanFactory(status=LoanStatus.REPAID)
+
+    loans = yield_analytics(NOW)["loans"]
+    assert loans["count"] == 1
+    [token] = loans["tokens"]
+    assert token["apr"]["percentiles"]["p90"] == pytest.approx(10)
+    assert token["time_to_expiry"]["percentiles"]["p10"] == pytest.approx(364)
+    # the decimals of a token that is not accepted are not known
+    assert token["principal"]["percentiles"] is None
+    assert sum(bucket["count"] for bucket in token["principal"]["histogram"]) == 0
+
+
+@pytest.mark.django_db
+def test_yield_analytics_matches_the_loop():
+    tokens = factories.AcceptedTokenFactory.create_batch(2)
+    listings = factories.ListingFactory.create_batch(3, user=factories.UserFactory())
+    for index in range(60):
+        factories.OfferFactory(
+            listing=listings[index % 3],
+            token_contract_address=tokens[index % 2].contract_address,
+            signature_expiry=NOW + index * DAY,
+        )
+        factories.LoanFactory(
+            nft_contract_address=listings[index % 3].nft_contract_address,
+            token_contract_address=tokens[index % 2].contract_address,
+            start_time=datetime.fromtimestamp(NOW - index * DAY, timezone.utc),
+        )
+    factories.OfferFactory(listing=listings[0], borrow_amount=None)
+
+    assert_close(yield_analytics(NOW), reference_yield_analytics(NOW))
+
+
+@pytest.mark.django_db
+def test_yield_analytics_endpoint():
+    client = APIClient()
+    factories.OfferFactory(
+        listing=factories.ListingFactory(user=factories.UserFactory())
+    )
+    factories.LoanFactory()
+    accepted_assets.tokens()
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(reverse("yield-analytics"))
+    assert response.status_code == 200
+    assert len([query for query in queries if "SELECT" in query["sql"]]) == 2
+    assert response.json()["offers"]["count"] == 1
+    assert response.json()["loans"]["count"] == 1
+
+
+@pytest.mark.django_db
+def test_benchmark_yield_analytics_command():
+    factories.OfferFactory(
+        listing=factories.ListingFactory(user=factories.UserFactory())
+    )
+    output = StringIO()
+    call_command("benchmark_yield_analytics", "--repeat", "1", stdout=output)
+    assert "vectorized:" in output.getvalue()
+    assert "speedup:" in output.getvalue()
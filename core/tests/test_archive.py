@@ -0,0 +1,166 @@
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from core.archive import LoanArchiver, find_loan, get_loan_archiver
+from core.ingest import LoanIngester
+from core.loan_rollups import rebuild_loan_rollups
+from core.models import ArchivedLoan, Loan, LoanStatus, RenegotiationOffer
+from core.portfolio import compute_portfolio
+
+from . import factories
+from .test_loan_stats import rollup_rows
+
+JANUARY = datetime(2024, 1, 10, tzinfo=timezone.utc)
+FEBRUARY = datetime(2024, 2, 10, tzinfo=timezone.utc)
+
+
+def partitions() -> set[str]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT inhrelid::regclass::text FROM pg_inherits "
+            "WHERE inhparent = 'core_loanhistory'::regclass"
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+class TestLoanArchiver(APITestCase):
+    def setUp(self):
+        now = datetime.now(timezone.utc)
+        self.borrower = "0xb0"
+
+        def loan(start_time, status=LoanStatus.REPAID, **kwargs):
+            return factories.LoanFactory(
+                borrower=self.borrower,
+                start_time=start_time,
+                duration=86400,
+                status=status,
+                **kwargs,
+            )
+
+        # closed when they were due, long ago
+        self.archivable = [
+            loan(JANUARY),
+            loan(FEBRUARY),
+            loan(FEBRUARY, LoanStatus.FORECLOSED),
+        ]
+        self.kept = [
+            loan(JANUARY, LoanStatus.PENDING),
+            # closed yesterday
+            loan(now - timedelta(days=2)),
+            loan(JANUARY),
+        ]
+        RenegotiationOffer.objects.create(
+            user=factories.UserFactory(),
+            loan=self.kept[-1],
+            repayment_amount=1,
+            duration=1,
+            incentive=1,
+        )
+
+    def archiver(self, **kwargs) -> LoanArchiver:
+        options = {
+            "archive_after": timedelta(days=30),
+            "batch_size": 2,
+            "max_batches": 10,
+            "interval": 1,
+            **kwargs,
+        }
+        return LoanArchiver(**options)
+
+    def test_closed_loans_are_archived_in_batches(self):
+        run = self.archiver().archive()
+        self.assertEqual((run["archived"], run["batches"]), (3, 2))
+        # the loan with a renegotiation offer
+        self.assertEqual(run["kept"], 1)
+
+        self.assertEqual(
+            set(Loan.objects.values_list("loan_id", flat=True)),
+            {loan.loan_id for loan in self.kept},
+        )
+        archived = {loan.loan_id: loan for loan in ArchivedLoan.objects.all()}
+        self.assertEqual(archived.keys(), {loan.loan_id for loan in self.archivable})
+        for loan in self.archivable:
+            self.assertEqual(archived[loan.loan_id].id, loan.id)
+            self.assertEqual(archived[loan.loan_id].status, loan.status)
+            self.assertEqual(archived[loan.loan_id].closed_at, loan.closed_at)
+            self.assertEqual(archived[loan.loan_id].borrower, self.borrower)
+        # a partition by month of the start time
+        self.assertEqual(
+            partitions(), {"core_loanhistory_2024_01", "core_loanhistory_2024_02"}
+        )
+
+        self.assertEqual(self.archiver().archive()["archived"], 0)
+
+    def test_loans_are_found_whether_archived_or_not(self):
+        self.archiver().archive()
+        archived, kept = self.archivable[0], self.kept[0]
+        self.assertIsInstance(find_loan(archived.loan_id), ArchivedLoan)
+        self.assertIsInstance(find_loan(kept.loan_id), Loan)
+        self.assertIsNone(find_loan(10**9))
+
+        response = self.client.get(reverse("loan-detail", args=[archived.loan_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["loan_id"], archived.loan_id)
+        self.assertEqual(response.data["status"], LoanStatus.REPAID)
+        self.assertTrue(response.data["archived"])
+        response = self.client.get(reverse("loan-detail", args=[kept.loan_id]))
+        self.assertFalse(response.data["archived"])
+        response = self.client.get(reverse("loan-detail", args=[10**9]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_archived_loans_are_still_counted(self):
+        portfolio = compute_portfolio(self.borrower)
+        rollups = rollup_rows()
+        self.archiver().archive()
+
+        self.assertEqual(compute_portfolio(self.borrower), portfolio)
+        self.assertEqual(rollup_rows(), rollups)
+        rebuild_loan_rollups()
+        self.assertEqual(rollup_rows(), rollups)
+
+    def test_archived_loans_are_not_ingested_again(self):
+        self.archiver().archive()
+        loan = self.archivable[0]
+        progress = LoanIngester().ingest(
+            [
+                {
+                    "borrower": loan.borrower,
+                    "lender": loan.lender,
+                    "loan_id": loan.loan_id,
+                    "nft_contract_address": loan.nft_contract_address,
+                    "nft_token_id": loan.nft_token_id,
+                    "token_contract_address": loan.token_contract_address,
+                    "borrow_amount": loan.borrow_amount,
+                    "repayment_amount": loan.repayment_amount,
+                    "duration": loan.duration,
+                    "start_time": loan.start_time.isoformat(),
+                }
+            ]
+        )
+        self.assertEqual((progress["inserted"], progress["updated"]), (0, 0))
+        self.assertFalse(Loan.objects.filter(loan_id=loan.loan_id).exists())
+
+    def test_archive_loans_command(self):
+        output = StringIO()
+        call_command("archive_loans", "--after-days", "30", stdout=output)
+        self.assertIn("Archived 3 closed loans", output.getvalue())
+        self.assertIn("kept 1 with renegotiation offers", output.getvalue())
+
+    def test_loan_archiver_stats_are_for_staff(self):
+        get_loan_archiver.cache_clear()
+        self.addCleanup(get_loan_archiver.cache_clear)
+        user = factories.UserFactory()
+        self.client.force_authenticate(user)
+        url = reverse("loan-archiver-stats")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        user.is_staff = True
+        user.save()
+        get_loan_archiver().archive()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["archived"], 3)
@@ -0,0 +1,121 @@
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.export import export_open_listings
+from core.models import Listing, ListingStatus
+from core.tests import factories
+
+
+def _read_lines(response) -> list[dict]:
+    content = b"".join(response.streaming_content).decode()
+    return [json.loads(line) for line in content.splitlines()]
+
+
+@pytest.mark.django_db
+def test_export_open_listings_with_offers():
+    client = APIClient()
+    url = reverse("listing-export")
+
+    user = factories.UserFactory()
+    listings = [factories.ListingFactory(user=user) for _ in range(3)]
+    factories.ListingFactory(user=user, status=ListingStatus.CLOSED)
+    offers = [factories.OfferFactory(listing=listings[1]) for _ in range(2)]
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/x-ndjson"
+    lines = _read_lines(response)
+    assert [line["id"] for line in lines] == [str(listing.id) for listing in listings]
+    assert [offer["id"] for offer in lines[1]["offers"]] == [
+        str(offer.id) for offer in offers
+    ]
+    assert "signature" not in lines[1]["offers"][0]
+    assert lines[0]["offers"] == []
+
+
+@pytest.mark.django_db
+def test_export_resumes_from_watermark():
+    client = APIClient()
+    url = reverse("listing-export")
+
+    user = factories.UserFactory()
+    listings = [factories.ListingFactory(user=user) for _ in range(4)]
+    # listings created at the same time are ordered by id
+    Listing.objects.filter(id__in=[listing.id for listing in listings[1:3]]).update(
+        created_at=listings[1].created_at
+    )
+    expected = [
+        str(listing.id) for listing in Listing.objects.order_by("created_at", "id")
+    ]
+
+    lines = _read_lines(client.get(url))
+    assert [line["id"] for line in lines] == expected
+    for index, line in enumerate(lines):
+        watermark = {"after_created_at": line["created_at"], "after_id": line["id"]}
+        resumed = _read_lines(client.get(url, watermark))
+        assert [line["id"] for line in resumed] == expected[index + 1 :]
+
+    response = client.get(url, {"after_id": expected[0]})
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_export_fetches_offers_per_chunk():
+    user = factories.UserFactory()
+    for _ in range(5):
+        listing = factories.ListingFactory(user=user)
+        factories.OfferFactory(listing=listing)
+
+    with CaptureQueriesContext(connection) as queries:
+        lines = list(export_open_listings(chunk_size=2))
+    assert len(lines) == 5
+    offer_queries = [query for query in queries if "core_offer" in query["sql"]]
+    assert len(offer_queries) == 3
+
+
+@pytest.mark.django_db
+def test_export_is_streamed_by_the_asgi_application(settings):
+    settings.EXPORT_CHUNK_SIZE = 2
+    user = factories.UserFactory()
+    listings = [factories.ListingFactory(user=user) for _ in range(5)]
+
+    async def export():
+        response = await AsyncClient().get(reverse("listing-export"))
+        return response, [chunk async for chunk in response.streaming_content]
+
+    response, chunks = async_to_sync(export)()
+    assert response.status_code == 200
+    # an asynchronous iterator, streamed a chunk of listings at a time
+    assert response.is_async
+    assert len(chunks) == 3
+    lines = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+    assert [line["id"] for line in lines] == [str(listing.id) for listing in listings]
+
+
+@pytest.mark.django_db
+def test_export_listings_command(tmp_path, capsys):
+    user = factories.UserFactory()
+    listings = [factories.ListingFactory(user=user) for _ in range(3)]
+    output = tmp_path / "listings.ndjson"
+
+    call_command("export_listings", output=str(output), chunk_size=2)
+    lines = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [line["id"] for line in lines] == [str(listing.id) for listing in listings]
+    assert f"--after-id {listings[-1].id}" in capsys.readouterr().err
+
+    call_command(
+        "export_listings",
+        output=str(output),
+        after_created_at=lines[0]["created_at"],
+        after_id=lines[0]["id"],
+    )
+    lines = [json.loads(line) for line in output.read_text().splitlines()]
+    assert len(lines) == 5
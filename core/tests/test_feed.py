@@ -0,0 +1,381 @@
+import asyncio
+import json
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from core.feed import (
+    FeedBroker,
+    FeedRouter,
+    LocalFeedBackend,
+    PostgresFeedBackend,
+    get_feed_broker,
+    sse_stream,
+)
+from core.indexer import LoanEventIndexer, StarknetRPCClient
+from core.ingest import ListingIngester
+from core.models import Listing, ListingStatus
+from core.service import CoreService
+from core.sweeper import ExpiredOfferSweeper
+
+from . import factories
+from .rpc import FakeStarknetRPC
+
+
+def event(collection: str, name: str = "listing.created") -> dict:
+    return {"event": name, "collection": collection, "data": {"id": name}}
+
+
+async def next_message(subscription):
+    return await asyncio.wait_for(subscription.get(), 5)
+
+
+class RecordingFeedBackend(LocalFeedBackend):
+    """
+    A backend that keeps the published events
+    """
+
+    def __init__(self, broker):
+        super().__init__(broker)
+        self.events = []
+
+    def publish(self, events: list[dict]):
+        self.events.extend(events)
+        super().publish(events)
+
+
+class TestFeedBroker(SimpleTestCase):
+    def setUp(self):
+        self.broker = FeedBroker(LocalFeedBackend, queue_size=2)
+
+    async def test_events_are_fanned_out_by_collection(self):
+        collection = self.broker.subscribe(["0xC011"])
+        everything = self.broker.subscribe()
+        other = self.broker.subscribe(["0xbeef"])
+
+        self.broker.publish(event("0xc011"))
+        for subscription in (collection, everything):
+            name, payload = await next_message(subscription)
+            self.assertEqual(name, "listing.created")
+            self.assertEqual(json.loads(payload), event("0xc011"))
+        self.assertTrue(other.queue.empty())
+        self.assertEqual(
+            self.broker.stats(),
+            {"subscriptions": 3, "published": 1, "delivered": 2, "dropped": 0},
+        )
+
+        collection.close()
+        other.close()
+        self.assertEqual(self.broker.stats()["subscriptions"], 1)
+
+    async def test_slow_consumers_are_dropped(self):
+        slow = self.broker.subscribe()
+        fast = self.broker.subscribe()
+        for index in range(3):
+            self.broker.publish(event("0xc011", f"listing.{index}"))
+            await next_message(fast)
+
+        # the queue of the slow consumer was full, it only gets the drop
+        self.assertIsNone(await next_message(slow))
+        self.assertTrue(slow.closed)
+        self.assertFalse(fast.closed)
+        self.assertEqual(self.broker.stats()["dropped"], 1)
+        self.assertEqual(self.broker.stats()["subscriptions"], 1)
+
+    async def test_sse_stream(self):
+        subscription = self.broker.subscribe(["0xc011"])
+        stream = sse_stream(subscription, heartbeat=0.01)
+        self.assertEqual(await anext(stream), "retry: 1000\n\n")
+        self.assertEqual(await anext(stream), ": keepalive\n\n")
+
+        self.broker.publish(event("0xc011"))
+        self.assertEqual(
+            await anext(stream),
+            f"event: listing.created\ndata: {json.dumps(event('0xc011'))}\n\n",
+        )
+        for _ in range(3):
+            self.broker.publish(event("0xc011"))
+        await asyncio.sleep(0)
+        self.assertEqual(await anext(stream), "event: overflow\ndata: {}\n\n")
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)
+        self.assertEqual(self.broker.stats()["subscriptions"], 0)
+
+
+@override_settings(FEED_BACKEND="core.tests.test_feed.RecordingFeedBackend")
+class TestFeedEndpoints(SimpleTestCase):
+    def setUp(self):
+        get_feed_broker.cache_clear()
+        self.addCleanup(get_feed_broker.cache_clear)
+
+    async def test_websocket_feed(self):
+        async def django_application(scope, receive, send):
+            await send({"type": "http.response.start", "status": 204})
+
+        communicator = ApplicationCommunicator(
+            FeedRouter(django_application),
+            {
+                "type": "websocket",
+                "path": "/api/feed/ws/",
+                "query_string": b"collections=0xc011,0xbeef",
+            },
+        )
+        await communicator.send_input({"type": "websocket.connect"})
+        self.assertEqual(
+            await communicator.receive_output(), {"type": "websocket.accept"}
+        )
+        get_feed_broker().publish(event("0xabc"))
+        get_feed_broker().publish(event("0xc011"))
+        message = await communicator.receive_output()
+        self.assertEqual(message["type"], "websocket.send")
+        self.assertEqual(json.loads(message["text"]), event("0xc011"))
+
+        await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+        await communicator.wait()
+        self.assertEqual(get_feed_broker().stats()["subscriptions"], 0)
+
+    async def test_other_websockets_are_closed(self):
+        communicator = ApplicationCommunicator(
+            FeedRouter(None), {"type": "websocket", "path": "/ws/"}
+        )
+        await communicator.send_input({"type": "websocket.connect"})
+        self.assertEqual(
+            await communicator.receive_output(), {"type": "websocket.close"}
+        )
+
+    async def test_sse_endpoint(self):
+        response = await self.async_client.get(
+            reverse("feed-events"), {"collections": "0xc011"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 1000\n\n")
+        get_feed_broker().publish(event("0xc011"))
+        self.assertIn(b"event: listing.created\n", await anext(stream))
+        await stream.aclose()
+
+    def test_sse_endpoint_needs_the_asgi_application(self):
+        # the test client goes through the WSGI request handler
+        response = self.client.get(reverse("feed-events"))
+        self.assertEqual(response.status_code, 501)
+        self.assertFalse(response.streaming)
+        self.assertEqual(get_feed_broker().stats()["subscriptions"], 0)
+
+
+@override_settings(FEED_BACKEND="core.tests.test_feed.RecordingFeedBackend")
+class TestFeedHooks(TestCase):
+    def setUp(self):
+        get_feed_broker.cache_clear()
+        self.addCleanup(get_feed_broker.cache_clear)
+        self.events = get_feed_broker().backend.events
+
+    def test_listing_and_offer_commits_are_published(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            listing = factories.ListingFactory(
+                user=factories.UserFactory(), nft_contract_address="0xC011"
+            )
+            offer = factories.OfferFactory(listing=listing)
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.status = ListingStatus.CLOSED
+            listing.save()
+
+        self.assertEqual(
+            [(event["event"], event["collection"]) for event in self.events],
+            [
+                ("listing.created", "0xc011"),
+                ("offer.created", "0xc011"),
+                ("listing.updated", "0xc011"),
+            ],
+        )
+        self.assertEqual(self.events[1]["data"]["id"], str(offer.id))
+        self.assertEqual(self.events[1]["data"]["listing_id"], str(listing.id))
+        self.assertEqual(self.events[2]["data"]["status"], ListingStatus.CLOSED)
+
+    def test_bulk_created_offers_are_published(self):
+        user = factories.UserFactory()
+        listing = factories.ListingFactory(user=user)
+        data = {
+            "token_contract": "0x70c",
+            "principal": 100,
+            "repayment_amount": 110,
+            "loan_duration": 86400,
+            "signatures": [],
+            "expiry": 2**31 - 1,
+            "chain_id": 1,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            CoreService.create_offers(
+                user,
+                [
+                    (listing, {**data, "unique_id": 1}),
+                    (listing, {**data, "unique_id": 2}),
+                ],
+            )
+        self.assertEqual(
+            [event["event"] for event in self.events], ["offer.created"] * 2
+        )
+
+    def test_bulk_writes_are_published(self):
+        user = factories.UserFactory()
+        indexed = factories.ListingFactory(
+            user=user, nft_contract_address="0xc011", nft_token_id=1
+        )
+        ingested = factories.ListingFactory(
+            user=user, nft_contract_address="0xc011", nft_token_id=2
+        )
+        offer = factories.OfferFactory(listing=ingested, signature_expiry=1)
+        del self.events[:]
+        rpc = FakeStarknetRPC("0xc0de")
+        self.addCleanup(rpc.server.server_close)
+        rpc.loan_started(1, 1, nft_contract_address="0xc011", nft_token_id=1)
+        indexer = LoanEventIndexer(
+            StarknetRPCClient(rpc.url),
+            "0xc0de",
+            start_block=1,
+            batch_size=1,
+            max_in_flight=1,
+            chunk_size=10,
+            confirmations=0,
+            interval=1,
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            # a listing closed by a started loan
+            indexer.write_range(1, rpc.events)
+        with self.captureOnCommitCallbacks(execute=True):
+            ListingIngester().ingest(
+                [
+                    {
+                        "borrower": user.public_key,
+                        "nft_contract_address": "0xc011",
+                        "nft_token_id": 2,
+                        "borrow_amount": 5,
+                    },
+                    {
+                        "borrower": user.public_key,
+                        "nft_contract_address": "0xbeef",
+                        "nft_token_id": 3,
+                    },
+                ]
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            ExpiredOfferSweeper(batch_size=10, max_batches=1, interval=1).sweep()
+
+        created = Listing.objects.get(nft_contract_address="0xbeef")
+        # the rows of a merge come in no particular order
+        self.assertCountEqual(
+            [
+                (event["event"], event["collection"], event["data"]["id"])
+                for event in self.events
+            ],
+            [
+                ("listing.updated", "0xc011", str(indexed.id)),
+                ("listing.created", "0xbeef", str(created.id)),
+                ("listing.updated", "0xc011", str(ingested.id)),
+                ("offer.deleted", "0xc011", str(offer.id)),
+            ],
+        )
+        events = {event["data"]["id"]: event for event in self.events}
+        self.assertEqual(
+            events[str(indexed.id)]["data"]["status"], ListingStatus.CLOSED
+        )
+        self.assertEqual(events[str(ingested.id)]["data"]["borrow_amount"], 5)
+        self.assertEqual(events[str(offer.id)]["data"]["listing_id"], str(ingested.id))
+
+    def test_deleted_offers_are_published(self):
+        offer = factories.OfferFactory(
+            listing=factories.ListingFactory(
+                user=factories.UserFactory(), nft_contract_address="0xc011"
+            )
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            offer.delete()
+        self.assertEqual(
+            (self.events[-1]["event"], self.events[-1]["collection"]),
+            ("offer.deleted", "0xc011"),
+        )
+
+    def test_offers_deleted_with_their_listing_are_published(self):
+        listing = factories.ListingFactory(
+            user=factories.UserFactory(), nft_contract_address="0xc011"
+        )
+        offers = factories.OfferFactory.create_batch(3, listing=listing)
+        listing = Listing.objects.get(id=listing.id)
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                listing.delete()
+        # the listing of the deleted offers is the deleted listing
+        self.assertFalse(
+            [
+                query
+                for query in queries
+                if query["sql"].startswith('SELECT "core_listing"')
+            ]
+        )
+        self.assertCountEqual(
+            [
+                (event["event"], event["collection"], event["data"]["id"])
+                for event in self.events
+                if event["event"] == "offer.deleted"
+            ],
+            [("offer.deleted", "0xc011", str(offer.id)) for offer in offers],
+        )
+
+    def test_rolled_back_changes_are_not_published(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    factories.ListingFactory(user=factories.UserFactory())
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self.events, [])
+
+
+class TestPostgresFeedBackend(TransactionTestCase):
+    async def test_events_reach_the_brokers_of_every_process(self):
+        # two brokers, as if they were in two processes
+        publisher = FeedBroker(PostgresFeedBackend, queue_size=10)
+        subscriber = FeedBroker(PostgresFeedBackend, queue_size=10)
+        self.addCleanup(subscriber.backend.stop)
+        # like the ASGI application, listen before the first subscription
+        await sync_to_async(subscriber.backend.start)()
+        with mock.patch.object(
+            subscriber.backend, "start", wraps=subscriber.backend.start
+        ) as start:
+            subscription = subscriber.subscribe(["0xc011"])
+        # subscribing never waits for the listener on the event loop
+        start.assert_called_once_with(timeout=0)
+
+        await sync_to_async(publisher.publish)(event("0xc011"))
+        name, payload = await next_message(subscription)
+        self.assertEqual(name, "listing.created")
+        self.assertEqual(json.loads(payload), event("0xc011"))
+
+        # the events of a bulk write are notified in one statement
+        events = [event("0xc011", "offer.deleted"), event("0xc011", "offer.created")]
+        await sync_to_async(publisher.publish_many)(events)
+        for expected in events:
+            name, payload = await next_message(subscription)
+            self.assertEqual(json.loads(payload), expected)
+        self.assertEqual(publisher.stats()["published"], 3)
+
+
+class TestFeedStats(APITestCase):
+    def test_feed_stats_are_for_staff(self):
+        user = factories.UserFactory()
+        self.client.force_authenticate(user)
+        url = reverse("feed-stats")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        user.is_staff = True
+        user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("dropped", response.data)
@@ -0,0 +1,248 @@
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from core.indexer import (
+    LOAN_REPAID,
+    LOAN_STARTED,
+    LoanEventIndexer,
+    StarknetRPCClient,
+    StarknetRPCError,
+    get_loan_indexer,
+)
+from core.loan_rollups import rebuild_loan_rollups
+from core.models import (
+    IndexerCheckpoint,
+    ListingRollup,
+    ListingStatus,
+    Loan,
+    LoanDailyRollup,
+    LoanStatus,
+)
+from core.rollups import rebuild_rollups
+
+from . import factories
+from .rpc import FakeStarknetRPC
+
+CONTRACT = "0xc0de"
+DAY_1 = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+DAY_2 = DAY_1 + timedelta(days=1)
+
+
+def rollup_rows() -> tuple[set, set]:
+    # the rollups that are left empty by the updates are kept with zero counts
+    return (
+        set(
+            LoanDailyRollup.objects.exclude(loans_count=0, locked_delta=0).values_list(
+                "day",
+                "nft_contract_address",
+                "token_contract_address",
+                "loans_count",
+                "volume",
+                "locked_delta",
+                "locked_total",
+            )
+        ),
+        set(
+            ListingRollup.objects.exclude(
+                listings_count=0, open_listings_count=0
+            ).values_list("facet", "value", "listings_count", "open_listings_count")
+        ),
+    )
+
+
+class TestLoanEventIndexer(APITestCase):
+    def setUp(self):
+        self.rpc = FakeStarknetRPC(CONTRACT).__enter__()
+        self.addCleanup(self.rpc.__exit__)
+
+    def indexer(self, **kwargs) -> LoanEventIndexer:
+        options = {
+            "start_block": 1,
+            "batch_size": 2,
+            "max_in_flight": 3,
+            "chunk_size": 2,
+            "confirmations": 0,
+            "interval": 1,
+            **kwargs,
+        }
+        return LoanEventIndexer(StarknetRPCClient(self.rpc.url), CONTRACT, **options)
+
+    def test_loan_events_are_indexed(self):
+        factories.AcceptedTokenFactory(contract_address="0x70c", token_decimal=6)
+        user = factories.UserFactory()
+        listing = factories.ListingFactory(
+            user=user,
+            nft_contract_address="0xc011",
+            nft_token_id=1,
+            token_contract_address="0x70c",
+        )
+        other = factories.ListingFactory(
+            user=user, nft_contract_address="0xc011", nft_token_id=5
+        )
+        self.rpc.loan_started(1, 1, start_time=DAY_1, borrow_amount=10**6)
+        self.rpc.loan_started(2, 2, nft_token_id=2**40, start_time=DAY_1)
+        self.rpc.loan_started(3, 3, start_time=DAY_2)
+        self.rpc.loan_repaid(4, 1, DAY_2)
+        self.rpc.loan_foreclosed(7, 2, DAY_2)
+        # the events of other contracts and of a loan that is not indexed
+        self.rpc.loan_started(5, 9)
+        self.rpc.events[-1]["from_address"] = "0xbad"
+        self.rpc.loan_repaid(6, 99, DAY_2)
+
+        run = self.indexer(chunk_size=1).index()
+        self.assertEqual(run["blocks"], 7)
+        self.assertEqual(run["events"], 6)
+        self.assertEqual(run["inserted"], 3)
+        self.assertEqual(run["closed"], 2)
+        self.assertEqual(run["listings_closed"], 1)
+        self.assertEqual(run["checkpoint"], 7)
+        self.assertEqual(IndexerCheckpoint.objects.get().block_number, 7)
+
+        loans = {loan.loan_id: loan for loan in Loan.objects.all()}
+        self.assertEqual(loans[1].status, LoanStatus.REPAID)
+        self.assertEqual(loans[1].closed_at, DAY_2)
+        self.assertEqual(loans[1].due_at, DAY_1 + timedelta(days=1))
+        self.assertEqual(loans[1].borrow_amount, 10**6)
+        self.assertEqual(loans[1].borrower, "0xb0")
+        self.assertEqual(loans[2].status, LoanStatus.FORECLOSED)
+        self.assertEqual(loans[2].nft_token_id, 2**40)
+        self.assertEqual(loans[3].status, LoanStatus.PENDING)
+        self.assertIsNone(loans[3].closed_at)
+        listing.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(listing.status, ListingStatus.CLOSED)
+        self.assertEqual(other.status, ListingStatus.OPEN)
+
+        # the ranges are paged, with a continuation token
+        tokens = [
+            request["params"]["filter"].get("continuation_token")
+            for request in self.rpc.requests
+            if request["method"] == "starknet_getEvents"
+        ]
+        self.assertIn("1", tokens)
+
+        # the rollups were counted like a rebuild counts them
+        indexed = rollup_rows()
+        rebuild_loan_rollups()
+        rebuild_rollups()
+        self.assertEqual(indexed, rollup_rows())
+
+    def test_indexing_resumes_from_the_checkpoint(self):
+        self.rpc.loan_started(1, 1, start_time=DAY_1)
+        indexer = self.indexer()
+        indexer.index()
+        self.rpc.loan_started(2, 2, start_time=DAY_1)
+        self.rpc.loan_repaid(3, 1, DAY_2)
+
+        run = indexer.index()
+        self.assertEqual(run["blocks"], 2)
+        self.assertEqual((run["inserted"], run["closed"]), (1, 1))
+        self.assertEqual(indexer.stats()["runs"], 2)
+        self.assertEqual(indexer.stats()["events"], 3)
+
+        # indexing the blocks again changes nothing
+        indexed = rollup_rows()
+        IndexerCheckpoint.objects.all().delete()
+        run = indexer.index()
+        self.assertEqual((run["inserted"], run["closed"]), (0, 0))
+        self.assertEqual(rollup_rows(), indexed)
+        self.assertEqual(Loan.objects.count(), 2)
+
+    def test_ranges_written_by_another_indexer_are_skipped(self):
+        self.rpc.loan_started(1, 1, start_time=DAY_1)
+        self.rpc.loan_repaid(4, 1, DAY_2)
+        first, second = self.indexer(), self.indexer()
+        events = first.client.get_events(
+            CONTRACT, [[hex(LOAN_STARTED), hex(LOAN_REPAID)]], 1, 2, 10
+        )
+        # the second indexer writes the blocks that the first one has read
+        second.index(to_block=4)
+        indexed = rollup_rows()
+
+        with CaptureQueriesContext(connection) as queries:
+            written = first.write_range(2, events)
+        self.assertEqual(written, {"inserted": 0, "closed": 0, "listings_closed": 0})
+        self.assertIn("pg_advisory_xact_lock", queries[1]["sql"])
+        self.assertEqual(IndexerCheckpoint.objects.get().block_number, 4)
+        self.assertEqual(rollup_rows(), indexed)
+
+    def test_loans_that_overflow_their_columns_are_skipped(self):
+        self.rpc.loan_started(1, 1, borrow_amount=2**64)
+        self.rpc.loan_started(1, 2, nft_token_id=2**63)
+        self.rpc.loan_started(2, 3)
+        self.rpc.loan_repaid(2, 2**64, DAY_2)
+
+        with self.assertLogs("core.indexer", "WARNING") as logs:
+            run = self.indexer().index()
+        self.assertEqual(run["inserted"], 1)
+        self.assertEqual(run["checkpoint"], 2)
+        self.assertEqual(list(Loan.objects.values_list("loan_id", flat=True)), [3])
+        self.assertIn("borrow_amount", logs.output[0])
+        self.assertIn("nft_token_id", logs.output[1])
+        self.assertEqual(len(logs.output), 3)
+
+    def test_unconfirmed_blocks_are_left_for_the_next_run(self):
+        self.rpc.loan_started(1, 1)
+        self.rpc.loan_started(5, 2)
+
+        run = self.indexer(confirmations=2).index()
+        self.assertEqual(run["checkpoint"], 3)
+        self.assertEqual(list(Loan.objects.values_list("loan_id", flat=True)), [1])
+
+    def test_failed_requests_do_not_move_the_checkpoint(self):
+        self.rpc.loan_started(1, 1)
+        indexer = self.indexer()
+        with self.assertRaises(StarknetRPCError):
+            indexer.client.call("starknet_getBlockWithTxs", [])
+        # nothing listens on the port
+        indexer.client = StarknetRPCClient("http://127.0.0.1:1/rpc", timeout=1)
+
+        with self.assertRaises(StarknetRPCError):
+            indexer.index(to_block=1)
+        self.assertFalse(IndexerCheckpoint.objects.exists())
+        self.assertFalse(Loan.objects.exists())
+
+    def test_catch_up_over_many_ranges(self):
+        for loan_id in range(1, 2001):
+            self.rpc.loan_started(
+                loan_id // 10 + 1, loan_id, nft_token_id=loan_id, start_time=DAY_1
+            )
+            if loan_id % 2:
+                self.rpc.loan_repaid(loan_id // 10 + 2, loan_id, DAY_2)
+
+        run = self.indexer(batch_size=20, max_in_flight=4, chunk_size=500).index()
+        self.assertEqual(run["events"], 3000)
+        self.assertEqual(run["inserted"], 2000)
+        self.assertEqual(run["closed"], 1000)
+        self.assertEqual(Loan.objects.filter(status=LoanStatus.REPAID).count(), 1000)
+        self.assertGreater(run["events_per_second"], 0)
+
+    def test_index_loan_events_command(self):
+        self.rpc.loan_started(1, 1)
+        with override_settings(
+            STARKNET_RPC_URL=self.rpc.url, LOAN_CONTRACT_ADDRESS=CONTRACT
+        ):
+            get_loan_indexer.cache_clear()
+            self.addCleanup(get_loan_indexer.cache_clear)
+            output = StringIO()
+            call_command("index_loan_events", stdout=output)
+        self.assertIn("1 loans started", output.getvalue())
+        self.assertEqual(IndexerCheckpoint.objects.get().block_number, 1)
+
+    def test_loan_indexer_stats_are_for_staff(self):
+        user = factories.UserFactory()
+        self.client.force_authenticate(user)
+        url = reverse("loan-indexer-stats")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        user.is_staff = True
+        user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("checkpoint", response.data)
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+from django.core.management import call_command
+
+from core.ingest import ListingIngester, LoanIngester
+from core.models import Listing, ListingRollup, ListingStatus, Loan, LoanStatus, User
+from core.tests import factories
+
+LISTINGS_CSV = """borrower,nft_contract_address,nft_token_id,token_contract_address,borrow_amount,repayment_amount,duration,status
+0x00AAA,0xC011,1,0x70c,100,110,86400,
+0xaaa,0xc011,2,,,,,2
+0xbbb,0xc011,not a number,,,,,
+0xbbb,0x0C011,1,0x70c,200,220,86400,1
+0xbbb,0xc022,7,,,,,
+"""
+
+
+@pytest.mark.django_db
+def test_ingest_listings_csv(tmp_path):
+    factories.AcceptedNFTFactory(name="Ducks", contract_address="0xc011")
+    borrower = factories.UserFactory(public_key="0xccc")
+    existing = factories.ListingFactory(
+        user=borrower, nft_contract_address="0xc022", nft_token_id=7
+    )
+    path = tmp_path / "listings.csv"
+    path.write_text(LISTINGS_CSV)
+
+    call_command("ingest", "listings", str(path), batch_size=2)
+
+    # the last row of an NFT wins and the listing of 0xc022 #7 is updated
+    assert Listing.objects.count() == 3
+    listing = Listing.objects.get(nft_contract_address="0xc011", nft_token_id=1)
+    assert listing.user.public_key == "0xbbb"
+    assert listing.borrow_amount == 200
+    assert listing.search_document == "0xc011 0xbbb ducks"
+    closed = Listing.objects.get(nft_contract_address="0xc011", nft_token_id=2)
+    assert closed.status == ListingStatus.CLOSED
+    assert closed.token_contract_address is None
+    existing.refresh_from_db()
+    assert existing.user.public_key == "0xbbb"
+    assert set(User.objects.values_list("public_key", flat=True)) >= {"0xaaa", "0xbbb"}
+    counts = dict(
+        ListingRollup.objects.filter(facet="collection").values_list(
+            "value", "listings_count"
+        )
+    )
+    assert counts == {"0xc011": 2, "0xc022": 1}
+
+    # the ingestion is idempotent
+    progress = ListingIngester(batch_size=2).ingest(
+        [
+            {"borrower": "0xbbb", "nft_contract_address": "0xc011", "nft_token_id": 1},
+            {"borrower": "0xbbb", "nft_contract_address": "0xc011", "nft_token_id": 1},
+        ]
+    )
+    assert progress["inserted"] == 0
+    assert progress["updated"] == 1
+    assert Listing.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_ingest_loans_ndjson(tmp_path, capsys):
+    loan = {
+        "borrower": "0x0AAA",
+        "lender": "0xbbb",
+        "loan_id": 1,
+        "nft_contract_address": "0xc011",
+        "nft_token_id": 1,
+        "token_contract_address": "0x70c",
+        "borrow_amount": 100,
+        "repayment_amount": 110,
+        "duration": 86400,
+        "start_time": "2025-01-01T00:00:00Z",
+    }
+    rows = [
+        loan,
+        {**loan, "loan_id": 2},
+        {**loan, "loan_id": 2, "status": LoanStatus.REPAID},
+        {**loan, "loan_id": -1},
+    ]
+    path = tmp_path / "loans.ndjson"
+    path.write_text("\n".join(json.dumps(row) for row in rows) + "\n")
+
+    call_command("ingest", "loans", str(path), batch_size=3)
+    output = capsys.readouterr()
+    assert "2 inserted, 0 updated, 1 invalid" in output.out
+    assert "Line 4" in output.err
+
+    assert Loan.objects.count() == 2
+    assert Loan.objects.get(loan_id=1).borrower == "0xaaa"
+    assert Loan.objects.get(loan_id=2).status == LoanStatus.REPAID
+
+    progress = LoanIngester().ingest([{**loan, "borrow_amount": 50}])
+    assert (progress["inserted"], progress["updated"]) == (0, 1)
+    assert Loan.objects.get(loan_id=1).borrow_amount == 50
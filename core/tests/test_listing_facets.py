@@ -0,0 +1,91 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import ListingRollup, ListingStatus
+from core.rollups import bucket_label, rebuild_rollups
+from core.tests import factories
+
+DAY = 86400
+
+
+@pytest.mark.parametrize(
+    "value,label",
+    [
+        (0, "0-1"),
+        (DAY - 1, "0-1"),
+        (DAY, "1-7"),
+        (179 * DAY, "90-180"),
+        (180 * DAY, "180+"),
+    ],
+)
+def test_duration_buckets(value, label):
+    assert bucket_label(value, [0, 1, 7, 30, 90, 180], DAY) == label
+
+
+@pytest.mark.django_db
+def test_listing_facets(django_capture_on_commit_callbacks):
+    client = APIClient()
+    url = reverse("listing-facets")
+
+    token = factories.AcceptedTokenFactory(contract_address="0x70c", token_decimal=6)
+    user = factories.UserFactory()
+
+    def listing(**kwargs):
+        return factories.ListingFactory(
+            user=user, nft_contract_address="0xc011", **kwargs
+        )
+
+    listing(token_contract_address="0x70C", borrow_amount=5 * 10**6, duration=DAY)
+    listing(token_contract_address="0x70c", borrow_amount=10**6 - 1, duration=DAY)
+    listing(token_contract_address="0x1", borrow_amount=10**9, duration=2 * DAY)
+    closed = listing(
+        token_contract_address="0x70c", borrow_amount=10**6, duration=DAY
+    )
+    closed.status = ListingStatus.CLOSED
+    closed.save()
+    listing(duration=365 * DAY).delete()
+    factories.ListingFactory(user=user, nft_contract_address="0xc022", duration=None)
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == 200
+    assert len([query for query in queries if "SELECT" in query["sql"]]) == 1
+    assert response.json() == {
+        "collection": [
+            {"value": "0xc011", "count": 3},
+            {"value": "0xc022", "count": 1},
+        ],
+        "token": [{"value": "0x70c", "count": 2}, {"value": "0x1", "count": 1}],
+        "duration": [{"value": "1-7", "count": 3}],
+        # the amounts of the tokens that are not accepted are not counted
+        "borrow_amount": [{"value": "0-1", "count": 1}, {"value": "1-10", "count": 1}],
+    }
+
+    # the incremental counts match a full recount
+    rollups = set(
+        ListingRollup.objects.values_list(
+            "facet", "value", "open_listings_count", "listings_count"
+        )
+    )
+    rebuild_rollups()
+    assert set(
+        ListingRollup.objects.values_list(
+            "facet", "value", "open_listings_count", "listings_count"
+        )
+    ) == {rollup for rollup in rollups if rollup[3]}
+
+    # renaming the token does not recount the listings
+    token.name = "Renamed"
+    with django_capture_on_commit_callbacks() as callbacks:
+        token.save()
+    assert rebuild_rollups not in callbacks
+
+    # the buckets follow the decimals of the token, once it is committed
+    token.token_decimal = 9
+    with django_capture_on_commit_callbacks(execute=True):
+        token.save()
+    response = client.get(url)
+    assert response.json()["borrow_amount"] == [{"value": "0-1", "count": 2}]
@@ -1,9 +1,15 @@
+import importlib
+
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 
-from core.models import ListingStatus
+from core.models import Listing, ListingStatus, normalize_address
+from core.search import ListingSearchFilter
 from core.tests import factories
+from core.views import ListingListAPIView
 
 
 @pytest.mark.django_db
@@ -48,7 +54,8 @@ def test_listings_filter_by_collateral_contract():
     data = response.json()
     results = data["results"]
     assert len(results) == 1
-    assert results[0]["nft_contract_address"] == "0xFilterThis"
+    # the addresses are stored canonicalized
+    assert results[0]["nft_contract_address"] == "0xfilterthis"
 
 
 @pytest.mark.django_db
@@ -57,6 +64,8 @@ def test_listings_filter_by_borrower_address():
     url = reverse("listing-list")
 
     user = factories.UserFactory(public_key="0xBorrowerFilter")
+    factories.ListingFactory(user=user, status=ListingStatus.OPEN)
+    factories.ListingFactory(user=factories.UserFactory())
 
     response = client.get(url, {"borrower_address": "0xBorrowerFilter"})
     assert response.status_code == 200
@@ -76,7 +85,7 @@ def test_listings_pagination_structure():
     for _ in range(5):
         factories.ListingFactory(user=user, status=ListingStatus.OPEN)
 
-    response = client.get(url)
+    response = client.get(url, {"page": 1})
     assert response.status_code == 200
 
     data = response.json()
@@ -85,3 +94,306 @@ def test_listings_pagination_structure():
     assert "count" in data
     assert "next" in data
     assert "previous" in data
+
+
+@pytest.mark.django_db
+def test_listings_cursor_pagination_structure():
+    client = APIClient()
+    url = reverse("listing-list")
+
+    user = factories.UserFactory()
+    for _ in range(5):
+        factories.ListingFactory(user=user, status=ListingStatus.OPEN)
+
+    response = client.get(url)
+    assert response.status_code == 200
+
+    data = response.json()
+    assert isinstance(data["results"], list)
+    assert "count" not in data
+    assert "next" in data
+    assert "previous" in data
+
+
+@pytest.mark.django_db
+def test_listings_cursor_pagination_walks_every_listing():
+    client = APIClient()
+    url = reverse("listing-list")
+
+    user = factories.UserFactory()
+    listings = [factories.ListingFactory(user=user) for _ in range(7)]
+    expected = sorted(listings, key=lambda x: (x.created_at, x.id), reverse=True)
+
+    seen = []
+    response = client.get(url, {"page_size": 3})
+    while True:
+        data = response.json()
+        seen.extend(listing["id"] for listing in data["results"])
+        if not data["next"]:
+            break
+        response = client.get(data["next"])
+
+    assert seen == [str(listing.id) for listing in expected]
+
+
+@pytest.mark.django_db
+def test_listings_cursor_pagination_query_count(django_assert_num_queries):
+    client = APIClient()
+    url = reverse("listing-list")
+
+    user = factories.UserFactory()
+    for _ in range(5):
+        factories.ListingFactory(user=user)
+
+    # no count query, only the page (and the request savepoint)
+    with django_assert_num_queries(3):
+        response = client.get(url)
+    assert response.status_code == 200
+
+
+def _listing_queries(queries) -> list[str]:
+    return [query["sql"] for query in queries if "core_listing" in query["sql"]]
+
+
+@pytest.mark.django_db
+def test_listings_pages_are_cached_per_collection(
+    django_capture_on_commit_callbacks,
+):
+    client = APIClient()
+    url = reverse("listing-list")
+
+    user = factories.UserFactory()
+    factories.ListingFactory(user=user, nft_contract_address="0xaaa")
+    factories.ListingFactory(user=user, nft_contract_address="0xbbb")
+    collection_a, collection_b = {"collateral_contract": "0xAAA"}, {
+        "collateral_contract": "0xbbb"
+    }
+    for params in [{}, collection_a, collection_b]:
+        client.get(url, params)
+
+    # the cached pages do not query the listings
+    with CaptureQueriesContext(connection) as queries:
+        assert len(client.get(url, collection_a).json()["results"]) == 1
+        response = client.get(url, {"collateral_contract": "0x0aaa"})
+        assert len(response.json()["results"]) == 1
+    assert _listing_queries(queries) == []
+
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        factories.ListingFactory(user=user, nft_contract_address="0x0AAA")
+    # the invalidation of the cached pages and the feed event
+    assert len(callbacks) == 2
+
+    # the pages of the collection and the unfiltered pages are invalidated
+    assert len(client.get(url, collection_a).json()["results"]) == 2
+    assert len(client.get(url).json()["results"]) == 3
+    with CaptureQueriesContext(connection) as queries:
+        assert len(client.get(url, collection_b).json()["results"]) == 1
+    assert _listing_queries(queries) == []
+
+
+@pytest.mark.django_db
+def test_listings_moved_to_another_collection_leave_its_cached_pages():
+    client = APIClient()
+    url = reverse("listing-list")
+
+    user = factories.UserFactory()
+    listing = factories.ListingFactory(user=user, nft_contract_address="0xaaa")
+    collection_a = {"collateral_contract": "0xaaa"}
+    assert len(client.get(url, collection_a).json()["results"]) == 1
+
+    listing.nft_contract_address = "0xbbb"
+    listing.save()
+    assert client.get(url, collection_a).json()["results"] == []
+    response = client.get(url, {"collateral_contract": "0xbbb"})
+    assert len(response.json()["results"]) == 1
+
+
+@pytest.mark.django_db
+def test_listings_cache_keys_include_the_cursor():
+    client = APIClient()
+    url = reverse("listing-list")
+
+    user = factories.UserFactory()
+    for _ in range(3):
+        factories.ListingFactory(user=user)
+
+    first_page = client.get(url, {"page_size": 2}).json()
+    second_page = client.get(first_page["next"]).json()
+    assert first_page["results"] != second_page["results"]
+    assert len(second_page["results"]) == 1
+
+
+@pytest.mark.django_db
+def test_listings_filter_by_differently_written_addresses():
+    client = APIClient()
+    url = reverse("listing-list")
+
+    user = factories.UserFactory(public_key="0x00ABCDEF")
+    factories.ListingFactory(user=user, nft_contract_address="0x0001F2E3")
+
+    response = client.get(
+        url, {"collateral_contract": "0x1f2e3", "borrower_address": "0xabcdef"}
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == 1
+    assert results[0]["nft_contract_address"] == "0x1f2e3"
+
+
+@pytest.mark.parametrize(
+    "address,expected",
+    [
+        ("0x00ABCdef", "0xabcdef"),
+        ("0X0", "0x0"),
+        (" 0x000 ", "0x0"),
+        ("0xNotHex", "0xnothex"),
+        (None, None),
+    ],
+)
+@pytest.mark.django_db
+def test_address_canonicalization_in_python_and_sql(address, expected):
+    migration = importlib.import_module(
+        "core.migrations.0004_address_fields_listing_indexes"
+    )
+    assert normalize_address(address) == expected
+
+    user = factories.UserFactory()
+    listing = factories.ListingFactory(user=user)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE core_listing SET token_contract_address = %s WHERE id = %s",
+            [address, listing.id],
+        )
+        cursor.execute(
+            migration.canonicalize_address_sql("core_listing", "token_contract_address")
+        )
+    listing.refresh_from_db()
+    assert listing.token_contract_address == expected
+
+
+@pytest.mark.django_db
+def test_address_canonicalization_stops_on_duplicates():
+    migration = importlib.import_module(
+        "core.migrations.0004_address_fields_listing_indexes"
+    )
+    users = factories.UserFactory.create_batch(3)
+    with connection.cursor() as cursor:
+        for user, public_key in zip(users, ["0xABC", "0x0abc", "0xdef"]):
+            cursor.execute(
+                "UPDATE core_user SET public_key = %s WHERE id = %s",
+                [public_key, user.id],
+            )
+    schema_editor = type("SchemaEditor", (), {"connection": connection})()
+
+    with pytest.raises(RuntimeError) as error:
+        migration.check_duplicate_addresses(None, schema_editor)
+    assert "core_user.public_key 0xabc" in str(error.value)
+    assert "(0xABC)" in str(error.value) and "(0x0abc)" in str(error.value)
+    assert "0xdef" not in str(error.value)
+
+    users[1].delete()
+    migration.check_duplicate_addresses(None, schema_editor)
+
+
+@pytest.mark.parametrize(
+    "params,index",
+    [
+        ({}, "listing_open_feed_idx"),
+        ({"collateral_contract": "0xabc"}, "listing_open_collection_idx"),
+        ({"borrower_address": "0xdef"}, "listing_open_borrower_idx"),
+    ],
+)
+@pytest.mark.django_db
+def test_listings_queries_use_indexes(params, index):
+    user = factories.UserFactory(public_key="0xdef")
+    for _ in range(3):
+        factories.ListingFactory(user=user, nft_contract_address="0xabc")
+    # the listings of other borrowers and collections
+    others = factories.UserFactory.create_batch(20)
+    Listing.objects.bulk_create(
+        factories.ListingFactory.build(user=others[index % 20]) for index in range(500)
+    )
+
+    view = ListingListAPIView()
+    view.request = type("Request", (), {"query_params": params})()
+    queryset = view.get_queryset()[:10]
+    with connection.cursor() as cursor:
+        # the tables are tiny, so make the planner prefer the indexes
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute("SET LOCAL enable_sort = off")
+        cursor.execute("ANALYZE core_listing")
+    plan = queryset.explain()
+    assert index in plan, plan
+    assert "Sort" not in plan.split(index)[0]
+
+
+@pytest.mark.django_db
+def test_listings_search():
+    client = APIClient()
+    url = reverse("listing-list")
+
+    user = factories.UserFactory(public_key="0x00ABCDEF1234")
+    listing = factories.ListingFactory(user=user, nft_contract_address="0x0FEDCBA987")
+    factories.AcceptedNFTFactory(name="Starknet Punks", contract_address="0xfedcba987")
+    factories.ListingFactory(user=factories.UserFactory())
+    factories.ListingFactory(user=user, status=ListingStatus.CLOSED)
+
+    for search in [
+        # prefix and substring of the collateral contract, written differently
+        "0x00FEDC",
+        "dcba98",
+        # prefix and substring of the borrower public key
+        "0xabcdef",
+        "EF1234",
+        # the collection name, which was accepted after the listing was made
+        "punks",
+        "starknet punks",
+    ]:
+        response = client.get(url, {"search": search})
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [result["id"] for result in results] == [str(listing.id)], search
+
+    response = client.get(url, {"search": "punks 0x123"})
+    assert response.json()["results"] == []
+
+
+@pytest.mark.django_db
+def test_listing_search_document_follows_the_collection():
+    user = factories.UserFactory(public_key="0xabc")
+    listing = factories.ListingFactory(user=user, nft_contract_address="0xdef")
+    assert listing.search_document == "0xdef 0xabc"
+
+    collection = factories.AcceptedNFTFactory(name="Ducks", contract_address="0xDEF")
+    listing.refresh_from_db()
+    assert listing.search_document == "0xdef 0xabc ducks"
+
+    collection.delete()
+    listing.refresh_from_db()
+    assert listing.search_document == "0xdef 0xabc"
+
+
+@pytest.mark.django_db
+def test_listings_search_uses_trigram_index():
+    others = factories.UserFactory.create_batch(20)
+    listings = [
+        factories.ListingFactory.build(user=others[index % 20]) for index in range(500)
+    ]
+    for listing in listings:
+        listing.search_document = listing.nft_contract_address
+    Listing.objects.bulk_create(listings)
+
+    view = ListingListAPIView()
+    view.request = type("Request", (), {"query_params": {}})()
+    request = type("Request", (), {"query_params": {"search": "punks"}})()
+    queryset = ListingSearchFilter().filter_queryset(request, view.get_queryset(), view)
+    with connection.cursor() as cursor:
+        # the feed indexes are cheaper than a gin index on a tiny table,
+        # drop them in the test transaction to check the search can use it
+        for index in Listing._meta.indexes:
+            if index.name != "listing_open_search_trgm_idx":
+                cursor.execute(f"DROP INDEX {index.name}")
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute("ANALYZE core_listing")
+    plan = queryset.explain()
+    assert "Index Scan on listing_open_search_trgm_idx" in plan, plan
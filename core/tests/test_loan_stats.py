@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from core.loan_rollups import get_loan_stats, rebuild_loan_rollups
+from core.models import LoanDailyRollup, LoanStatus
+from core.registry import accepted_assets
+
+from . import factories
+
+DAY_1 = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+DAY_2 = DAY_1 + timedelta(days=1)
+
+
+def by_token(rows: list[dict]) -> dict:
+    return {row["token_contract_address"]: row for row in rows}
+
+
+def rollup_rows() -> set:
+    # the rollups of the deleted loans are left with zero counts
+    return set(
+        LoanDailyRollup.objects.exclude(loans_count=0, locked_delta=0).values_list(
+            "day",
+            "nft_contract_address",
+            "token_contract_address",
+            "loans_count",
+            "volume",
+            "locked_delta",
+            "locked_total",
+        )
+    )
+
+
+class TestLoanStats(APITestCase):
+    def setUp(self):
+        factories.AcceptedTokenFactory(contract_address="0x70c", token_decimal=6)
+
+        def loan(**kwargs):
+            return factories.LoanFactory(
+                nft_contract_address="0xc011", duration=86400, **kwargs
+            )
+
+        self.loans = [
+            loan(
+                token_contract_address="0x70c", borrow_amount=10**6, start_time=DAY_1
+            ),
+            loan(
+                token_contract_address="0x70c",
+                borrow_amount=2 * 10**6,
+                start_time=DAY_2,
+            ),
+            loan(token_contract_address="0x1", borrow_amount=5, start_time=DAY_2),
+            # closed when it was due, on the second day
+            loan(
+                token_contract_address="0x70c",
+                borrow_amount=4 * 10**6,
+                start_time=DAY_1,
+                status=LoanStatus.REPAID,
+            ),
+        ]
+        accepted_assets.tokens()
+
+    def test_rollups_are_maintained_incrementally(self):
+        """
+        Test that the rollups updated by the loan changes are the rollups
+        rebuilt from scratch
+        """
+        self.loans[0].status = LoanStatus.FORECLOSED
+        self.loans[0].save()
+        self.loans[1].borrow_amount = 3 * 10**6
+        self.loans[1].save()
+        self.loans[2].delete()
+        self.loans[3].status = LoanStatus.EXPIRED
+        self.loans[3].save()
+
+        rows = rollup_rows()
+        rebuild_loan_rollups()
+        self.assertEqual(rollup_rows(), rows)
+
+    def test_locked_total_is_carried_to_the_later_days(self):
+        """
+        Test that a loan started before the last rollup is locked
+        on every later day
+        """
+        factories.LoanFactory(
+            nft_contract_address="0xc011",
+            token_contract_address="0x70c",
+            duration=86400,
+            borrow_amount=8 * 10**6,
+            start_time=DAY_1 - timedelta(days=10),
+        )
+        rows = rollup_rows()
+        rebuild_loan_rollups()
+        self.assertEqual(rollup_rows(), rows)
+        self.assertEqual(
+            LoanDailyRollup.objects.get(
+                day=DAY_2.date(), token_contract_address="0x70c"
+            ).locked_total,
+            11 * 10**6,
+        )
+        token = by_token(get_loan_stats("token", end=DAY_1.date()))["0x70c"]
+        self.assertEqual(token["tvl_normalized"], 13.0)
+
+    def test_loan_stats(self):
+        stats = by_token(get_loan_stats("token"))
+        token = stats["0x70c"]
+        self.assertEqual(stats["0x1"]["volume"], 5)
+        self.assertIsNone(stats["0x1"]["volume_normalized"])
+        self.assertEqual(token["loans_count"], 3)
+        self.assertEqual(token["volume"], 7 * 10**6)
+        self.assertEqual(token["volume_normalized"], 7.0)
+        # the repaid loan is no longer locked
+        self.assertEqual(token["tvl_normalized"], 3.0)
+
+        token = by_token(get_loan_stats("token", start=DAY_2.date(), end=DAY_2.date()))[
+            "0x70c"
+        ]
+        self.assertEqual(token["loans_count"], 1)
+        self.assertEqual(token["tvl_normalized"], 3.0)
+        token = by_token(get_loan_stats("token", end=DAY_1.date()))["0x70c"]
+        self.assertEqual(token["volume_normalized"], 5.0)
+        self.assertEqual(token["tvl_normalized"], 5.0)
+
+        rows = get_loan_stats("collection")
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]["nft_contract_address"], "0xc011")
+
+    def test_loan_stats_endpoint_reads_rollups(self):
+        url = reverse("loan-stats")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"start": "2024-01-02"})
+        self.assertEqual(response.status_code, 200)
+        tables = [query["sql"] for query in queries if "SELECT" in query["sql"]]
+        self.assertEqual(len(tables), 1)
+        self.assertIn("core_loandailyrollup", tables[0])
+        self.assertEqual(response.json()["group"], "token")
+        self.assertEqual(len(response.json()["results"]), 2)
+
+        response = self.client.get(url, {"start": "2024-01-02", "end": "2024-01-01"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(url, {"group": "user"}).status_code, 400)
+
+    def test_rebuild_loan_rollups_command(self):
+        rows = rollup_rows()
+        LoanDailyRollup.objects.all().delete()
+        output = StringIO()
+        call_command("rebuild_loan_rollups", stdout=output)
+        self.assertIn(f"Rebuilt {len(rows)} daily loan rollups", output.getvalue())
+        self.assertEqual(rollup_rows(), rows)
@@ -0,0 +1,348 @@
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from knox.models import AuthToken
+from rest_framework.test import APITestCase
+
+from core.models import ListingStatus, Offer
+from core.registry import accepted_assets
+from core.serializers import MakeOfferSerializer
+from core.service import CoreService
+
+from . import factories
+from .utils import generate_key_pair, signed_offer_data
+
+
+class OfferTestCase(APITestCase):
+    def setUp(self):
+        self.lender_keys = generate_key_pair()
+        self.lender = factories.UserFactory(public_key=self.lender_keys[1])
+        self.token = factories.AcceptedTokenFactory()
+        borrower = factories.UserFactory()
+        self.listings = [factories.ListingFactory(user=borrower) for _ in range(3)]
+        token = AuthToken.objects.create(self.lender)[1]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+
+    def _offer_data(self, listing) -> dict:
+        return signed_offer_data(listing, self.token.contract_address, self.lender_keys)
+
+
+class TestOfferCreateAPIView(OfferTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("create-offer")
+
+    def test_create_offer_successful(self):
+        """
+        Test that a signed offer on an open listing is created
+        """
+        data = self._offer_data(self.listings[0])
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, 201)
+        offer = Offer.objects.get(listing=self.listings[0])
+        self.assertEqual(offer.user, self.lender)
+        self.assertEqual(offer.token_contract_address, self.token.contract_address)
+        self.assertEqual(offer.duration, data["loan_duration"])
+        self.assertAlmostEqual(
+            offer.effective_apr,
+            (data["repayment_amount"] - data["principal"])
+            / data["principal"]
+            * 365
+            * 86400
+            / data["loan_duration"],
+        )
+
+    def test_create_offer_with_hex_chain_id(self):
+        """
+        Test that the chain id is parsed like the felt that was signed
+        """
+        data = self._offer_data(self.listings[0])
+        data["chain_id"] = "0x1"
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Offer.objects.get().signature_chain_id, 1)
+
+    def test_create_offer_with_tampered_data(self):
+        """
+        Test that changing a signed field invalidates the signature
+        """
+        data = self._offer_data(self.listings[0])
+        data["principal"] += 1
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Offer.objects.exists())
+
+
+class TestBulkOfferCreateAPIView(OfferTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("bulk-create-offer")
+
+    def test_bulk_create_offers_successful(self):
+        """
+        Test that every valid offer of the request is created
+        """
+        offers = [self._offer_data(listing) for listing in self.listings]
+        response = self.client.post(self.url, {"offers": offers}, format="json")
+        self.assertEqual(response.status_code, 201)
+        results = response.json()["results"]
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(result["created"] for result in results))
+        self.assertEqual(Offer.objects.filter(user=self.lender).count(), 3)
+
+    def test_bulk_create_offers_with_partial_failures(self):
+        """
+        Test that each invalid offer gets its own error and the others are created
+        """
+        self.listings[1].status = ListingStatus.CLOSED
+        self.listings[1].save()
+        offers = [self._offer_data(listing) for listing in self.listings]
+        offers[2]["unique_id"] += 1
+        offers.append({"listing": "not-a-uuid"})
+
+        response = self.client.post(self.url, {"offers": offers}, format="json")
+        self.assertEqual(response.status_code, 201)
+        results = response.json()["results"]
+        self.assertEqual(
+            [result["created"] for result in results], [True] + [False] * 3
+        )
+        self.assertEqual(results[1]["errors"]["detail"], "Listing is not active")
+        self.assertEqual(results[2]["errors"]["detail"], "Invalid signature message")
+        self.assertIn("listing", results[3]["errors"])
+        self.assertEqual(Offer.objects.count(), 1)
+
+    def test_bulk_create_offers_with_zero_signature(self):
+        """
+        Test that a signature without an inverse only fails its own offer
+        """
+        offers = [self._offer_data(listing) for listing in self.listings]
+        offers[1]["signatures"][4] = "0"
+
+        response = self.client.post(self.url, {"offers": offers}, format="json")
+        self.assertEqual(response.status_code, 201)
+        results = response.json()["results"]
+        self.assertEqual([result["created"] for result in results], [True, False, True])
+        self.assertEqual(results[1]["errors"]["detail"], "Invalid signature message")
+        self.assertEqual(Offer.objects.count(), 2)
+
+    def test_bulk_create_offers_with_duplicates(self):
+        """
+        Test that an offer repeated in the request is only created once
+        """
+        offer = self._offer_data(self.listings[0])
+        response = self.client.post(
+            self.url, {"offers": [offer, dict(offer)]}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        results = response.json()["results"]
+        self.assertEqual([result["created"] for result in results], [True, False])
+        self.assertEqual(results[1]["errors"]["detail"], "Duplicate offer")
+        self.assertEqual(Offer.objects.count(), 1)
+
+    def test_bulk_create_offers_all_failed(self):
+        """
+        Test that the request fails when none of the offers is created
+        """
+        offers = [self._offer_data(listing) for listing in self.listings]
+        for offer in offers:
+            offer["unique_id"] += 1
+        response = self.client.post(self.url, {"offers": offers}, format="json")
+        self.assertEqual(response.status_code, 400)
+        results = response.json()["results"]
+        self.assertFalse(any(result["created"] for result in results))
+        self.assertFalse(Offer.objects.exists())
+
+    def test_bulk_create_offers_with_named_chain(self):
+        """
+        Test that a chain id out of the stored range fails its own offer
+        """
+        offers = [self._offer_data(listing) for listing in self.listings[:2]]
+        offers[1]["chain_id"] = "SN_SEPOLIA"
+        response = self.client.post(self.url, {"offers": offers}, format="json")
+        self.assertEqual(response.status_code, 201)
+        results = response.json()["results"]
+        self.assertEqual([result["created"] for result in results], [True, False])
+        self.assertIn("chain_id", results[1]["errors"])
+
+    def test_bulk_create_offers_query_count(self):
+        """
+        Test that the number of queries does not grow with the number of offers
+        """
+        offers = [self._offer_data(listing) for listing in self.listings]
+        # the accepted tokens are in memory once the registry is loaded
+        accepted_assets.tokens()
+        # authentication, listings, offers insert and savepoints
+        with self.assertNumQueries(6):
+            response = self.client.post(self.url, {"offers": offers}, format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_bulk_create_offers_empty(self):
+        """
+        Test that an empty offer list is rejected
+        """
+        response = self.client.post(self.url, {"offers": []}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class TestVerifySignaturesBatch(OfferTestCase):
+    def test_verify_signatures_batch(self):
+        """
+        Test that the batch verification matches the single offer verification
+        """
+        offers = [self._offer_data(listing) for listing in self.listings]
+        offers[1]["repayment_amount"] += 1
+        offers[2]["signatures"] = offers[2]["signatures"][:2]
+        requests = [
+            (MakeOfferSerializer.signature_data(offer), offer["signatures"])
+            for offer in offers
+        ]
+        self.assertEqual(
+            CoreService.validate_loan_offer_requests(requests, self.lender),
+            [True, False, False],
+        )
+        self.assertTrue(
+            CoreService.validate_loan_offer_request(*requests[0], self.lender)
+        )
+
+
+class TestOfferBookAPIView(APITestCase):
+    def setUp(self):
+        self.listing = factories.ListingFactory(user=factories.UserFactory())
+        self.url = reverse("listing-offer-book", args=[self.listing.id])
+        self.offers = [
+            self._offer(principal=1000, repayment_amount=1100, expiry_in=300),
+            self._offer(principal=2000, repayment_amount=2100, expiry_in=200),
+            self._offer(principal=500, repayment_amount=600, expiry_in=100),
+        ]
+        # an expired offer and an offer on another listing
+        self._offer(principal=1000, repayment_amount=1000, expiry_in=-1)
+        factories.OfferFactory(listing=factories.ListingFactory(user=self.listing.user))
+
+    def _offer(self, principal: int, repayment_amount: int, expiry_in: int) -> Offer:
+        return factories.OfferFactory(
+            listing=self.listing,
+            borrow_amount=principal,
+            repayment_amount=repayment_amount,
+            duration=30 * 86400,
+            signature_expiry=int(time.time()) + expiry_in,
+        )
+
+    def _ranked_ids(self, params: dict) -> list[str]:
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [offer["id"] for offer in response.json()]
+
+    def test_offer_book_rankings(self):
+        """
+        Test that the offers that have not expired are ranked
+        """
+        first, second, third = [str(offer.id) for offer in self.offers]
+        self.assertEqual(self._ranked_ids({}), [second, first, third])
+        self.assertEqual(self._ranked_ids({"ordering": "-apr"}), [third, first, second])
+        self.assertEqual(
+            self._ranked_ids({"ordering": "-principal"}), [second, first, third]
+        )
+        self.assertEqual(
+            self._ranked_ids({"ordering": "expiry"}), [third, second, first]
+        )
+        self.assertEqual(
+            self._ranked_ids({"ordering": "apr", "limit": 2}), [second, first]
+        )
+
+    def test_offer_book_validation(self):
+        """
+        Test the invalid query parameters and listings
+        """
+        self.assertEqual(self.client.get(self.url, {"ordering": "id"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"limit": 0}).status_code, 400)
+        url = reverse("listing-offer-book", args=[self.offers[0].id])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_offer_book_uses_index(self):
+        """
+        Test that the top offers are read from the index without sorting
+        """
+        queryset = Offer.objects.filter(
+            listing=self.listing, effective_apr__isnull=False
+        ).order_by("effective_apr", "id")[:10]
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_sort = off")
+            cursor.execute("ANALYZE core_offer")
+        plan = queryset.explain()
+        self.assertIn("offer_listing_apr_idx", plan)
+        self.assertNotIn("Sort", plan)
+
+
+class TestOfferListAPIViews(APITestCase):
+    def setUp(self):
+        self.user = factories.UserFactory()
+        lender = factories.UserFactory()
+        listing = factories.ListingFactory(user=self.user)
+        other_listing = factories.ListingFactory(user=lender)
+        # offers made by the user, and offers on the listing of the user
+        self.made = [
+            factories.OfferFactory(user=self.user, listing=other_listing)
+            for _ in range(4)
+        ]
+        self.received = [
+            factories.OfferFactory(user=lender, listing=listing) for _ in range(4)
+        ]
+        factories.OfferFactory(user=lender, listing=other_listing)
+        token = AuthToken.objects.create(self.user)[1]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+
+    def _all_ids(self, url: str, page_size: int) -> list[str]:
+        ids = []
+        params = {"page_size": page_size}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            ids += [offer["id"] for offer in response.json()["results"]]
+            url, params = response.json()["next"], None
+        return ids
+
+    def test_lender_and_borrower_offers(self):
+        """
+        Test that the offers made by the user and the offers on the listings
+        of the user are paginated newest first
+        """
+        for url, offers in (
+            (reverse("lender-offers"), self.made),
+            (reverse("borrower-offers"), self.received),
+        ):
+            self.assertEqual(
+                self._all_ids(url, page_size=3),
+                [str(offer.id) for offer in reversed(offers)],
+            )
+
+        response = self.client.get(reverse("borrower-offers"))
+        offer = response.json()["results"][0]
+        self.assertEqual(offer["lender"], self.received[-1].user.public_key)
+        self.assertEqual(offer["listing"]["id"], str(self.received[-1].listing_id))
+        self.assertEqual(offer["borrow_amount"], self.received[-1].borrow_amount)
+
+    def test_offer_pages_query_count(self):
+        """
+        Test that a page is read in a single query, so the number of queries
+        does not depend on the page size
+        """
+        counts = []
+        for page_size in (1, 4):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    reverse("lender-offers"), {"page_size": page_size}
+                )
+            self.assertEqual(len(response.json()["results"]), page_size)
+            # the savepoints of the atomic request are left out
+            selects = [query["sql"] for query in queries if "SELECT" in query["sql"]]
+            self.assertEqual(len([sql for sql in selects if "core_offer" in sql]), 1)
+            counts.append(len(selects))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_offer_lists_require_authentication(self):
+        self.client.credentials()
+        self.assertEqual(self.client.get(reverse("lender-offers")).status_code, 401)
+        self.assertEqual(self.client.get(reverse("borrower-offers")).status_code, 401)
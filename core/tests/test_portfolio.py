@@ -0,0 +1,144 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from core.ingest import LoanIngester
+from core.models import Loan, LoanStatus
+from core.registry import accepted_assets
+from core.scheduler import LoanScheduler
+
+from . import factories
+
+
+class TestPortfolioAPIView(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.address = "0xabc"
+        self.url = reverse("portfolio", args=["0x0ABC"])
+        self.token = factories.AcceptedTokenFactory(
+            contract_address="0x70c", token_decimal=6
+        )
+
+        def loan(**kwargs):
+            return factories.LoanFactory(token_contract_address="0x70c", **kwargs)
+
+        self.loans = [
+            loan(borrower=self.address, borrow_amount=100, repayment_amount=110),
+            loan(borrower=self.address, borrow_amount=200, repayment_amount=220),
+            loan(
+                borrower=self.address,
+                borrow_amount=300,
+                repayment_amount=330,
+                status=LoanStatus.EXPIRED,
+            ),
+            loan(
+                borrower=self.address,
+                borrow_amount=400,
+                repayment_amount=440,
+                status=LoanStatus.REPAID,
+            ),
+            loan(lender=self.address, borrow_amount=50, repayment_amount=60),
+        ]
+        factories.LoanFactory(lender=self.address, token_contract_address="0x1")
+        factories.LoanFactory()
+        accepted_assets.tokens()
+
+    def _get(self) -> dict:
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_portfolio_aggregates(self):
+        """
+        Test that the loans of the address are aggregated by role and token
+        in a single query
+        """
+        with CaptureQueriesContext(connection) as queries:
+            portfolio = self._get()
+        self.assertEqual(
+            len([query for query in queries if "core_loan" in query["sql"]]), 1
+        )
+        self.assertEqual(portfolio["address"], self.address)
+        self.assertEqual(
+            portfolio["borrower"],
+            [
+                {
+                    "token_contract_address": "0x70c",
+                    "token_decimal": 6,
+                    "outstanding_principal": 600,
+                    "expected_repayment": 660,
+                    "counts": {
+                        "pending": 2,
+                        "expired": 1,
+                        "foreclosed": 0,
+                        "repaid": 1,
+                    },
+                }
+            ],
+        )
+        lender = {
+            token["token_contract_address"]: token for token in portfolio["lender"]
+        }
+        self.assertEqual(lender["0x70c"]["outstanding_principal"], 50)
+        self.assertIsNone(lender["0x1"]["token_decimal"])
+
+    def test_portfolio_is_cached_until_loans_change(self):
+        self._get()
+        with CaptureQueriesContext(connection) as queries:
+            self._get()
+        self.assertFalse([query for query in queries if "core_loan" in query["sql"]])
+
+        loan = self.loans[0]
+        loan.status = LoanStatus.REPAID
+        loan.save()
+        self.assertEqual(self._get()["borrower"][0]["outstanding_principal"], 500)
+
+        # the address that is no longer the borrower is refreshed too
+        loan = self.loans[1]
+        loan.borrower = "0xdef"
+        loan.save()
+        self.assertEqual(self._get()["borrower"][0]["outstanding_principal"], 300)
+
+        self.loans[2].delete()
+        self.assertEqual(self._get()["borrower"][0]["outstanding_principal"], 0)
+
+    def test_portfolio_is_refreshed_after_bulk_writes(self):
+        self._get()
+        LoanScheduler(batch_size=10, max_batches=1, interval=10).expire_due_loans(
+            timezone.now() + timezone.timedelta(days=365)
+        )
+        counts = self._get()["borrower"][0]["counts"]
+        self.assertEqual(counts["pending"], 0)
+        self.assertEqual(counts["expired"], 3)
+
+        loan = self.loans[0]
+        LoanIngester().ingest(
+            [
+                {
+                    "borrower": loan.borrower,
+                    "lender": loan.lender,
+                    "loan_id": loan.loan_id,
+                    "nft_contract_address": loan.nft_contract_address,
+                    "nft_token_id": loan.nft_token_id,
+                    "token_contract_address": loan.token_contract_address,
+                    "borrow_amount": loan.borrow_amount,
+                    "repayment_amount": loan.repayment_amount,
+                    "duration": loan.duration,
+                    "start_time": loan.start_time.isoformat(),
+                    "status": LoanStatus.REPAID,
+                }
+            ]
+        )
+        self.assertEqual(self._get()["borrower"][0]["counts"]["repaid"], 2)
+
+    def test_portfolio_uses_covering_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("ANALYZE core_loan")
+        plan = Loan.objects.filter(borrower=self.address).values("status").explain()
+        self.assertIn("loan_borrower_portfolio_idx", plan)
+        plan = Loan.objects.filter(lender=self.address).values("status").explain()
+        self.assertIn("loan_lender_portfolio_idx", plan)
@@ -0,0 +1,92 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from knox.models import AuthToken
+from rest_framework.test import APITestCase
+
+from core.models import LoanRenegotiationStatus, RenegotiationOffer
+
+from . import factories
+
+
+class TestRenegotiationInbox(APITestCase):
+    def setUp(self):
+        self.user = factories.UserFactory()
+        other = factories.UserFactory()
+
+        def offer(loan, status=LoanRenegotiationStatus.PENDING, user=other):
+            return factories.RenegotiationOfferFactory(
+                loan=loan, user=user, status=status
+            )
+
+        # a loan of the user as borrower, with a countered offer last
+        self.borrowed = factories.LoanFactory(
+            borrower=self.user.public_key, lender=other.public_key
+        )
+        offer(self.borrowed)
+        self.countered = offer(
+            self.borrowed, LoanRenegotiationStatus.COUNTERED, self.user
+        )
+        offer(self.borrowed, LoanRenegotiationStatus.ACCEPTED)
+        # a loan of the user as lender
+        self.lent = factories.LoanFactory(
+            borrower=other.public_key, lender=self.user.public_key
+        )
+        self.pending = offer(self.lent)
+        # a loan of the user without open offers, and a loan of another user
+        offer(
+            factories.LoanFactory(borrower=self.user.public_key),
+            LoanRenegotiationStatus.ACCEPTED,
+        )
+        offer(factories.LoanFactory(borrower=other.public_key))
+
+        token = AuthToken.objects.create(self.user)[1]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+
+    def test_inbox_has_the_latest_open_offer_and_the_counts_by_loan(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("renegotiation-inbox"))
+        self.assertEqual(response.status_code, 200)
+        # the inbox is read in a single query, besides the authentication
+        self.assertEqual(
+            len(
+                [
+                    query
+                    for query in queries
+                    if "core_renegotiationoffer" in query["sql"]
+                ]
+            ),
+            1,
+        )
+        self.assertFalse(
+            [
+                query
+                for query in queries
+                if query["sql"].startswith('SELECT "core_loan"')
+            ]
+        )
+
+        lent, borrowed = response.json()
+        self.assertEqual(lent["loan"]["loan_id"], self.lent.loan_id)
+        self.assertEqual(lent["latest_offer"]["id"], str(self.pending.id))
+        self.assertEqual((lent["pending_count"], lent["countered_count"]), (1, 0))
+        self.assertEqual(borrowed["loan"]["loan_id"], self.borrowed.loan_id)
+        self.assertEqual(borrowed["loan"]["borrower"], self.user.public_key)
+        self.assertEqual(borrowed["latest_offer"]["id"], str(self.countered.id))
+        self.assertEqual(borrowed["latest_offer"]["proposer"], self.user.public_key)
+        self.assertEqual(
+            borrowed["latest_offer"]["status"], LoanRenegotiationStatus.COUNTERED
+        )
+        self.assertEqual(
+            (borrowed["pending_count"], borrowed["countered_count"]), (1, 1)
+        )
+
+    def test_inbox_is_for_authenticated_users(self):
+        self.client.credentials()
+        response = self.client.get(reverse("renegotiation-inbox"))
+        self.assertEqual(response.status_code, 401)
+
+    def test_str_does_not_load_the_loan(self):
+        offer = RenegotiationOffer.objects.get(id=self.pending.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(str(offer), f"Loan #{self.lent.id}, status: Pending")
@@ -0,0 +1,96 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from knox.models import AuthToken
+from rest_framework.test import APITestCase
+
+from core.models import Loan, LoanStatus
+from core.scheduler import LoanScheduler, get_loan_scheduler
+
+from . import factories
+
+
+class TestLoanScheduler(APITestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        # loans due 1 to 5 hours ago, a loan due later and a repaid loan
+        self.due = [
+            factories.LoanFactory(
+                start_time=self.now - timedelta(days=1, hours=hours), duration=86400
+            )
+            for hours in range(1, 6)
+        ]
+        self.pending = factories.LoanFactory(start_time=self.now, duration=86400)
+        self.repaid = factories.LoanFactory(
+            start_time=self.now - timedelta(days=2),
+            duration=86400,
+            status=LoanStatus.REPAID,
+        )
+
+    def test_due_at_is_kept_in_sync(self):
+        self.assertEqual(self.pending.due_at, self.now + timedelta(days=1))
+        self.pending.duration = 2 * 86400
+        self.pending.save()
+        self.pending.refresh_from_db()
+        self.assertEqual(self.pending.due_at, self.now + timedelta(days=2))
+
+    def test_due_loans_are_expired_in_batches(self):
+        """
+        Test that the due pending loans are expired in batches, with their
+        transition latency
+        """
+        scheduler = LoanScheduler(batch_size=2, max_batches=10, interval=10)
+        run = scheduler.expire_due_loans(self.now)
+        self.assertEqual(run["expired"], 5)
+        self.assertEqual(run["batches"], 3)
+        self.assertGreaterEqual(run["max_latency"], 5 * 3600)
+
+        statuses = dict(Loan.objects.values_list("id", "status"))
+        for loan in self.due:
+            self.assertEqual(statuses[loan.id], LoanStatus.EXPIRED)
+        self.assertEqual(statuses[self.pending.id], LoanStatus.PENDING)
+        self.assertEqual(statuses[self.repaid.id], LoanStatus.REPAID)
+
+        stats = scheduler.stats()
+        self.assertEqual(stats["expired"], 5)
+        self.assertGreaterEqual(stats["mean_latency"], 3 * 3600)
+        self.assertEqual(scheduler.expire_due_loans(self.now)["expired"], 0)
+        self.assertEqual(scheduler.stats()["runs"], 2)
+
+    def test_due_loans_use_partial_index(self):
+        """
+        Test that the due loans are found through the partial index
+        of the pending loans
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("ANALYZE core_loan")
+        plan = (
+            Loan.objects.filter(status=LoanStatus.PENDING, due_at__lte=self.now)
+            .order_by("due_at")
+            .values("id")[:10]
+            .explain()
+        )
+        self.assertIn("loan_pending_due_idx", plan)
+
+    def test_expire_due_loans_command(self):
+        output = StringIO()
+        call_command("expire_due_loans", "--batch-size", "10", stdout=output)
+        self.assertIn("Expired 5 due loans in 1 batches", output.getvalue())
+
+    def test_loan_scheduler_stats_are_for_staff(self):
+        url = reverse("loan-scheduler-stats")
+        user = factories.UserFactory()
+        token = AuthToken.objects.create(user)[1]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), get_loan_scheduler().stats())
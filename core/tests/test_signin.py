@@ -0,0 +1,53 @@
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from core.models import User
+from core.utils import LOGIN_TYPED_DATA, SignatureUtils
+
+from .utils import generate_key_pair, sign_message_hash
+
+
+class TestSignInAPIView(APITestCase):
+    def setUp(self):
+        self.url = reverse("signin")
+        self.private_key, self.public_key = generate_key_pair()
+
+    def test_signin_successful(self):
+        """
+        Test that a valid login signature registers and signs in the user
+        """
+        response = self.client.post(self.url, self._signed_data(), format="json")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["public_key"], self.public_key)
+        self.assertTrue(data["is_new"])
+        self.assertIn("access", data)
+        self.assertTrue(User.objects.filter(public_key=self.public_key).exists())
+
+    def test_signin_with_invalid_signature(self):
+        """
+        Test that a signature by another key is rejected
+        """
+        other_private_key, _ = generate_key_pair()
+        data = self._signed_data(other_private_key)
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.filter(public_key=self.public_key).exists())
+
+    def test_signin_with_short_signature_list(self):
+        """
+        Test that a signature list shorter than the wallet format is rejected
+        """
+        data = self._signed_data()
+        data["signatures"] = data["signatures"][3:]
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def _signed_data(self, private_key: int | None = None) -> dict:
+        """
+        Sign the login message of the public key
+        """
+        message = SignatureUtils.login_message(self.public_key)
+        message_hash = LOGIN_TYPED_DATA.message_hash(message, self.public_key)
+        signatures = sign_message_hash(message_hash, private_key or self.private_key)
+        return {"signatures": signatures, "public_key": self.public_key}
@@ -0,0 +1,104 @@
+import random
+
+from django.test import SimpleTestCase
+from starknet_py.constants import EC_ORDER
+from starknet_py.hash.utils import private_to_stark_key, verify_message_signature
+
+from core.stark_curve import GENERATOR, StarkSignatureVerifier
+
+from .utils import message_signature
+
+
+class TestStarkSignatureVerifier(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # build a table for every key, so the table path is always used
+        cls.verifier = StarkSignatureVerifier(key_min_uses=0)
+        cls.keys = [random.randrange(1, EC_ORDER) for _ in range(4)]
+
+    def test_generator(self):
+        """
+        Test that the generator is the public key of the private key 1
+        """
+        self.assertEqual(private_to_stark_key(1), GENERATOR[0])
+
+    def test_valid_signatures(self):
+        """
+        Test that valid signatures are accepted like starknet_py does
+        """
+        for private_key in self.keys:
+            public_key = private_to_stark_key(private_key)
+            for _ in range(10):
+                message_hash = random.getrandbits(251)
+                signature = list(message_signature(message_hash, private_key))
+                self.assertTrue(
+                    verify_message_signature(message_hash, signature, public_key)
+                )
+                self._assert_parity(message_hash, signature, public_key)
+
+    def test_tampered_signatures(self):
+        """
+        Test that tampered signatures are rejected like starknet_py does
+        """
+        for private_key in self.keys:
+            public_key = private_to_stark_key(private_key)
+            for _ in range(10):
+                message_hash = random.getrandbits(251)
+                r, s = message_signature(message_hash, private_key)
+                self._assert_parity(message_hash + 1, [r, s], public_key)
+                self._assert_parity(message_hash, [r + 1, s], public_key)
+                self._assert_parity(message_hash, [r, s + 1], public_key)
+                self._assert_parity(message_hash, [r, EC_ORDER - s], public_key)
+                other_key = private_to_stark_key(random.randrange(1, EC_ORDER))
+                self._assert_parity(message_hash, [r, s], other_key)
+
+    def test_random_signatures(self):
+        """
+        Test random signature values and public keys, including keys
+        that are not on the curve
+        """
+        for _ in range(40):
+            public_key = random.getrandbits(251)
+            message_hash = random.getrandbits(251)
+            signature = [random.randrange(1, EC_ORDER), random.randrange(1, EC_ORDER)]
+            self._assert_parity(message_hash, signature, public_key)
+
+    def test_out_of_range_values(self):
+        """
+        Test the bounds of the message hash and the signature values
+        """
+        private_key = self.keys[0]
+        public_key = private_to_stark_key(private_key)
+        message_hash = random.getrandbits(250)
+        r, s = message_signature(message_hash, private_key)
+        self._assert_parity(0, [r, s], public_key)
+        self._assert_parity(2**251, [r, s], public_key)
+        self._assert_parity(message_hash, [0, s], public_key)
+        self._assert_parity(message_hash, [2**251, s], public_key)
+        self._assert_parity(message_hash, [r, pow(2**251, -1, EC_ORDER)], public_key)
+        # s without an inverse is rejected instead of raising
+        self.assertFalse(self.verifier.verify(message_hash, [r, 0], public_key))
+        self.assertFalse(self.verifier.verify(message_hash, [r, EC_ORDER], public_key))
+
+    def test_key_tables_for_frequent_signers(self):
+        """
+        Test that a key gets a table after signing a few messages and that
+        the least recently used tables are evicted
+        """
+        verifier = StarkSignatureVerifier(key_cache_size=2, key_min_uses=2)
+        verifier.generator_table = self.verifier.generator_table
+        public_keys = [private_to_stark_key(key) for key in self.keys[:3]]
+        for private_key, public_key in zip(self.keys, public_keys):
+            for _ in range(3):
+                message_hash = random.getrandbits(251)
+                signature = list(message_signature(message_hash, private_key))
+                self.assertTrue(verifier.verify(message_hash, signature, public_key))
+        self.assertEqual(list(verifier._key_tables), public_keys[1:])
+
+    def _assert_parity(self, message_hash: int, signature: list[int], public_key):
+        self.assertEqual(
+            self.verifier.verify(message_hash, signature, public_key),
+            verify_message_signature(message_hash, signature, public_key),
+            (message_hash, signature, public_key),
+        )
@@ -0,0 +1,103 @@
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from knox.models import AuthToken
+from rest_framework.test import APITestCase
+
+from core.models import Offer
+from core.sweeper import ExpiredOfferSweeper, get_offer_sweeper
+
+from . import factories
+
+
+class TestExpiredOfferSweeper(APITestCase):
+    def setUp(self):
+        self.now = int(time.time())
+        listing = factories.ListingFactory(user=factories.UserFactory())
+        self.expired = [
+            factories.OfferFactory(listing=listing, signature_expiry=self.now - delay)
+            for delay in range(5)
+        ]
+        self.live = factories.OfferFactory(
+            listing=listing, signature_expiry=self.now + 60
+        )
+
+    def test_sweep_deletes_expired_offers_in_batches(self):
+        """
+        Test that the expired offers are deleted in batches, and the live
+        offers are kept
+        """
+        sweeper = ExpiredOfferSweeper(batch_size=2, max_batches=10, interval=60)
+        with CaptureQueriesContext(connection) as queries:
+            run = sweeper.sweep(self.now)
+        self.assertEqual(run["deleted"], 5)
+        self.assertEqual(run["batches"], 3)
+        deletes = [
+            query for query in queries if "DELETE FROM core_offer" in query["sql"]
+        ]
+        self.assertEqual(len(deletes), 3)
+        self.assertEqual(list(Offer.objects.all()), [self.live])
+        self.assertEqual(sweeper.stats()["runs"], 1)
+        self.assertEqual(sweeper.stats()["deleted"], 5)
+
+        self.assertEqual(sweeper.sweep(self.now)["deleted"], 0)
+        self.assertEqual(sweeper.stats()["runs"], 2)
+        self.assertEqual(sweeper.stats()["last_run"]["deleted"], 0)
+
+    def test_sweep_stops_after_max_batches(self):
+        sweeper = ExpiredOfferSweeper(batch_size=2, max_batches=1, interval=60)
+        self.assertEqual(sweeper.sweep(self.now)["deleted"], 2)
+        self.assertEqual(Offer.objects.count(), 4)
+
+    def test_periodic_runner(self):
+        """
+        Test that the started sweeper runs until it is stopped
+        """
+        sweeper = ExpiredOfferSweeper(batch_size=2, max_batches=1, interval=0.01)
+        sweeper.start()
+        deadline = time.monotonic() + 5
+        while sweeper.stats()["runs"] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        sweeper.stop()
+        runs = sweeper.stats()["runs"]
+        self.assertGreaterEqual(runs, 2)
+        time.sleep(0.05)
+        self.assertEqual(sweeper.stats()["runs"], runs)
+
+    def test_sweep_uses_expiry_index(self):
+        """
+        Test that the expired offers are found through the expiry index
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("ANALYZE core_offer")
+        plan = (
+            Offer.objects.filter(signature_expiry__lte=self.now)
+            .order_by("signature_expiry")
+            .values("id")[:10]
+            .explain()
+        )
+        self.assertIn("offer_expiry_idx", plan)
+
+    def test_sweep_expired_offers_command(self):
+        output = StringIO()
+        call_command("sweep_expired_offers", "--batch-size", "3", stdout=output)
+        self.assertIn("Deleted 5 expired offers in 2 batches", output.getvalue())
+        self.assertEqual(Offer.objects.count(), 1)
+
+    def test_offer_sweeper_stats_are_for_staff(self):
+        url = reverse("offer-sweeper-stats")
+        user = factories.UserFactory()
+        token = AuthToken.objects.create(user)[1]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), get_offer_sweeper().stats())
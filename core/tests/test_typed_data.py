@@ -0,0 +1,65 @@
+import random
+
+from django.test import SimpleTestCase
+from starknet_py.utils.typed_data import TypedData
+
+from core.typed_data import CompiledTypedData
+from core.utils import LOGIN_TYPED_DATA, OFFER_TYPED_DATA, SignatureUtils
+
+
+class TestCompiledTypedData(SimpleTestCase):
+    def test_login_message_hash_parity(self):
+        """
+        Test that the compiled login format hashes like starknet_py's TypedData
+        """
+        for _ in range(10):
+            public_key = hex(random.getrandbits(250))
+            message = SignatureUtils.login_message(public_key)
+            typed_data = SignatureUtils.generate_signature_typed_data(
+                message, SignatureUtils.login_typed_data_format()
+            )
+            self.assertEqual(
+                LOGIN_TYPED_DATA.message_hash(message, public_key),
+                typed_data.message_hash(int(public_key, 16)),
+            )
+
+    def test_offer_message_hash_parity(self):
+        """
+        Test that the compiled offer format hashes like starknet_py's TypedData
+        """
+        for _ in range(10):
+            lender = hex(random.getrandbits(250))
+            message = {
+                "principal": random.randint(1, 10**24),
+                "repayment_amount": str(random.randint(1, 10**24)),
+                "collateral_contract": hex(random.getrandbits(250)),
+                "collateral_id": random.randint(1, 10**6),
+                "token_contract": hex(random.getrandbits(250)),
+                "loan_duration": random.randint(86400, 86400 * 365),
+                "lender": lender,
+                "expiry": random.randint(1, 2**32),
+                "chain_id": "SN_SEPOLIA",
+                "unique_id": random.getrandbits(64),
+            }
+            typed_data = SignatureUtils.generate_signature_typed_data(
+                message, SignatureUtils.offer_typed_data_format()
+            )
+            self.assertEqual(
+                OFFER_TYPED_DATA.message_hash(message, lender),
+                typed_data.message_hash(int(lender, 16)),
+            )
+
+    def test_constant_hashes_are_precomputed(self):
+        """
+        Test that the domain and type hashes match the uncompiled typed data
+        """
+        type_format = SignatureUtils.offer_typed_data_format()
+        typed_data = TypedData(**type_format)
+        compiled = CompiledTypedData.from_format(type_format)
+        self.assertEqual(compiled.type_hash, typed_data.type_hash("Message"))
+        self.assertEqual(
+            compiled.domain_hash,
+            typed_data.struct_hash(
+                typed_data.domain.separator_name, typed_data.domain.to_dict()
+            ),
+        )
@@ -0,0 +1,137 @@
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+from django.urls import reverse
+from knox.models import AuthToken
+from rest_framework.test import APITestCase
+
+from core.exceptions import SignatureVerificationUnavailable
+from core.utils import LOGIN_TYPED_DATA, SignatureUtils
+from core.verification import SignatureVerifier, VerifiedSignatureCache
+
+from . import factories
+from .utils import generate_key_pair, sign_message_hash
+
+
+def _verification_request(valid: bool = True) -> tuple[int, int, int, int]:
+    private_key, public_key = generate_key_pair()
+    message = SignatureUtils.login_message(public_key)
+    message_hash = LOGIN_TYPED_DATA.message_hash(message, public_key)
+    signatures = sign_message_hash(message_hash, private_key)
+    return SignatureUtils.verification_request(
+        message_hash + (0 if valid else 1), signatures, public_key
+    )
+
+
+class TestSignatureVerifier(SimpleTestCase):
+    def test_synchronous_verification(self):
+        """
+        Test that a verifier without workers verifies in the calling thread
+        """
+        verifier = SignatureVerifier(0, 0, 1, 8)
+        requests = [_verification_request(), _verification_request(valid=False)]
+        self.assertEqual(verifier.verify_many(requests), [True, False])
+        self.assertEqual(verifier.verify_many([]), [])
+
+    def test_process_pool_verification(self):
+        """
+        Test that the worker processes return the same results
+        """
+        verifier = SignatureVerifier(1, 2, 30, 8)
+        try:
+            requests = [_verification_request(), _verification_request(valid=False)]
+            self.assertEqual(verifier.verify_many(requests), [True, False])
+            # the slot of the finished task is released
+            self.assertEqual(verifier.verify_many(requests[:1]), [True])
+        finally:
+            verifier.shutdown()
+
+    def test_saturated_verifier(self):
+        """
+        Test that a saturated verifier refuses the task instead of blocking
+        """
+        verifier = SignatureVerifier(1, 0, 1, 8)
+        with self.assertRaises(SignatureVerificationUnavailable):
+            verifier.verify_many([_verification_request()])
+
+
+class TestVerifiedSignatureCache(SimpleTestCase):
+    def test_cached_verification(self):
+        """
+        Test that a verified signature is not verified again
+        """
+        cache = VerifiedSignatureCache(10, 60)
+        verifier = SignatureVerifier(0, 0, 1, 8, cache)
+        valid, invalid = _verification_request(), _verification_request(valid=False)
+        self.assertEqual(verifier.verify_many([valid, invalid]), [True, False])
+        with mock.patch("core.verification.verify_signatures") as verify:
+            verify.return_value = [False]
+            self.assertEqual(verifier.verify_many([valid, invalid]), [True, False])
+        verify.assert_called_once_with([invalid])
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 3, "size": 1})
+
+    def test_entries_do_not_outlive_signature_expiry(self):
+        """
+        Test that the entries expire with the signature or the ttl
+        """
+        cache = VerifiedSignatureCache(10, 60)
+        request = _verification_request()
+        cache.add(request, int(time.time()) - 1)
+        self.assertFalse(cache.get(request))
+        cache.add(request, int(time.time()) + 1)
+        self.assertTrue(cache.get(request))
+        with mock.patch("core.verification.time.time", return_value=time.time() + 2):
+            self.assertFalse(cache.get(request))
+        cache.add(request, int(time.time()) + 3600)
+        with mock.patch("core.verification.time.time", return_value=time.time() + 61):
+            self.assertFalse(cache.get(request))
+
+    def test_cache_is_bounded(self):
+        """
+        Test that the least recently used entries are evicted
+        """
+        cache = VerifiedSignatureCache(2, 60)
+        requests = [(index, 1, 1, 1) for index in range(3)]
+        for request in requests:
+            cache.add(request)
+        self.assertFalse(cache.get(requests[0]))
+        self.assertTrue(cache.get(requests[1]))
+        self.assertTrue(cache.get(requests[2]))
+
+
+class TestSignatureVerifierRequests(APITestCase):
+    def test_signin_with_saturated_verifier(self):
+        """
+        Test that the sign in request fails with 503 when the verifier is saturated
+        """
+        private_key, public_key = generate_key_pair()
+        message = SignatureUtils.login_message(public_key)
+        message_hash = LOGIN_TYPED_DATA.message_hash(message, public_key)
+        data = {
+            "signatures": sign_message_hash(message_hash, private_key),
+            "public_key": public_key,
+        }
+        with mock.patch(
+            "core.utils.get_signature_verifier",
+            return_value=SignatureVerifier(1, 0, 1, 8),
+        ):
+            response = self.client.post(reverse("signin"), data, format="json")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+
+    def test_signature_cache_stats(self):
+        """
+        Test that staff users can read the cache counters
+        """
+        url = reverse("signature-cache-stats")
+        user = factories.UserFactory()
+        token = AuthToken.objects.create(user)[1]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {"hits", "misses", "size"})
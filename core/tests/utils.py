@@ -0,0 +1,71 @@
+import functools
+import random
+
+from starknet_py.constants import EC_ORDER, FIELD_PRIME
+from starknet_py.hash.utils import private_to_stark_key
+
+from core.serializers import MakeOfferSerializer
+from core.stark_curve import GENERATOR, SIGNATURE_UPPER_BOUND, FixedBaseTable
+from core.utils import OFFER_TYPED_DATA
+
+
+def generate_key_pair() -> tuple[int, str]:
+    """
+    Generate a random stark private key and its hex public key
+    """
+    private_key = random.randrange(1, EC_ORDER)
+    return private_key, hex(private_to_stark_key(private_key))
+
+
+@functools.cache
+def _generator_table() -> FixedBaseTable:
+    return FixedBaseTable(GENERATOR, 8)
+
+
+def message_signature(message_hash: int, private_key: int) -> tuple[int, int]:
+    """
+    Sign the message hash with a random nonce.
+    starknet_py's message_signature is correct but takes a fraction of
+    a second per signature, which is too slow for the tests.
+    """
+    while True:
+        k = random.randrange(1, EC_ORDER)
+        x, y, z = _generator_table().multiply(k)
+        r = x * pow(z * z, -1, FIELD_PRIME) % FIELD_PRIME
+        s = pow(k, -1, EC_ORDER) * (message_hash + r * private_key) % EC_ORDER
+        if not 0 < r < SIGNATURE_UPPER_BOUND or not s:
+            continue
+        if pow(s, -1, EC_ORDER) < SIGNATURE_UPPER_BOUND:
+            return r, s
+
+
+def sign_message_hash(message_hash: int, private_key: int) -> list[str]:
+    """
+    Sign the message hash and return it in the wallet signature list format,
+    where the r and s values are the 4th and 5th items of the list.
+    """
+    r, s = message_signature(message_hash, private_key)
+    return ["1", "0", "0", str(r), str(s)]
+
+
+def signed_offer_data(listing, token_contract: str, lender: tuple[int, str]) -> dict:
+    """
+    Build the request data of an offer on the listing signed by the lender
+    """
+    private_key, public_key = lender
+    data = {
+        "listing": str(listing.id),
+        "principal": 1000,
+        "repayment_amount": 1100,
+        "collateral_contract": listing.nft_contract_address,
+        "collateral_id": listing.nft_token_id,
+        "token_contract": token_contract,
+        "loan_duration": 86400 * 7,
+        "expiry": 2**31 - 1,
+        "chain_id": "1",
+        "unique_id": random.getrandbits(32),
+    }
+    message = {**MakeOfferSerializer.signature_data(data), "lender": public_key}
+    message_hash = OFFER_TYPED_DATA.message_hash(message, public_key)
+    data["signatures"] = sign_message_hash(message_hash, private_key)
+    return data
@@ -0,0 +1,104 @@
+# precompiled typed data hashing for the signature request formats
+from typing import Union
+
+from starknet_py.cairo.felt import encode_shortstring
+from starknet_py.hash.hash_method import HashMethod
+from starknet_py.hash.utils import pedersen_hash
+from starknet_py.utils.typed_data import Domain, Parameter, TypedData, parse_felt
+
+MESSAGE_PREFIX = encode_shortstring("StarkNet Message")
+
+# basic types whose values can be encoded without the typed data context
+FELT_TYPES = ("felt", "string", "shortstring", "ContractAddress", "ClassHash")
+
+
+class CompiledTypedData:
+    """
+    ### Description
+    A typed data signature request format compiled once at startup.
+    The domain separator hash and the primary type hash never change
+    between requests, so they are computed here once and only the
+    variable message fields are hashed per call.
+
+    With the pedersen hash method (revision 0) the hash chains are
+    seeded with the constant elements, so a message hash only costs
+    the pedersen hashes of the message fields and the account address.
+
+    The result is the same as `TypedData.message_hash`.
+    """
+
+    def __init__(
+        self, types: dict[str, list[Parameter]], primary_type: str, domain: Domain
+    ):
+        typed_data = TypedData(
+            types=types, primary_type=primary_type, domain=domain, message={}
+        )
+        for param in types[primary_type]:
+            if param.type not in FELT_TYPES:
+                raise ValueError(
+                    f"Cannot compile parameter [{param.name}] of type [{param.type}]."
+                )
+
+        self.types = types
+        self.primary_type = primary_type
+        self.domain = domain
+        self.field_names = tuple(param.name for param in types[primary_type])
+        self.hash_method = typed_data._hash_method
+        self.domain_hash = typed_data.struct_hash(
+            domain.separator_name, domain.to_dict()
+        )
+        self.type_hash = typed_data.type_hash(primary_type)
+        # states of the pedersen hash chains after their constant elements
+        self._message_seed = pedersen_hash(
+            pedersen_hash(0, MESSAGE_PREFIX), self.domain_hash
+        )
+        self._struct_seed = pedersen_hash(0, self.type_hash)
+
+    @classmethod
+    def from_format(cls, type_format: dict) -> "CompiledTypedData":
+        """
+        Compile a typed data format as returned by `SignatureUtils`
+        """
+        return cls(
+            type_format["types"], type_format["primary_type"], type_format["domain"]
+        )
+
+    def encode_message(self, message: dict) -> list[int]:
+        """
+        Encode the message fields in the order of the primary type
+        """
+        return [parse_felt(message[name]) for name in self.field_names]
+
+    def struct_hash(self, message: dict) -> int:
+        """
+        Calculate the hash of the message struct
+        """
+        values = self.encode_message(message)
+        if self.hash_method != HashMethod.PEDERSEN:
+            return self.hash_method.hash_many([self.type_hash, *values])
+
+        result = self._struct_seed
+        for value in values:
+            result = pedersen_hash(result, value)
+        return pedersen_hash(result, len(values) + 1)
+
+    def message_hash(self, message: dict, account_address: Union[int, str]) -> int:
+        """
+        Calculate the hash of the message signed by the account
+
+        Args:
+            message(dict): the variable fields of the signature request
+            account_address(int | str): the address of the signer
+        Returns:
+            int: the message hash used for signature verification
+        """
+        account_address = parse_felt(account_address)
+        struct_hash = self.struct_hash(message)
+        if self.hash_method != HashMethod.PEDERSEN:
+            return self.hash_method.hash_many(
+                [MESSAGE_PREFIX, self.domain_hash, account_address, struct_hash]
+            )
+
+        result = pedersen_hash(self._message_seed, account_address)
+        result = pedersen_hash(result, struct_hash)
+        return pedersen_hash(result, 4)
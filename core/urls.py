@@ -23,8 +23,86 @@ urlpatterns = [
         views.ListingListAPIView.as_view(),
         name="listing-list",
     ),
+    path(
+        "listings/<uuid:listing_id>/offers/",
+        views.OfferBookAPIView.as_view(),
+        name="listing-offer-book",
+    ),
+    path(
+        "listings/facets/",
+        views.ListingFacetsAPIView.as_view(),
+        name="listing-facets",
+    ),
+    path(
+        "listings/export/",
+        views.ListingExportAPIView.as_view(),
+        name="listing-export",
+    ),
+    path(
+        "analytics/yields/",
+        views.YieldAnalyticsAPIView.as_view(),
+        name="yield-analytics",
+    ),
+    path(
+        "portfolio/<str:address>/",
+        views.PortfolioAPIView.as_view(),
+        name="portfolio",
+    ),
+    path("loan/<int:loan_id>/", views.LoanDetailAPIView.as_view(), name="loan-detail"),
+    path(
+        "renegotiation/inbox/",
+        views.RenegotiationInboxAPIView.as_view(),
+        name="renegotiation-inbox",
+    ),
+    path("stats/loans/", views.LoanStatsAPIView.as_view(), name="loan-stats"),
+    path("feed/events/", views.feed_events, name="feed-events"),
     path("offer/create/", views.OfferCreateAPIView.as_view(), name="create-offer"),
+    path(
+        "offer/bulk-create/",
+        views.BulkOfferCreateAPIView.as_view(),
+        name="bulk-create-offer",
+    ),
+    path(
+        "offer/mine/",
+        views.LenderOfferListAPIView.as_view(),
+        name="lender-offers",
+    ),
+    path(
+        "offer/received/",
+        views.BorrowerOfferListAPIView.as_view(),
+        name="borrower-offers",
+    ),
     path("offer/cancel/", views.OfferCancelAPIView.as_view(), name="cancel-offer"),
+    path(
+        "metrics/signature-cache/",
+        views.SignatureCacheStatsAPIView.as_view(),
+        name="signature-cache-stats",
+    ),
+    path(
+        "metrics/offer-sweeper/",
+        views.OfferSweeperStatsAPIView.as_view(),
+        name="offer-sweeper-stats",
+    ),
+    path(
+        "metrics/loan-scheduler/",
+        views.LoanSchedulerStatsAPIView.as_view(),
+        name="loan-scheduler-stats",
+    ),
+    path(
+        "metrics/feed/",
+        views.FeedStatsAPIView.as_view(),
+        name="feed-stats",
+    ),
+    path(
+        "metrics/loan-archiver/",
+        views.LoanArchiverStatsAPIView.as_view(),
+        name="loan-archiver-stats",
+    ),
+    path(
+        "metrics/loan-indexer/",
+        views.LoanIndexerStatsAPIView.as_view(),
+        name="loan-indexer-stats",
+    ),
     path(
         "account/update-email/",
         views.UpdateEmailAPIView.as_view(),
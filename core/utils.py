@@ -1,8 +1,10 @@
 # file of all the utility functions, variables and classes
 from django.conf import settings
-from starknet_py.hash.utils import verify_message_signature
 from starknet_py.utils.typed_data import Domain, Parameter, TypedData
 
+from .typed_data import CompiledTypedData
+from .verification import get_signature_verifier
+
 DOMAIN_NAME = settings.SIG_DOMAIN_NAME
 CHAIN_ID = settings.SIG_CHAIN_ID
 VERSION = settings.SIG_VERSION
@@ -27,7 +29,7 @@ class SignatureUtils:
                 }
             ),
             "types": {
-                "StarknetDomain": [
+                "StarkNetDomain": [
                     Parameter(**{"name": "name", "type": "felt"}),
                     Parameter(**{"name": "chainId", "type": "felt"}),
                     Parameter(**{"name": "version", "type": "felt"}),
@@ -43,6 +45,18 @@ class SignatureUtils:
         }
         return data.copy()
 
+    @classmethod
+    def login_message(cls, public_key: str) -> dict:
+        """
+        The message of the login signature request of a user.
+
+        Args:
+            public_key(str): The public key of the signer.
+        Returns:
+            dict: The message section of the login signature request.
+        """
+        return {"name": DOMAIN_NAME, "age": 0, "address": public_key}
+
     @classmethod
     def offer_typed_data_format(cls) -> dict:
         """
@@ -60,7 +74,7 @@ class SignatureUtils:
                 }
             ),
             "types": {
-                "StarknetDomain": [
+                "StarkNetDomain": [
                     Parameter(**{"name": "name", "type": "felt"}),
                     Parameter(**{"name": "chainId", "type": "felt"}),
                     Parameter(**{"name": "version", "type": "felt"}),
@@ -117,9 +131,55 @@ class SignatureUtils:
                 the message that is signed.
             public_key(str): The public key of the signer.
         """
+        message_hash = typed_data.message_hash(int(public_key, 16))
+        return cls.verify_message_hash(message_hash, signatures, public_key)
+
+    @classmethod
+    def verify_message_hash(
+        cls,
+        message_hash: int,
+        signatures: list[str],
+        public_key: str,
+        expiry: int | None = None,
+    ) -> bool:
+        """
+        Verify the signature of an already computed message hash.
+        The verification runs on the signature verifier worker pool.
+        Args:
+            message_hash(int): the hash of the signed message.
+            signatures(list[str]): This is a list of the signatures that represent
+                the message that is signed.
+            public_key(str): The public key of the signer.
+            expiry(int): The timestamp of when the signature expires (optional)
+        """
+        request = cls.verification_request(message_hash, signatures, public_key)
+        return get_signature_verifier().verify_many([request], [expiry])[0]
+
+    @classmethod
+    def verification_request(
+        cls, message_hash: int, signatures: list[str], public_key: str
+    ) -> tuple[int, int, int, int]:
+        """
+        Convert the signature data to the verification request of the
+        signature verifier.
+        Args:
+            message_hash(int): the hash of the signed message.
+            signatures(list[str]): This is a list of the signatures that represent
+                the message that is signed.
+            public_key(str): The public key of the signer.
+        Returns:
+            tuple[int, int, int, int]: the message hash, the r and s values
+                of the signature and the public key
+        """
         int_signatures = list(map(lambda x: int(x), signatures))
         int_public_key = int(public_key, 16)
-        message_hash = typed_data.message_hash(int_public_key)
-        return verify_message_signature(
-            message_hash, [int_signatures[3], int_signatures[4]], public_key
-        )
+        return message_hash, int_signatures[3], int_signatures[4], int_public_key
+
+
+# the signature request formats compiled once at startup
+LOGIN_TYPED_DATA = CompiledTypedData.from_format(
+    SignatureUtils.login_typed_data_format()
+)
+OFFER_TYPED_DATA = CompiledTypedData.from_format(
+    SignatureUtils.offer_typed_data_format()
+)
@@ -0,0 +1,238 @@
+# offloading of the stark curve signature verification
+import functools
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from .exceptions import SignatureVerificationUnavailable
+from .stark_curve import StarkSignatureVerifier
+
+# the curve verifier of the current process, with its multiplication tables
+_curve_verifier = None
+
+
+def load_curve_verifier(key_cache_size: int) -> StarkSignatureVerifier:
+    """
+    Build the multiplication tables of the current process.
+    This is the initializer of the worker processes.
+    """
+    global _curve_verifier
+    if _curve_verifier is None:
+        _curve_verifier = StarkSignatureVerifier(key_cache_size=key_cache_size)
+    return _curve_verifier
+
+
+def verify_signatures(requests: list[tuple[int, int, int, int]]) -> list[bool]:
+    """
+    Verify the signatures of message hashes.
+    This runs in the worker processes, so it does not use the database.
+    Args:
+        requests(list[tuple[int, int, int, int]]): the message hash, the r and s
+            values of the signature and the public key of each signature
+    Returns:
+        list[bool]: whether each signature is valid or not
+    """
+    curve_verifier = _curve_verifier or load_curve_verifier(
+        settings.SIGNATURE_KEY_TABLE_CACHE_SIZE
+    )
+    return [
+        curve_verifier.verify(message_hash, [r, s], public_key)
+        for message_hash, r, s, public_key in requests
+    ]
+
+
+class VerifiedSignatureCache:
+    """
+    ### Description
+    A bounded LRU cache of the successful signature verifications, so the
+    retries of a sign-in or an offer do not verify the same signature again.
+    The entries are keyed by the verification request (message hash,
+    signature and public key) and expire after `ttl` seconds, or when the
+    signature expires if that comes first.
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # verification request -> expiry timestamp
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, request: tuple[int, int, int, int]) -> bool:
+        """
+        Whether the request is a cached successful verification
+        """
+        with self._lock:
+            expires_at = self._entries.get(request)
+            if expires_at is not None and expires_at > time.time():
+                self._entries.move_to_end(request)
+                self.hits += 1
+                return True
+            if expires_at is not None:
+                del self._entries[request]
+            self.misses += 1
+            return False
+
+    def add(self, request: tuple[int, int, int, int], expiry: int | None = None):
+        """
+        Cache a successful verification until the ttl or the signature expiry
+        """
+        expires_at = time.time() + self.ttl
+        if expiry is not None:
+            expires_at = min(expires_at, expiry)
+        if not self.max_size or expires_at <= time.time():
+            return
+        with self._lock:
+            self._entries[request] = expires_at
+            self._entries.move_to_end(request)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        The hit and miss counters of the cache
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
+
+
+class SignatureVerifier:
+    """
+    ### Description
+    Runs the signature verifications in a bounded pool of worker processes,
+    so a burst of sign-ins or offers does not pin the request threads on
+    elliptic curve math.
+
+    At most `queue_depth` verification tasks can be pending (running or
+    waiting for a worker). When the pool is saturated the verification
+    is refused right away with a 503 instead of blocking the request.
+    With no workers the verifications run synchronously in the request
+    thread, which is what the tests use.
+
+    Every process that verifies signatures builds the multiplication
+    tables of `StarkSignatureVerifier` when it starts.
+
+    The successful verifications are kept in a `VerifiedSignatureCache`,
+    so a resubmitted signature does not use the pool at all.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        queue_depth: int,
+        timeout: float,
+        key_cache_size: int,
+        cache: VerifiedSignatureCache | None = None,
+    ):
+        self.workers = workers
+        self.timeout = timeout
+        self.key_cache_size = key_cache_size
+        self.cache = cache or VerifiedSignatureCache(0, 0)
+        self._slots = threading.BoundedSemaphore(queue_depth) if workers else None
+        self._executor = None
+        self._lock = threading.Lock()
+        if not workers:
+            load_curve_verifier(key_cache_size)
+
+    def verify_many(
+        self,
+        requests: list[tuple[int, int, int, int]],
+        expiries: list[int | None] | None = None,
+    ) -> list[bool]:
+        """
+        Verify several signatures. The signatures that are not in the cache
+        are verified as a single task of the pool.
+        Args:
+            requests(list[tuple[int, int, int, int]]): the message hash, the
+                r and s values of the signature and the public key of each
+                signature
+            expiries(list[int | None]): the expiry timestamp of each signature
+        Returns:
+            list[bool]: whether each signature is valid or not
+        """
+        expiries = expiries or [None] * len(requests)
+        results = [self.cache.get(request) for request in requests]
+        misses = [index for index, result in enumerate(results) if not result]
+        checks = self._verify([requests[index] for index in misses])
+        for index, check in zip(misses, checks):
+            results[index] = check
+            if check:
+                self.cache.add(requests[index], expiries[index])
+        return results
+
+    def _verify(self, requests: list[tuple[int, int, int, int]]) -> list[bool]:
+        if not requests:
+            return []
+        if not self.workers:
+            return verify_signatures(requests)
+
+        if not self._slots.acquire(blocking=False):
+            raise SignatureVerificationUnavailable
+        try:
+            future = self._get_executor().submit(verify_signatures, requests)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._reset_executor()
+            raise SignatureVerificationUnavailable
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise SignatureVerificationUnavailable
+        except BrokenProcessPool:
+            self._reset_executor()
+            raise SignatureVerificationUnavailable
+
+    def shutdown(self):
+        """
+        Stop the worker processes
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn the workers so they do not inherit the server's threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=load_curve_verifier,
+                    initargs=(self.key_cache_size,),
+                )
+            return self._executor
+
+    def _reset_executor(self):
+        with self._lock:
+            self._executor = None
+
+
+@functools.cache
+def get_signature_verifier() -> SignatureVerifier:
+    """
+    The signature verifier configured in the settings
+    """
+    return SignatureVerifier(
+        settings.SIGNATURE_VERIFICATION_WORKERS,
+        settings.SIGNATURE_VERIFICATION_QUEUE_DEPTH,
+        settings.SIGNATURE_VERIFICATION_TIMEOUT,
+        settings.SIGNATURE_KEY_TABLE_CACHE_SIZE,
+        VerifiedSignatureCache(
+            settings.SIGNATURE_CACHE_SIZE, settings.SIGNATURE_CACHE_TTL
+        ),
+    )
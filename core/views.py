@@ -1,24 +1,67 @@
 # Create your views here.
-from rest_framework import filters, status
+import time
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Count, F, Q, Subquery, Window
+from django.db.models.functions import RowNumber
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from rest_framework import status
+from rest_framework.exceptions import NotFound
 from rest_framework.generics import GenericAPIView, ListAPIView
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 
 from . import models, serializers
-from .models import Listing, ListingStatus
+from .analytics import yield_analytics
+from .archive import find_loan, get_loan_archiver
+from .export import aexport_open_listings, export_open_listings
+from .feed import get_feed_broker, parse_collections, sse_stream
+from .indexer import get_loan_indexer
+from .listing_cache import get_listing_page, set_listing_page
+from .loan_rollups import get_loan_stats
+from .models import Listing, ListingStatus, LoanRenegotiationStatus
+from .portfolio import get_portfolio
+from .registry import accepted_assets
+from .rollups import get_listings_counts, get_open_listing_facets
+from .scheduler import get_loan_scheduler
+from .search import ListingSearchFilter
 from .serializers import ListingSerializer
+from .sweeper import get_offer_sweeper
+from .verification import get_signature_verifier
 
 
 class AcceptedNFTListAPIView(ListAPIView):
-    queryset = models.AcceptedNFT.objects.all().order_by("name")
     serializer_class = serializers.AcceptedNFTSerializer
 
+    def get_queryset(self):
+        return accepted_assets.nfts()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["listings_counts"] = get_listings_counts(
+            models.ListingRollupFacet.COLLECTION
+        )
+        return context
+
 
 class AcceptedTokenListAPIView(ListAPIView):
-    queryset = models.AcceptedToken.objects.all().order_by("name")
     serializer_class = serializers.AcceptedTokenSerializer
 
+    def get_queryset(self):
+        return accepted_assets.tokens()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["listings_counts"] = get_listings_counts(
+            models.ListingRollupFacet.TOKEN
+        )
+        return context
+
 
 class SignInAPIView(GenericAPIView):
     serializer_class = serializers.SignInSerializer
@@ -43,6 +86,27 @@ class OfferCreateAPIView(GenericAPIView):
         return Response(data, status=status.HTTP_201_CREATED)
 
 
+class BulkOfferCreateAPIView(GenericAPIView):
+    """
+    API endpoint for lenders to create several offers in one request.
+
+    Returns the result of each offer in the order of the request,
+    with a 400 status when none of the offers was created.
+    """
+
+    serializer_class = serializers.BulkMakeOfferSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        user = request.user
+        serializer = self.serializer_class(data=request.data, context={"user": user})
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+        if not any(result["created"] for result in results):
+            return Response({"results": results}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"results": results}, status=status.HTTP_201_CREATED)
+
+
 class OfferCancelAPIView(GenericAPIView):
     serializer_class = serializers.CancelOfferSerializer
     permission_classes = [IsAuthenticated]
@@ -61,27 +125,346 @@ class ListingPagination(PageNumberPagination):
     max_page_size = 100
 
 
+class ListingCursorPagination(CursorPagination):
+    """
+    Keyset pagination of the listings, newest first.
+    The cursors are opaque and no total count is computed, so the
+    latency of a page does not depend on how deep it is.
+    """
+
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-created_at", "-id")
+
+
+class OfferCursorPagination(CursorPagination):
+    """
+    Keyset pagination of the offers, newest first
+    """
+
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-created_at", "-id")
+
+
+class BaseOfferListAPIView(ListAPIView):
+    """
+    Base API endpoint for the offers of the authenticated user.
+
+    A page is read in a single query, joined with the listing and the
+    lender and restricted to the serialized columns, so the number of
+    queries of a request does not depend on the page size.
+    """
+
+    serializer_class = serializers.OfferSerializer
+    pagination_class = OfferCursorPagination
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return models.Offer.objects.select_related("listing", "user").only(
+            "id",
+            "created_at",
+            "token_contract_address",
+            "borrow_amount",
+            "repayment_amount",
+            "duration",
+            "signature_expiry",
+            "effective_apr",
+            "listing__id",
+            "listing__nft_contract_address",
+            "listing__nft_token_id",
+            "listing__status",
+            "user__id",
+            "user__public_key",
+        )
+
+
+class LenderOfferListAPIView(BaseOfferListAPIView):
+    """
+    API endpoint for the offers made by the authenticated user, newest first
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.request.user)
+
+
+class BorrowerOfferListAPIView(BaseOfferListAPIView):
+    """
+    API endpoint for the offers on the listings of the authenticated user,
+    newest first
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(listing__user=self.request.user)
+
+
 class ListingListAPIView(ListAPIView):
+    """
+    API endpoint for listing the open listings.
+
+    The listings are paginated with cursors, the page number
+    pagination is used when the `page` query parameter is given.
+    The `search` query parameter matches a substring or a prefix of the
+    collateral contract address, the borrower public key or the
+    collection name.
+
+    The pages are cached by query parameters and invalidated by
+    bumping the generation of the collection when a listing changes.
+    """
+
     serializer_class = ListingSerializer
-    pagination_class = ListingPagination
-    filter_backends = [filters.SearchFilter]
-    search_fields = ["nft_contract_address", "user__public_key"]
+    filter_backends = [ListingSearchFilter]
+
+    @property
+    def pagination_class(self):
+        if ListingPagination.page_query_param in self.request.query_params:
+            return ListingPagination
+        return ListingCursorPagination
+
+    def list(self, request, *args, **kwargs):
+        key, data = get_listing_page(request)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        set_listing_page(key, response.data)
+        return response
 
     def get_queryset(self):
         queryset = Listing.objects.filter(status=ListingStatus.OPEN).order_by(
-            "-created_at"
+            "-created_at", "-id"
         )
         collateral_contract = self.request.query_params.get("collateral_contract")
         borrower_address = self.request.query_params.get("borrower_address")
 
+        # the addresses are canonicalized, so exact lookups use the indexes
         if collateral_contract:
-            queryset = queryset.filter(nft_contract_address__iexact=collateral_contract)
+            queryset = queryset.filter(nft_contract_address=collateral_contract)
         if borrower_address:
-            queryset = queryset.filter(user__public_key__iexact=borrower_address)
+            # a scalar subquery instead of a join, so the borrower index is used
+            borrower = models.User.objects.filter(public_key=borrower_address)
+            queryset = queryset.filter(user_id=Subquery(borrower.values("id")[:1]))
 
         return queryset
 
 
+class OfferBookAPIView(GenericAPIView):
+    """
+    API endpoint for the best offers on a listing.
+
+    The offers that have not expired are ranked by effective APR (lowest
+    first by default), principal or signature expiry, and the top `limit`
+    offers are returned. Each ranking is a range scan of an index on the
+    listing and the ranked column.
+    """
+
+    serializer_class = serializers.OfferBookQuerySerializer
+    # the ranked column of each ordering
+    ordering_fields = {
+        "apr": "effective_apr",
+        "principal": "borrow_amount",
+        "expiry": "signature_expiry",
+    }
+
+    def get(self, request, listing_id):
+        serializer = self.serializer_class(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        ordering = serializer.validated_data["ordering"]
+        listing = get_object_or_404(Listing, id=listing_id)
+
+        field = self.ordering_fields[ordering.lstrip("-")]
+        prefix = "-" if ordering.startswith("-") else ""
+        offers = models.Offer.objects.filter(
+            listing=listing,
+            signature_expiry__gt=int(time.time()),
+            **{f"{field}__isnull": False},
+        ).order_by(prefix + field, prefix + "id")[: serializer.validated_data["limit"]]
+        return Response(serializers.SimpleOfferSerializer(offers, many=True).data)
+
+
+class YieldAnalyticsAPIView(GenericAPIView):
+    """
+    API endpoint for the yield analytics of the live offers and of the
+    pending loans, by collection and by token.
+
+    For every group it returns the percentiles and the histogram of the
+    APR (in percent), of the principal (in whole tokens, only for the
+    accepted tokens) and of the time to expiry (in days, until the
+    signature expires or the repayment is due). The metrics are computed
+    over columns of the offers and loans fetched in one query each.
+    """
+
+    def get(self, request):
+        return Response(yield_analytics())
+
+
+class PortfolioAPIView(GenericAPIView):
+    """
+    API endpoint for the loans of an address as borrower and as lender.
+
+    For every token it returns the outstanding principal and the expected
+    repayment of the loans that are neither repaid nor foreclosed, and the
+    number of loans by status. The portfolio is computed in a single
+    grouped query and cached until the loans of the address change.
+    """
+
+    def get(self, request, address):
+        return Response(get_portfolio(address))
+
+
+class LoanDetailAPIView(GenericAPIView):
+    """
+    API endpoint for a loan by its loan id, read from the loans or,
+    once it is archived, from the archived loans.
+    """
+
+    serializer_class = serializers.LoanSerializer
+
+    def get(self, request, loan_id):
+        loan = find_loan(loan_id)
+        if loan is None:
+            raise NotFound()
+        return Response(self.serializer_class(loan).data)
+
+
+class RenegotiationInboxAPIView(ListAPIView):
+    """
+    API endpoint for the loans of the authenticated user, as borrower or as
+    lender, with pending or countered renegotiation offers. Every loan comes
+    with the counts of its open offers and its latest open offer, most
+    recent activity first.
+
+    The inbox is read in a single query: the open offers are ranked and
+    counted by loan with window functions, and the latest offer of every
+    loan is kept. It is not paginated, since the filters of a page would
+    be applied before the offers are counted.
+    """
+
+    serializer_class = serializers.RenegotiationInboxSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        public_key = self.request.user.public_key
+        pending, countered = (
+            LoanRenegotiationStatus.PENDING,
+            LoanRenegotiationStatus.COUNTERED,
+        )
+        return (
+            models.RenegotiationOffer.objects.filter(
+                Q(loan__borrower=public_key) | Q(loan__lender=public_key),
+                status__in=[pending, countered],
+            )
+            .annotate(
+                pending_count=Window(
+                    Count("id", filter=Q(status=pending)), partition_by="loan_id"
+                ),
+                countered_count=Window(
+                    Count("id", filter=Q(status=countered)), partition_by="loan_id"
+                ),
+                rank=Window(
+                    RowNumber(),
+                    partition_by="loan_id",
+                    order_by=(F("created_at").desc(), F("id").desc()),
+                ),
+            )
+            .filter(rank=1)
+            .select_related("loan", "user")
+            .only(
+                "id",
+                "created_at",
+                "repayment_amount",
+                "duration",
+                "incentive",
+                "signature_expiry",
+                "status",
+                "user__id",
+                "user__public_key",
+                "loan__id",
+                "loan__loan_id",
+                "loan__borrower",
+                "loan__lender",
+                "loan__nft_contract_address",
+                "loan__nft_token_id",
+                "loan__token_contract_address",
+                "loan__borrow_amount",
+                "loan__repayment_amount",
+                "loan__duration",
+                "loan__start_time",
+                "loan__due_at",
+                "loan__closed_at",
+                "loan__status",
+            )
+            .order_by("-created_at", "-id")
+        )
+
+
+class LoanStatsAPIView(GenericAPIView):
+    """
+    API endpoint for the protocol loan stats, by token or by collection
+    and token: the number and the volume of the loans started between the
+    `start` and `end` days, and the value locked at the end of the `end` day
+    (today by default). The amounts are in the token decimal and normalized
+    to whole tokens for the accepted tokens.
+
+    The stats are read from the daily loan rollups only.
+    """
+
+    serializer_class = serializers.LoanStatsQuerySerializer
+
+    def get(self, request):
+        serializer = self.serializer_class(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(
+            {
+                **serializer.data,
+                "results": get_loan_stats(**serializer.validated_data),
+            }
+        )
+
+
+class ListingFacetsAPIView(GenericAPIView):
+    """
+    API endpoint for the open listing counts by collection, by requested
+    token, by duration (in days) and by borrow amount (in whole tokens).
+
+    The counts are read from the listing rollups in a single query.
+    """
+
+    def get(self, request):
+        return Response(get_open_listing_facets())
+
+
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
+class ListingExportAPIView(GenericAPIView):
+    """
+    API endpoint for streaming the open listings and their offers as NDJSON,
+    oldest first.
+
+    The response is streamed outside of a transaction, from a server-side
+    cursor, with an asynchronous iterator under the ASGI application so it
+    is not buffered. An interrupted export is resumed by passing the
+    `created_at` and `id` of the last received listing as the
+    `after_created_at` and `after_id` query parameters.
+    """
+
+    serializer_class = serializers.ListingExportWatermarkSerializer
+
+    def get(self, request):
+        serializer = self.serializer_class(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        export = (
+            aexport_open_listings
+            if isinstance(request._request, ASGIRequest)
+            else export_open_listings
+        )
+        return StreamingHttpResponse(
+            export(**serializer.validated_data),
+            content_type="application/x-ndjson",
+        )
+
+
 class UpdateEmailAPIView(GenericAPIView):
     """
     API endpoint for authenticated users to update their email address.
@@ -113,3 +496,102 @@ class UpdateEmailAPIView(GenericAPIView):
             {"message": "Email updated successfully", "email": updated_user.email},
             status=status.HTTP_200_OK,
         )
+
+
+class SignatureCacheStatsAPIView(GenericAPIView):
+    """
+    API endpoint for staff users to read the hit and miss counters
+    of the verified signature cache of this process.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_signature_verifier().cache.stats())
+
+
+class OfferSweeperStatsAPIView(GenericAPIView):
+    """
+    API endpoint for staff users to read the counters of the expired offer
+    sweeper of this process.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_offer_sweeper().stats())
+
+
+class LoanSchedulerStatsAPIView(GenericAPIView):
+    """
+    API endpoint for staff users to read the counters and the transition
+    latency of the loan scheduler of this process.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_loan_scheduler().stats())
+
+
+class FeedStatsAPIView(GenericAPIView):
+    """
+    API endpoint for staff users to read the counters of the listing and
+    offer feed of this process.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_feed_broker().stats())
+
+
+class LoanArchiverStatsAPIView(GenericAPIView):
+    """
+    API endpoint for staff users to read the counters of the loan archiver
+    of this process.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_loan_archiver().stats())
+
+
+class LoanIndexerStatsAPIView(GenericAPIView):
+    """
+    API endpoint for staff users to read the counters of the loan event
+    indexer of this process, with its checkpoint.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        indexer = get_loan_indexer()
+        return Response({**indexer.stats(), "checkpoint": indexer.checkpoint()})
+
+
+@transaction.non_atomic_requests
+async def feed_events(request):
+    """
+    Server-sent events endpoint of the listing and offer feed, for the
+    collections of the comma separated `collections` parameter or for
+    every collection. The events are pushed from the commits of the
+    listings and the offers, so the clients do not poll the listings.
+    It is served by the ASGI application, outside of the request transaction.
+    """
+    if not isinstance(request, ASGIRequest):
+        # the WSGI handler reads the whole of a streamed response before
+        # sending it, and the stream of the feed never ends
+        return JsonResponse(
+            {"detail": "The feed is only served by the ASGI application"},
+            status=501,
+        )
+    subscription = get_feed_broker().subscribe(
+        parse_collections(request.GET.get("collections"))
+    )
+    return StreamingHttpResponse(
+        sse_stream(subscription, settings.FEED_HEARTBEAT),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
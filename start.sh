@@ -1 +1 @@
-poetry run python manage.py runserver 0.0.0.0:8000
\ No newline at end of file
+poetry run daphne -b 0.0.0.0 -p 8000 trajectfi.asgi:application
\ No newline at end of file
@@ -13,4 +13,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "trajectfi.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported once the apps are loaded
+from core.feed import FeedRouter, get_feed_broker  # noqa: E402
+
+# listen to the feed of the other processes before serving the subscribers,
+# so the event loop never waits for it
+get_feed_broker().backend.start()
+
+# the WebSocket feed is served next to the Django application
+application = FeedRouter(django_application)
@@ -33,7 +33,8 @@ ALLOWED_HOSTS = os.environ.get("ALLOWED_HOSTS", "").split(",")
 
 # Application definition
 CORE_APPS = [
-    # "daphne",
+    # serves the ASGI application, runserver included
+    "daphne",
     "django.contrib.admin",
     "django.contrib.auth",
     "django.contrib.contenttypes",
@@ -85,6 +86,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "trajectfi.wsgi.application"
 
+# the application served by daphne, with the WebSocket feed
+ASGI_APPLICATION = "trajectfi.asgi.application"
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
@@ -147,6 +151,50 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Caches
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# the caches are in redis when it is configured, so every server sees the
+# same listing page generations and accepted asset versions
+REDIS_URL = os.environ.get("REDIS_URL")
+
+CACHES = {
+    "default": (
+        {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+        if REDIS_URL
+        else {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    ),
+    "listings": (
+        {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "listings",
+        }
+        if REDIS_URL
+        else {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "listings",
+        }
+    ),
+}
+# the seconds the accepted assets registry is kept for without REDIS_URL,
+# since the process cache does not see the changes of the other processes
+ACCEPTED_ASSETS_LOCAL_TTL = int(os.environ.get("ACCEPTED_ASSETS_LOCAL_TTL", 30))
+
+# the seconds a listing page is cached for
+LISTING_CACHE_TTL = int(os.environ.get("LISTING_CACHE_TTL", 60))
+
+# the seconds a portfolio is cached for, it is dropped when its loans change
+PORTFOLIO_CACHE_TTL = int(os.environ.get("PORTFOLIO_CACHE_TTL", 3600))
+
+# the number of listings fetched at a time by the listing export
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 2000))
+
 # Third Party settings
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -173,9 +221,90 @@ SIG_DOMAIN_NAME = "TRAJECTFI"
 SIG_CHAIN_ID = "SN_SEPOLIA"
 SIG_VERSION = "0.1.0"
 
+# signature verification settings
+# the number of worker processes that verify signatures,
+# 0 verifies the signatures synchronously in the request thread
+SIGNATURE_VERIFICATION_WORKERS = int(
+    os.environ.get("SIGNATURE_VERIFICATION_WORKERS", 0)
+)
+# the number of verification tasks that can be running or waiting for a worker
+SIGNATURE_VERIFICATION_QUEUE_DEPTH = int(
+    os.environ.get("SIGNATURE_VERIFICATION_QUEUE_DEPTH", 64)
+)
+# the seconds to wait for a verification result
+SIGNATURE_VERIFICATION_TIMEOUT = float(
+    os.environ.get("SIGNATURE_VERIFICATION_TIMEOUT", 5)
+)
+# the number of frequent signers whose multiplication tables are kept
+SIGNATURE_KEY_TABLE_CACHE_SIZE = int(
+    os.environ.get("SIGNATURE_KEY_TABLE_CACHE_SIZE", 128)
+)
+# the number of successful verifications that are cached
+# and the seconds they are cached for
+SIGNATURE_CACHE_SIZE = int(os.environ.get("SIGNATURE_CACHE_SIZE", 10000))
+SIGNATURE_CACHE_TTL = int(os.environ.get("SIGNATURE_CACHE_TTL", 300))
+
 # loan settings
-MAX_LOAN_DURATION = timedelta(days=365).seconds
-MIN_LOAN_DURATION = timedelta(days=1).seconds
+MAX_LOAN_DURATION = int(timedelta(days=365).total_seconds())
+MIN_LOAN_DURATION = int(timedelta(days=1).total_seconds())
+
+# the maximum number of offers in a bulk offer create request
+MAX_BULK_OFFERS = int(os.environ.get("MAX_BULK_OFFERS", 500))
+
+# the expired offers are deleted in batches of OFFER_SWEEP_BATCH_SIZE offers,
+# at most OFFER_SWEEP_MAX_BATCHES batches per run
+OFFER_SWEEP_BATCH_SIZE = int(os.environ.get("OFFER_SWEEP_BATCH_SIZE", 1000))
+OFFER_SWEEP_MAX_BATCHES = int(os.environ.get("OFFER_SWEEP_MAX_BATCHES", 100))
+# when set, every process runs the sweeper every OFFER_SWEEP_INTERVAL seconds
+OFFER_SWEEP_IN_PROCESS = bool(int(os.environ.get("OFFER_SWEEP_IN_PROCESS", 0)))
+OFFER_SWEEP_INTERVAL = float(os.environ.get("OFFER_SWEEP_INTERVAL", 60))
+
+# the due loans are expired in batches of LOAN_SCHEDULER_BATCH_SIZE loans,
+# at most LOAN_SCHEDULER_MAX_BATCHES batches per run
+LOAN_SCHEDULER_BATCH_SIZE = int(os.environ.get("LOAN_SCHEDULER_BATCH_SIZE", 500))
+LOAN_SCHEDULER_MAX_BATCHES = int(os.environ.get("LOAN_SCHEDULER_MAX_BATCHES", 100))
+# when set, every process runs the scheduler every LOAN_SCHEDULER_INTERVAL seconds
+LOAN_SCHEDULER_IN_PROCESS = bool(int(os.environ.get("LOAN_SCHEDULER_IN_PROCESS", 0)))
+LOAN_SCHEDULER_INTERVAL = float(os.environ.get("LOAN_SCHEDULER_INTERVAL", 10))
+
+# the loan events of LOAN_CONTRACT_ADDRESS are indexed from the Starknet
+# JSON-RPC endpoint STARKNET_RPC_URL, starting at INDEXER_START_BLOCK
+STARKNET_RPC_URL = os.environ.get("STARKNET_RPC_URL", "http://localhost:5050/rpc")
+STARKNET_RPC_TIMEOUT = float(os.environ.get("STARKNET_RPC_TIMEOUT", 30))
+LOAN_CONTRACT_ADDRESS = os.environ.get("LOAN_CONTRACT_ADDRESS", "0x0")
+INDEXER_START_BLOCK = int(os.environ.get("INDEXER_START_BLOCK", 0))
+# the blocks are read in ranges of INDEXER_BLOCK_BATCH_SIZE blocks, with
+# INDEXER_MAX_IN_FLIGHT ranges read at a time, in pages of INDEXER_CHUNK_SIZE
+# events, and the last INDEXER_CONFIRMATIONS blocks are left for the next run
+INDEXER_BLOCK_BATCH_SIZE = int(os.environ.get("INDEXER_BLOCK_BATCH_SIZE", 100))
+INDEXER_MAX_IN_FLIGHT = int(os.environ.get("INDEXER_MAX_IN_FLIGHT", 4))
+INDEXER_CHUNK_SIZE = int(os.environ.get("INDEXER_CHUNK_SIZE", 1000))
+INDEXER_CONFIRMATIONS = int(os.environ.get("INDEXER_CONFIRMATIONS", 0))
+# when set, every process runs the indexer every INDEXER_INTERVAL seconds
+INDEXER_IN_PROCESS = bool(int(os.environ.get("INDEXER_IN_PROCESS", 0)))
+INDEXER_INTERVAL = float(os.environ.get("INDEXER_INTERVAL", 10))
+
+# the loans repaid or foreclosed more than LOAN_ARCHIVE_AFTER_DAYS days ago are
+# archived in batches of LOAN_ARCHIVE_BATCH_SIZE loans, at most
+# LOAN_ARCHIVE_MAX_BATCHES batches per run
+LOAN_ARCHIVE_AFTER_DAYS = int(os.environ.get("LOAN_ARCHIVE_AFTER_DAYS", 30))
+LOAN_ARCHIVE_BATCH_SIZE = int(os.environ.get("LOAN_ARCHIVE_BATCH_SIZE", 1000))
+LOAN_ARCHIVE_MAX_BATCHES = int(os.environ.get("LOAN_ARCHIVE_MAX_BATCHES", 100))
+# when set, every process runs the archiver every LOAN_ARCHIVE_INTERVAL seconds
+LOAN_ARCHIVE_IN_PROCESS = bool(int(os.environ.get("LOAN_ARCHIVE_IN_PROCESS", 0)))
+LOAN_ARCHIVE_INTERVAL = float(os.environ.get("LOAN_ARCHIVE_INTERVAL", 3600))
+
+# the listing and offer feed, served over SSE and over WebSockets on
+# FEED_WEBSOCKET_PATH by the ASGI application. The events reach the
+# subscribers of the current process with core.feed.LocalFeedBackend, and of
+# every process with core.feed.PostgresFeedBackend (on the FEED_CHANNEL channel)
+FEED_BACKEND = os.environ.get("FEED_BACKEND", "core.feed.LocalFeedBackend")
+FEED_CHANNEL = os.environ.get("FEED_CHANNEL", "trajectfi_feed")
+FEED_WEBSOCKET_PATH = "/api/feed/ws/"
+# the events a subscriber may fall behind before it is dropped
+FEED_QUEUE_SIZE = int(os.environ.get("FEED_QUEUE_SIZE", 256))
+# the seconds without events after which a keepalive is sent
+FEED_HEARTBEAT = float(os.environ.get("FEED_HEARTBEAT", 15))
 
 
 # Custom settings